@@ -220,7 +220,7 @@ class Forwarder(ZeroconfService):
                 if self.socket is not None:
                     # escape outgoing data when needed (Telnet IAC (0xff) character)
                     if self.rfc2217:
-                        data = serial.to_bytes(self.rfc2217.escape(data))
+                        data = self.rfc2217.escape_bytes(data)
                     self.buffer_ser2net.extend(data)
             else:
                 self.handle_serial_error()
@@ -250,7 +250,7 @@ class Forwarder(ZeroconfService):
             if data:
                 # Process RFC 2217 stuff when enabled
                 if self.rfc2217:
-                    data = b''.join(self.rfc2217.filter(data))
+                    data = self.rfc2217.filter_bytes(data)
                 # add data to buffer
                 self.buffer_net2ser.extend(data)
             else:
@@ -9,8 +9,10 @@
 
 from __future__ import absolute_import
 
+import collections
 import sys
 import importlib
+import threading
 
 from serial.serialutil import *
 #~ SerialBase, SerialException, to_bytes, iterbytes
@@ -29,6 +31,10 @@ else:
         from serial.serialwin32 import Serial
     elif os.name == 'posix':
         from serial.serialposix import Serial, PosixPollSerial, VTIMESerial  # noqa
+        try:
+            from serial.serialposix import EpollSerial  # noqa
+        except ImportError:
+            pass    # epoll is only available on Linux
     elif os.name == 'java':
         from serial.serialjava import Serial
     else:
@@ -40,23 +46,11 @@ protocol_handler_packages = [
 ]
 
 
-def serial_for_url(url, *args, **kwargs):
+def _class_for_url(url):
     """\
-    Get an instance of the Serial class, depending on port/url. The port is not
-    opened when the keyword parameter 'do_not_open' is true, by default it
-    is. All other parameters are directly passed to the __init__ method when
-    the port is instantiated.
-
-    The list of package names that is searched for protocol handlers is kept in
-    ``protocol_handler_packages``.
-
-    e.g. we want to support a URL ``foobar://``. A module
-    ``my_handlers.protocol_foobar`` is provided by the user. Then
-    ``protocol_handler_packages.append("my_handlers")`` would extend the search
-    path so that ``serial_for_url("foobar://"))`` would work.
+    Find the class implementing a port name or URL. Returns a tuple
+    (url, class), the handler may change the URL.
     """
-    # check and remove extra parameter to not confuse the Serial class
-    do_open = not kwargs.pop('do_not_open', False)
     # the default is to use the native implementation
     klass = Serial
     try:
@@ -83,9 +77,113 @@ def serial_for_url(url, *args, **kwargs):
                     break
             else:
                 raise ValueError('invalid URL, protocol {!r} not known'.format(protocol))
+    return url, klass
+
+
+def serial_for_url(url, *args, **kwargs):
+    """\
+    Get an instance of the Serial class, depending on port/url. The port is not
+    opened when the keyword parameter 'do_not_open' is true, by default it
+    is. All other parameters are directly passed to the __init__ method when
+    the port is instantiated.
+
+    The list of package names that is searched for protocol handlers is kept in
+    ``protocol_handler_packages``.
+
+    e.g. we want to support a URL ``foobar://``. A module
+    ``my_handlers.protocol_foobar`` is provided by the user. Then
+    ``protocol_handler_packages.append("my_handlers")`` would extend the search
+    path so that ``serial_for_url("foobar://"))`` would work.
+    """
+    # check and remove extra parameter to not confuse the Serial class
+    do_open = not kwargs.pop('do_not_open', False)
+    url, klass = _class_for_url(url)
     # instantiate and open when desired
     instance = klass(None, *args, **kwargs)
     instance.port = url
     if do_open:
         instance.open()
     return instance
+
+
+# result of open_many()
+PortResult = collections.namedtuple('PortResult', 'spec serial error')
+
+
+def _map_threaded(function, items, max_workers):
+    """\
+    Call function(item) for all items using up to max_workers threads.
+    Return a list of (result, exception) tuples in the order of items.
+    """
+    if max_workers < 1:
+        raise ValueError('max_workers must be at least 1: {!r}'.format(max_workers))
+    items = list(items)
+    results = [None] * len(items)
+    pending = collections.deque(enumerate(items))
+
+    def worker():
+        while True:
+            try:
+                index, item = pending.popleft()     # thread safe
+            except IndexError:
+                return
+            try:
+                results[index] = (function(item), None)
+            except Exception as e:  # pylint: disable=broad-except
+                results[index] = (None, e)
+
+    threads = [threading.Thread(target=worker) for _ in range(min(max_workers, len(items)))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _open_spec(spec):
+    """Open one port for open_many()"""
+    if isinstance(spec, dict):
+        kwargs = dict(spec)
+        url = kwargs.pop('url', None)
+        if url is None:
+            url = kwargs.pop('port', None)
+        if url is None:
+            raise ValueError('port specification without "url" or "port": {!r}'.format(spec))
+        return serial_for_url(url, **kwargs)
+    return serial_for_url(spec)
+
+
+def open_many(specs, max_workers=32):
+    """\
+    Open many ports concurrently, so that slow devices do not hold up the
+    others. Each spec is a port name / URL or a dict of keyword arguments for
+    serial_for_url(), naming the port with the key "url" or "port", e.g.
+    {'url': '/dev/ttyUSB0', 'baudrate': 115200}.
+
+    Return a list of PortResult(spec, serial, error) tuples, in the order of
+    specs. Exactly one of serial (the opened instance) and error (the
+    exception) is None.
+    """
+    specs = list(specs)
+    return [PortResult(spec, instance, error)
+            for spec, (instance, error) in zip(specs, _map_threaded(_open_spec, specs, max_workers))]
+
+
+def close_many(ports, drain=True, max_workers=32):
+    """\
+    Close many ports concurrently. With drain, flush() waits for the
+    output buffers to be transmitted first. Entries that are None (e.g.
+    failed opens from open_many()) are skipped.
+
+    Return a list with the exception for each port that failed, or None.
+    """
+    def close(instance):
+        if instance is None:
+            return
+        try:
+            if drain and instance.is_open:
+                instance.flush()
+        finally:
+            instance.close()
+    return [error for _, error in _map_threaded(close, ports, max_workers)]
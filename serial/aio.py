@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+#
+# asyncio support for serial ports.
+#
+# This file is part of pySerial. https://github.com/pyserial/pyserial
+# (C) 2015-2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Support asyncio with serial ports.
+
+The file descriptor of the port is registered with the event loop
+(``loop.add_reader()`` / ``loop.add_writer()``), so there is no polling and no
+thread per port. This requires a port with a selectable :meth:`fileno`,
+i.e. the POSIX implementation or ``socket://`` URLs.
+
+Python 3.5 or newer is required.
+"""
+
+import asyncio
+
+import serial
+from serial.serialutil import _advance_buffers
+
+# high water mark of the write buffer, same default as asyncio uses for sockets
+DEFAULT_HIGH_WATER = 64 * 1024
+# limit for the StreamReader created by open_serial_connection()
+DEFAULT_LIMIT = 64 * 1024
+
+
+class SerialTransport(asyncio.Transport):
+    """\
+    An asyncio transport model of a serial communication channel.
+
+    A transport class is an abstraction of a communication channel.
+    This allows protocol implementations to be developed against the
+    transport abstraction without needing to know the details of the
+    underlying channel, such as whether it is a pipe, a socket, or
+    indeed a serial port.
+
+    The port is switched to non-blocking mode (``timeout`` and
+    ``write_timeout`` set to 0) when the transport is created.
+    """
+
+    max_read_size = 1024
+
+    def __init__(self, loop, protocol, serial_instance):
+        super().__init__(extra={'serial': serial_instance})
+        self._loop = loop
+        self._protocol = protocol
+        self._serial = serial_instance
+        self._fileno = serial_instance.fileno()
+        self._closing = False
+        self._reading_paused = False
+        self._has_reader = False
+        self._has_writer = False
+        self._protocol_paused = False
+        self._write_buffer = []
+        self._write_buffer_size = 0
+        self._set_write_buffer_limits()
+        # reading and writing must never block the event loop
+        with serial_instance.batch_settings():
+            serial_instance.timeout = 0
+            serial_instance.write_timeout = 0
+        loop.call_soon(protocol.connection_made, self)
+        # only start reading when protocol.connection_made() has been called
+        loop.call_soon(self._ensure_reader)
+
+    @property
+    def loop(self):
+        """The asyncio event loop used by this SerialTransport."""
+        return self._loop
+
+    @property
+    def serial(self):
+        """The underlying Serial instance."""
+        return self._serial
+
+    def __repr__(self):
+        return '{self.__class__.__name__}({self.loop}, {self._protocol}, {self.serial})'.format(self=self)
+
+    def is_closing(self):
+        """Return True if the transport is closing or closed."""
+        return self._closing
+
+    def close(self):
+        """\
+        Close the transport gracefully.
+
+        Any buffered data will be written asynchronously. No more data
+        will be received and further writes will be silently ignored.
+        After all buffered data is flushed, the protocol's
+        connection_lost() method will be called with None as its
+        argument.
+        """
+        if not self._closing:
+            self._closing = True
+            self._remove_reader()
+            if not self._write_buffer:
+                self._loop.call_soon(self._call_connection_lost, None)
+
+    def abort(self):
+        """\
+        Close the transport immediately.
+
+        Pending data in the write buffer is discarded. The protocol's
+        connection_lost() method will be called with None as its argument.
+        """
+        self._abort(None)
+
+    # - - - reading
+
+    def pause_reading(self):
+        """Stop calling protocol.data_received() until resume_reading()."""
+        self._reading_paused = True
+        self._remove_reader()
+
+    def resume_reading(self):
+        """Resume calling protocol.data_received() after pause_reading()."""
+        self._reading_paused = False
+        self._ensure_reader()
+
+    def is_reading(self):
+        """Return True if the transport is receiving."""
+        return self._has_reader
+
+    def _ensure_reader(self):
+        if not self._has_reader and not self._reading_paused and not self._closing:
+            self._loop.add_reader(self._fileno, self._read_ready)
+            self._has_reader = True
+            self._read_buffered()
+
+    def _read_buffered(self):
+        # data that read_until() read ahead does not make the fd readable
+        if self._serial._read_ahead:
+            self._loop.call_soon(self._read_ready)
+
+    def _remove_reader(self):
+        if self._has_reader:
+            self._loop.remove_reader(self._fileno)
+            self._has_reader = False
+
+    def _read_ready(self):
+        try:
+            data = self._serial.read(self.max_read_size)
+        except serial.SerialException as exc:
+            # e.g. a USB device that was unplugged
+            self._abort(exc)
+        else:
+            if data:
+                self._protocol.data_received(data)
+                if self._has_reader:
+                    self._read_buffered()
+
+    # - - - writing
+
+    def write(self, data):
+        """\
+        Write some data to the transport.
+
+        This method does not block; it buffers the data and arranges
+        for it to be sent out asynchronously. Writes made after the
+        transport has been closed will be ignored.
+        """
+        if self._closing:
+            return
+        if not data:
+            return
+        data = bytes(data)
+        if not self._write_buffer:
+            # try to write right away, only buffer what the port does not take
+            try:
+                n = self._serial.write(data)
+            except serial.SerialException as exc:
+                self._fatal_error(exc, 'Fatal write error on serial transport')
+                return
+            if n == len(data):
+                return
+            data = data[n:]
+            self._ensure_writer()
+        self._write_buffer.append(data)
+        self._write_buffer_size += len(data)
+        self._maybe_pause_protocol()
+
+    def can_write_eof(self):
+        """Serial ports do not support the concept of end-of-file."""
+        return False
+
+    def write_eof(self):
+        raise NotImplementedError('Serial connections do not support end-of-file')
+
+    def get_write_buffer_size(self):
+        """The number of bytes in the write buffer."""
+        return self._write_buffer_size
+
+    def get_write_buffer_limits(self):
+        """Return the (low, high) water marks of the write buffer."""
+        return (self._low_water, self._high_water)
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        """\
+        Set the high- and low-water limits for write flow control.
+
+        These two values control when the protocol's pause_writing() and
+        resume_writing() methods are called. If specified, the low-water
+        limit must be less than or equal to the high-water limit. Neither
+        value can be negative.
+        """
+        self._set_write_buffer_limits(high=high, low=low)
+        self._maybe_pause_protocol()
+
+    def _set_write_buffer_limits(self, high=None, low=None):
+        if high is None:
+            if low is None:
+                high = DEFAULT_HIGH_WATER
+            else:
+                high = 4 * low
+        if low is None:
+            low = high // 4
+        if not high >= low >= 0:
+            raise ValueError('high ({!r}) must be >= low ({!r}) must be >= 0'.format(high, low))
+        self._high_water = high
+        self._low_water = low
+
+    def _ensure_writer(self):
+        if not self._has_writer and not self._closing:
+            self._loop.add_writer(self._fileno, self._write_ready)
+            self._has_writer = True
+
+    def _remove_writer(self):
+        if self._has_writer:
+            self._loop.remove_writer(self._fileno)
+            self._has_writer = False
+
+    def _write_ready(self):
+        try:
+            n = self._serial.write_vectored(self._write_buffer)
+        except serial.SerialException as exc:
+            self._fatal_error(exc, 'Fatal write error on serial transport')
+            return
+        _advance_buffers(self._write_buffer, n)
+        self._write_buffer_size -= n
+        self._maybe_resume_protocol()
+        if not self._write_buffer:
+            self._remove_writer()
+            if self._closing:
+                self._call_connection_lost(None)
+
+    def _maybe_pause_protocol(self):
+        if self._write_buffer_size <= self._high_water or self._protocol_paused:
+            return
+        self._protocol_paused = True
+        try:
+            self._protocol.pause_writing()
+        except Exception as exc:
+            self._loop.call_exception_handler({
+                'message': 'protocol.pause_writing() failed',
+                'exception': exc,
+                'transport': self,
+                'protocol': self._protocol,
+            })
+
+    def _maybe_resume_protocol(self):
+        if self._protocol_paused and self._write_buffer_size <= self._low_water:
+            self._protocol_paused = False
+            try:
+                self._protocol.resume_writing()
+            except Exception as exc:
+                self._loop.call_exception_handler({
+                    'message': 'protocol.resume_writing() failed',
+                    'exception': exc,
+                    'transport': self,
+                    'protocol': self._protocol,
+                })
+
+    # - - - closing
+
+    def _fatal_error(self, exc, message='Fatal error on serial transport'):
+        """Report a fatal error to the event-loop and abort the transport."""
+        self._loop.call_exception_handler({
+            'message': message,
+            'exception': exc,
+            'transport': self,
+            'protocol': self._protocol,
+        })
+        self._abort(exc)
+
+    def _abort(self, exc):
+        self._closing = True
+        self._remove_reader()
+        self._remove_writer()
+        del self._write_buffer[:]
+        self._write_buffer_size = 0
+        self._loop.call_soon(self._call_connection_lost, exc)
+
+    def _call_connection_lost(self, exc):
+        if self._protocol is None:
+            return  # already done, e.g. abort() while closing
+        self._remove_reader()
+        self._remove_writer()
+        try:
+            self._serial.close()
+        except serial.SerialException:
+            pass    # port is gone anyway, e.g. a disconnected USB device
+        try:
+            self._protocol.connection_lost(exc)
+        finally:
+            self._protocol = None
+            self._loop = None
+
+
+async def create_serial_connection(loop, protocol_factory, *args, **kwargs):
+    """\
+    Create a connection to a new serial port instance.
+
+    This function is a coroutine which will try to establish the
+    connection.
+
+    The chronological order of the operation is:
+
+    1. protocol_factory is called without arguments and must return
+       an asyncio.Protocol compatible object.
+
+    2. The protocol instance is tied to the serial port instance.
+
+    3. This coroutine returns successfully with a (transport,
+       protocol) pair.
+
+    4. The connection_made() method of the protocol
+       will be called at some point by the event loop.
+
+    All further arguments are passed to serial.serial_for_url(), so URLs
+    with a file descriptor (e.g. ``socket://``) work too.
+    """
+    serial_instance = serial.serial_for_url(*args, **kwargs)
+    protocol = protocol_factory()
+    transport = SerialTransport(loop, protocol, serial_instance)
+    return transport, protocol
+
+
+async def open_serial_connection(*args, loop=None, limit=DEFAULT_LIMIT, **kwargs):
+    """\
+    A wrapper for create_serial_connection() returning a (reader,
+    writer) pair.
+
+    The reader returned is a StreamReader instance; the writer is a
+    StreamWriter instance. The arguments are all the usual arguments to
+    Serial(); additional optional keyword arguments are loop (to set the
+    event loop instance to use) and limit (to set the buffer limit
+    passed to the StreamReader).
+    """
+    if loop is None:
+        loop = asyncio.get_event_loop()
+    reader = asyncio.StreamReader(limit=limit)
+    protocol = asyncio.StreamReaderProtocol(reader)
+    transport, _ = await create_serial_connection(loop, lambda: protocol, *args, **kwargs)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    return reader, writer
@@ -0,0 +1,321 @@
+#! python
+#
+# Taps to observe the I/O of serial ports.
+#
+# This file is part of pySerial. https://github.com/pyserial/pyserial
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Observe the traffic and the control calls of any serial port, see
+SerialBase.add_tap().
+
+While no tap is registered and no statistics are enabled the port runs the
+unmodified code. Otherwise the I/O methods of the port instance are replaced
+by wrappers that record the statistics and pass the events to the taps.
+
+Events and their data:
+
+- ``rx``: bytes read
+- ``tx``: bytes written
+- ``control``: tuple (name, value), e.g. ``('rts', True)``, ``('flush', None)``
+- ``reconfigure``: dictionary with the settings, as from get_settings()
+- ``cancel``: ``'read'`` or ``'write'``
+"""
+
+from __future__ import absolute_import
+
+import collections
+import threading
+import traceback
+
+from serial.serialutil import SerialException, SerialTimeoutException, Timeout, to_bytes, _monotonic_ns
+
+EVENTS = ('rx', 'tx', 'control', 'reconfigure', 'cancel')
+
+
+class Tap(object):
+    """\
+    A callback registered with SerialBase.add_tap(). callback(event, data,
+    timestamp) is called for the selected events, timestamp is the
+    time.monotonic_ns() when the event happened. The callback is called in
+    the thread doing the I/O or, when queued is true, from a background
+    thread so that slow consumers (formatting, logging) do not delay the
+    I/O. At most max_queue events are queued, further events are counted
+    in dropped.
+    """
+
+    def __init__(self, callback, events=None, queued=False, max_queue=10000):
+        self.callback = callback
+        self.events = frozenset(EVENTS if events is None else events)
+        if not self.events <= frozenset(EVENTS):
+            raise ValueError('unknown events: {!r}'.format(sorted(self.events - frozenset(EVENTS))))
+        self.queued = queued
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._busy = False
+        self._alive = True
+        self._thread = None
+        if queued:
+            self._thread = threading.Thread(target=self._run, name='serial-tap')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __call__(self, event, data, timestamp):
+        if not self.queued:
+            self.callback(event, data, timestamp)
+            return
+        with self._condition:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+            else:
+                self._queue.append((event, data, timestamp))
+                self._condition.notify_all()
+
+    def drain(self, timeout=None):
+        """\
+        Wait until all queued events are delivered. Return False if the
+        timeout expired before.
+        """
+        timeout = Timeout(timeout)
+        with self._condition:
+            while self._queue or self._busy:
+                if timeout.expired():
+                    return False
+                self._condition.wait(timeout.time_left())
+        return True
+
+    def close(self, timeout=None):
+        """Deliver the queued events, then stop the background thread"""
+        if self._thread is not None:
+            self.drain(timeout)
+            with self._condition:
+                self._alive = False
+                self._condition.notify_all()
+            self._thread.join(timeout)
+            self._thread = None
+
+    def handle_exception(self):
+        """Called from the background thread when the callback raised an exception"""
+        traceback.print_exc()
+
+    def _run(self):
+        """Deliver queued events"""
+        while True:
+            with self._condition:
+                while not self._queue and self._alive:
+                    self._condition.wait()
+                if not self._queue:
+                    break
+                events = list(self._queue)
+                self._queue.clear()
+                self._busy = True
+            for event in events:
+                try:
+                    self.callback(*event)
+                except Exception:
+                    self.handle_exception()
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+
+
+def _buffer_size(b):
+    """Size in bytes of a bytes-like object"""
+    view = memoryview(b)
+    return view.itemsize * len(view)
+
+
+def _buffer_head(b, n):
+    """First n bytes of a bytes-like object"""
+    return memoryview(b).tobytes()[:n]
+
+
+class _Instrumentation(object):
+    """\
+    Replaces the I/O methods of a port instance with wrappers that update
+    port._stats and call port._emit_tap(). Installed by the port while
+    statistics are enabled or taps are registered.
+    """
+
+    # wrapped when the backend has them, with the _wrap_<name> method
+    METHODS = ('read', 'readinto', 'read_timestamped', 'readinto_timestamped', 'read_frame',
+               'read_until', 'expect', 'write', 'write_vectored', 'send_file',
+               'flush', 'reset_input_buffer', 'reset_output_buffer', 'send_break',
+               'cancel_read', 'cancel_write', '_reconfigure_port')
+
+    def __init__(self, port):
+        self.port = port
+        # only the outermost call is recorded, e.g. read() may use readinto()
+        self._nested = threading.local()
+
+    def install(self):
+        for name in self.METHODS:
+            method = getattr(self.port, name, None)
+            if method is not None:
+                setattr(self.port, name, getattr(self, '_wrap_' + name.lstrip('_'))(method))
+
+    def uninstall(self):
+        for name in self.METHODS:
+            self.port.__dict__.pop(name, None)
+
+    def _transfer(self, direction, function, requested, count, data, timestamp=None):
+        """\
+        Call function(), update the statistics and emit the data. direction
+        is 'read' or 'write', count(result) returns the number of bytes
+        transferred, data(result) the bytes (or data is None). timestamp(result)
+        returns the arrival time of the data if the call reports it.
+        """
+        if getattr(self._nested, direction, False):
+            return function()
+        setattr(self._nested, direction, True)
+        port = self.port
+        stats = port._stats
+        start = _monotonic_ns()
+        try:
+            result = function()
+        except SerialTimeoutException:
+            if stats is not None:
+                setattr(stats, direction + '_timeouts', getattr(stats, direction + '_timeouts') + 1)
+            raise
+        except SerialException:
+            if stats is not None:
+                stats.errors += 1
+            raise
+        finally:
+            setattr(self._nested, direction, False)
+        end = _monotonic_ns()
+        if stats is not None:
+            n = count(result)
+            if direction == 'read':
+                stats.read_calls += 1
+                stats.read_bytes += n
+                stats.read_wait.record(end - start)
+                if requested is not None and n < requested and port.timeout:
+                    stats.read_timeouts += 1
+            else:
+                stats.write_calls += 1
+                stats.write_bytes += n
+                stats.write_latency.record(end - start)
+        if port._taps is not None and data is not None:
+            arrival = None if timestamp is None else timestamp(result)
+            port._emit_tap('rx' if direction == 'read' else 'tx', data(result),
+                           end if arrival is None else arrival)
+        return result
+
+    def _wrap_read(self, method):
+        def read(size=1):
+            return self._transfer('read', lambda: method(size), size, len, lambda result: result)
+        return read
+
+    def _wrap_readinto(self, method):
+        def readinto(b):
+            return self._transfer('read', lambda: method(b), _buffer_size(b),
+                                  lambda n: n, lambda n: _buffer_head(b, n))
+        return readinto
+
+    def _wrap_read_timestamped(self, method):
+        def read_timestamped(size=1, chunks=None):
+            return self._transfer('read', lambda: method(size, chunks), size,
+                                  lambda result: len(result[0]), lambda result: result[0],
+                                  lambda result: result[1])
+        return read_timestamped
+
+    def _wrap_readinto_timestamped(self, method):
+        def readinto_timestamped(b, chunks=None):
+            return self._transfer('read', lambda: method(b, chunks), _buffer_size(b),
+                                  lambda result: result[0], lambda result: _buffer_head(b, result[0]),
+                                  lambda result: result[1])
+        return readinto_timestamped
+
+    def _wrap_read_frame(self, method):
+        def read_frame(*args, **kwargs):
+            # frames end with a gap, that is not a timeout
+            return self._transfer('read', lambda: method(*args, **kwargs), None, len, lambda result: result)
+        return read_frame
+
+    def _wrap_read_until(self, method):
+        # recorded as one call: the data read past the end is kept by the
+        # port and must not be reported twice
+        def read_until(*args, **kwargs):
+            return self._transfer('read', lambda: method(*args, **kwargs), None, len, lambda result: result)
+        return read_until
+
+    def _wrap_expect(self, method):
+        def expect(*args, **kwargs):
+            return self._transfer('read', lambda: method(*args, **kwargs), None,
+                                  lambda result: len(result[2]), lambda result: result[2])
+        return expect
+
+    def _wrap_write(self, method):
+        def write(data):
+            return self._transfer('write', lambda: method(data), None,
+                                  lambda n: n or 0, lambda n: to_bytes(data)[:n])
+        return write
+
+    def _wrap_write_vectored(self, method):
+        def write_vectored(buffers):
+            buffers = list(buffers)
+            return self._transfer('write', lambda: method(buffers), None,
+                                  lambda n: n, lambda n: b''.join(to_bytes(b) for b in buffers)[:n])
+        return write_vectored
+
+    def _wrap_send_file(self, method):
+        def send_file(*args, **kwargs):
+            if self.port._taps is None:
+                return self._transfer('write', lambda: method(*args, **kwargs), None, lambda n: n, None)
+            # the data is sent with write() then, which reports it as 'tx'
+            sent = method(*args, **kwargs)
+            self.port._emit_tap('control', ('send_file', sent))
+            return sent
+        return send_file
+
+    def _control_wrapper(self, name, method):
+        def control():
+            if self.port._taps is not None:
+                self.port._emit_tap('control', (name, None))
+            return method()
+        return control
+
+    def _wrap_flush(self, method):
+        return self._control_wrapper('flush', method)
+
+    def _wrap_reset_input_buffer(self, method):
+        return self._control_wrapper('reset_input_buffer', method)
+
+    def _wrap_reset_output_buffer(self, method):
+        return self._control_wrapper('reset_output_buffer', method)
+
+    def _wrap_send_break(self, method):
+        def send_break(duration=0.25):
+            if self.port._taps is not None:
+                self.port._emit_tap('control', ('send_break', duration))
+            return method(duration)
+        return send_break
+
+    def _cancel_wrapper(self, direction, method):
+        def cancel():
+            if self.port._stats is not None:
+                self.port._stats.cancels += 1
+            if self.port._taps is not None:
+                self.port._emit_tap('cancel', direction)
+            return method()
+        return cancel
+
+    def _wrap_cancel_read(self, method):
+        return self._cancel_wrapper('read', method)
+
+    def _wrap_cancel_write(self, method):
+        return self._cancel_wrapper('write', method)
+
+    def _wrap_reconfigure_port(self, method):
+        def reconfigure(*args, **kwargs):
+            if self.port._stats is not None:
+                self.port._stats.reconfigures += 1
+            result = method(*args, **kwargs)
+            if self.port._taps is not None:
+                self.port._emit_tap('reconfigure', self.port.get_settings())
+            return result
+        return reconfigure
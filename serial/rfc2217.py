@@ -381,6 +381,8 @@ class Serial(SerialBase):
     BAUDRATES = (50, 75, 110, 134, 150, 200, 300, 600, 1200, 1800, 2400, 4800,
                  9600, 19200, 38400, 57600, 115200)
 
+    _timeout_per_read = True
+
     def __init__(self, *args, **kwargs):
         self._thread = None
         self._socket = None
@@ -599,7 +601,7 @@ class Serial(SerialBase):
         """Return the number of bytes currently in the input buffer."""
         if not self.is_open:
             raise PortNotOpenError()
-        return self._read_buffer.qsize()
+        return self._read_buffer.qsize() + len(self._read_ahead)
 
     def read(self, size=1):
         """\
@@ -609,7 +611,7 @@ class Serial(SerialBase):
         """
         if not self.is_open:
             raise PortNotOpenError()
-        data = bytearray()
+        data = self._take_read_ahead(size)
         try:
             timeout = Timeout(self._timeout)
             while len(data) < size:
@@ -635,6 +637,8 @@ class Serial(SerialBase):
             raise PortNotOpenError()
         with self._write_lock:
             try:
+                if self._stats is not None:
+                    self._stats.write_syscalls += 1
                 self._socket.sendall(to_bytes(data).replace(IAC, IAC_DOUBLED))
             except socket.error as e:
                 raise SerialException("connection failed (socket error): {}".format(e))
@@ -646,6 +650,7 @@ class Serial(SerialBase):
             raise PortNotOpenError()
         self.rfc2217_send_purge(PURGE_RECEIVE_BUFFER)
         # empty read buffer
+        del self._read_ahead[:]
         while self._read_buffer.qsize():
             self._read_buffer.get(False)
 
@@ -1013,11 +1018,12 @@ class PortManager(object):
         read control lines from serial port and compare the last value sent to remote.
         send updates on changes.
         """
+        status = self.serial.modem_status()
         modemstate = (
-            (self.serial.cts and MODEMSTATE_MASK_CTS) |
-            (self.serial.dsr and MODEMSTATE_MASK_DSR) |
-            (self.serial.ri and MODEMSTATE_MASK_RI) |
-            (self.serial.cd and MODEMSTATE_MASK_CD))
+            (status.cts and MODEMSTATE_MASK_CTS) |
+            (status.dsr and MODEMSTATE_MASK_DSR) |
+            (status.ri and MODEMSTATE_MASK_RI) |
+            (status.cd and MODEMSTATE_MASK_CD))
         # check what has changed
         deltas = modemstate ^ (self.last_modemstate or 0)  # when last is None -> 0
         if deltas & MODEMSTATE_MASK_CTS:
@@ -1059,8 +1065,40 @@ class PortManager(object):
             else:
                 yield byte
 
+    @staticmethod
+    def escape_bytes(data):
+        """\
+        Escape outgoing data like escape(), but return bytes and work on the
+        whole block at once instead of byte by byte.
+
+        socket.sendall(escape_bytes(data))
+        """
+        return to_bytes(data).replace(IAC, IAC_DOUBLED)
+
     # - incoming data filter
 
+    def filter_bytes(self, data):
+        """\
+        Like filter(), but return the data as bytes. Data between Telnet
+        commands is passed on as a block, only the commands themselves are
+        processed byte by byte.
+        """
+        data = to_bytes(data)
+        out = bytearray()
+        i = 0
+        while i < len(data):
+            if self.mode == M_NORMAL and self.suboption is None:
+                pos = data.find(IAC, i)
+                if pos < 0:
+                    pos = len(data)
+                out += data[i:pos]
+                i = pos
+                if i == len(data):
+                    break
+            out.extend(b''.join(self.filter(data[i:i + 1])))
+            i += 1
+        return bytes(out)
+
     def filter(self, data):
         """\
         Handle a bunch of incoming bytes. This is a generator. It will yield
@@ -149,7 +149,7 @@ class Serial(SerialBase):
         """Return the number of characters currently in the input buffer."""
         if not self.is_open:
             raise PortNotOpenError()
-        return self._port_handle.BytesToRead
+        return self._port_handle.BytesToRead + len(self._read_ahead)
 
     def read(self, size=1):
         """\
@@ -161,7 +161,8 @@ class Serial(SerialBase):
             raise PortNotOpenError()
         # must use single byte reads as this is the only way to read
         # without applying encodings
-        data = bytearray()
+        data = self._take_read_ahead(size)
+        size -= len(data)
         while size:
             try:
                 data.append(self._port_handle.ReadByte())
@@ -189,6 +190,7 @@ class Serial(SerialBase):
         """Clear input buffer, discarding all that is in the buffer."""
         if not self.is_open:
             raise PortNotOpenError()
+        del self._read_ahead[:]
         self._port_handle.DiscardInBuffer()
 
     def reset_output_buffer(self):
@@ -153,7 +153,7 @@ class Serial(SerialBase):
         """Return the number of characters currently in the input buffer."""
         if not self.sPort:
             raise PortNotOpenError()
-        return self._instream.available()
+        return self._instream.available() + len(self._read_ahead)
 
     def read(self, size=1):
         """\
@@ -163,7 +163,7 @@ class Serial(SerialBase):
         """
         if not self.sPort:
             raise PortNotOpenError()
-        read = bytearray()
+        read = self._take_read_ahead(size)
         if size > 0:
             while len(read) < size:
                 x = self._instream.read()
@@ -187,6 +187,7 @@ class Serial(SerialBase):
         """Clear input buffer, discarding all that is in the buffer."""
         if not self.sPort:
             raise PortNotOpenError()
+        del self._read_ahead[:]
         self._instream.skip(self._instream.available())
 
     def reset_output_buffer(self):
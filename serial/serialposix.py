@@ -29,6 +29,7 @@
 from __future__ import absolute_import
 
 # pylint: disable=abstract-method
+import collections
 import errno
 import fcntl
 import os
@@ -37,10 +38,12 @@ import select
 import struct
 import sys
 import termios
+import threading
 
 import serial
 from serial.serialutil import SerialBase, SerialException, to_bytes, \
-    PortNotOpenError, SerialTimeoutException, Timeout
+    PortNotOpenError, SerialTimeoutException, Timeout, ModemStatus, _advance_buffers, \
+    _byte_view, _monotonic_ns, _send_file_size, _SendFileProgress, SEND_FILE_BLOCKSIZE
 
 
 class PlatformSpecificBase(object):
@@ -307,6 +310,109 @@ TIOCM_DTR_str = struct.pack('I', TIOCM_DTR)
 TIOCSBRK = getattr(termios, 'TIOCSBRK', 0x5427)
 TIOCCBRK = getattr(termios, 'TIOCCBRK', 0x5428)
 
+# wait for modem line changes and line statistics, Linux only
+TIOCMIWAIT = getattr(termios, 'TIOCMIWAIT', 0x545C if plat[:5] == 'linux' else None)
+TIOCGICOUNT = getattr(termios, 'TIOCGICOUNT', 0x545D if plat[:5] == 'linux' else None)
+
+# struct serial_icounter_struct: 11 counters followed by reserved fields
+ICOUNTER_FORMAT = '20I'
+
+# kernel line statistics as returned by Serial.line_counters(). cts, dsr, ri
+# and cd count transitions of the modem lines, rx and tx count bytes, the
+# others count errors (buf_overrun: data lost as the tty buffer was full)
+LineCounters = collections.namedtuple(
+    'LineCounters',
+    'cts dsr ri cd rx tx frame overrun parity brk buf_overrun')
+
+
+if hasattr(os, 'readv'):
+    def _os_readinto(fd, view):
+        """Read from fd directly into the memoryview, return the byte count"""
+        return os.readv(fd, [view])
+else:
+    def _os_readinto(fd, view):
+        """Read from fd into the memoryview (Python 2.x: via a temporary)"""
+        data = os.read(fd, len(view))
+        view[:len(data)] = data
+        return len(data)
+
+
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 16    # minimum required by POSIX
+
+if hasattr(os, 'writev'):
+    def _os_writev(fd, views):
+        """Write a list of memoryviews with one system call"""
+        if len(views) == 1:
+            return os.write(fd, views[0])
+        return os.writev(fd, views[:IOV_MAX])
+else:
+    def _os_writev(fd, views):
+        """Write the first of a list of memoryviews (Python 2.x)"""
+        return os.write(fd, views[0])
+
+
+# read() reuses a buffer of the port for sizes up to this, larger reads
+# allocate their own
+READ_BUFFER_SIZE = 64 * 1024
+
+# cancel_read()/cancel_write() wake up a waiting read/write by making an fd
+# readable. an eventfd (Linux, Python 3.10+) needs one fd instead of a pipe
+# pair. the token is 8 bytes as required by eventfd, pipes accept it as well.
+ABORT_TOKEN = struct.pack('=Q', 1)
+
+
+def _abort_fds():
+    """Return a (read, write) fd pair to signal aborts, the same eventfd if available"""
+    if hasattr(os, 'eventfd'):
+        try:
+            fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+        except OSError:
+            pass    # e.g. blocked by a seccomp filter, use a pipe
+        else:
+            return fd, fd
+    abort_r, abort_w = os.pipe()
+    fcntl.fcntl(abort_r, fcntl.F_SETFL, os.O_NONBLOCK)
+    return abort_r, abort_w
+
+
+def _close_abort_fds(abort_r, abort_w):
+    """Close a pair returned by _abort_fds()"""
+    os.close(abort_r)
+    if abort_w != abort_r:
+        os.close(abort_w)
+
+
+class _ModemChangeWaiter(threading.Thread):
+    """\
+    Helper thread for Serial.wait_modem_change(), it blocks in one TIOCMIWAIT
+    ioctl until one of the lines in mask changes.
+
+    The ioctl cannot be interrupted. When the port is closed, the thread
+    keeps waiting until the next change or hang up. It uses its own copy of
+    the file descriptor, so that a number reused after close() is never
+    touched, and closes it when the ioctl returns.
+    """
+
+    def __init__(self, fd, mask):
+        super(_ModemChangeWaiter, self).__init__()
+        self.daemon = True
+        self.fd = os.dup(fd)
+        self.mask = mask
+        self.error = None
+        self.done = threading.Event()
+
+    def run(self):
+        try:
+            fcntl.ioctl(self.fd, TIOCMIWAIT, self.mask)
+        except IOError as e:
+            self.error = e
+        finally:
+            os.close(self.fd)
+        self.done.set()
+
 
 class Serial(SerialBase, PlatformSpecific):
     """\
@@ -315,6 +421,17 @@ class Serial(SerialBase, PlatformSpecific):
     systems.
     """
 
+    # termios state last applied by _reconfigure_port(), None when unknown.
+    # saves a tcgetattr() and unneeded tcsetattr() calls on setting changes
+    _termios_attr = None
+    _timeout_per_read = True
+    _termios_custom_baud = None
+    # helper thread for wait_modem_change()
+    _modem_waiter = None
+    _modem_wait_unsupported = False
+    # reused by read(), see _get_read_buffer()
+    _read_buffer = None
+
     def open(self):
         """\
         Open port with current settings. This may throw a SerialException
@@ -350,10 +467,8 @@ class Serial(SerialBase, PlatformSpecific):
 
             self._reset_input_buffer()
 
-            self.pipe_abort_read_r, self.pipe_abort_read_w = os.pipe()
-            self.pipe_abort_write_r, self.pipe_abort_write_w = os.pipe()
-            fcntl.fcntl(self.pipe_abort_read_r, fcntl.F_SETFL, os.O_NONBLOCK)
-            fcntl.fcntl(self.pipe_abort_write_r, fcntl.F_SETFL, os.O_NONBLOCK)
+            self.pipe_abort_read_r, self.pipe_abort_read_w = _abort_fds()
+            self.pipe_abort_write_r, self.pipe_abort_write_w = _abort_fds()
         except BaseException:
             try:
                 os.close(self.fd)
@@ -363,18 +478,12 @@ class Serial(SerialBase, PlatformSpecific):
                 pass
             self.fd = None
 
-            if self.pipe_abort_read_w is not None:
-                os.close(self.pipe_abort_read_w)
-                self.pipe_abort_read_w = None
             if self.pipe_abort_read_r is not None:
-                os.close(self.pipe_abort_read_r)
-                self.pipe_abort_read_r = None
-            if self.pipe_abort_write_w is not None:
-                os.close(self.pipe_abort_write_w)
-                self.pipe_abort_write_w = None
+                _close_abort_fds(self.pipe_abort_read_r, self.pipe_abort_read_w)
+                self.pipe_abort_read_r, self.pipe_abort_read_w = None, None
             if self.pipe_abort_write_r is not None:
-                os.close(self.pipe_abort_write_r)
-                self.pipe_abort_write_r = None
+                _close_abort_fds(self.pipe_abort_write_r, self.pipe_abort_write_w)
+                self.pipe_abort_write_r, self.pipe_abort_write_w = None, None
 
             raise
 
@@ -397,15 +506,17 @@ class Serial(SerialBase, PlatformSpecific):
 
         custom_baud = None
 
-        vmin = vtime = 0                # timeout is done via select
-        if self._inter_byte_timeout is not None:
-            vmin = 1
-            vtime = int(self._inter_byte_timeout * 10)
-        try:
-            orig_attr = termios.tcgetattr(self.fd)
-            iflag, oflag, cflag, lflag, ispeed, ospeed, cc = orig_attr
-        except termios.error as msg:      # if a port is nonexistent but has a /dev file, it'll fail here
-            raise SerialException("Could not configure port: {}".format(msg))
+        vmin, vtime = self._termios_vmin_vtime()
+        # start from the last applied state, only query the port if unknown
+        if force_update or self._termios_attr is None:
+            try:
+                orig_attr = termios.tcgetattr(self.fd)
+            except termios.error as msg:      # if a port is nonexistent but has a /dev file, it'll fail here
+                raise SerialException("Could not configure port: {}".format(msg))
+        else:
+            orig_attr = self._termios_attr
+        iflag, oflag, cflag, lflag, ispeed, ospeed, cc = orig_attr
+        cc = list(cc)   # do not modify the cached state
         # set up raw mode / no echo / binary
         cflag |= (termios.CLOCAL | termios.CREAD)
         lflag &= ~(termios.ICANON | termios.ECHO | termios.ECHOE |
@@ -520,29 +631,42 @@ class Serial(SerialBase, PlatformSpecific):
             raise ValueError('Invalid vtime: {!r}'.format(vtime))
         cc[termios.VTIME] = vtime
         # activate settings
-        if force_update or [iflag, oflag, cflag, lflag, ispeed, ospeed, cc] != orig_attr:
-            termios.tcsetattr(
-                self.fd,
-                termios.TCSANOW,
-                [iflag, oflag, cflag, lflag, ispeed, ospeed, cc])
+        new_attr = [iflag, oflag, cflag, lflag, ispeed, ospeed, cc]
+        changed = force_update or new_attr != orig_attr
+        if changed:
+            try:
+                termios.tcsetattr(self.fd, termios.TCSANOW, new_attr)
+            except termios.error:
+                # state of the port is unknown, query it again next time
+                self._termios_attr = None
+                raise
+        self._termios_attr = new_attr
 
         # apply custom baud rate, if any
-        if custom_baud is not None:
+        if custom_baud is not None and (changed or custom_baud != self._termios_custom_baud):
             self._set_special_baudrate(custom_baud)
+        self._termios_custom_baud = custom_baud
 
         if self._rs485_mode is not None:
             self._set_rs485_mode(self._rs485_mode)
 
+    def _termios_vmin_vtime(self):
+        """Return the (VMIN, VTIME) values for the current timeout settings"""
+        if self._inter_byte_timeout is not None:
+            return 1, int(self._inter_byte_timeout * 10)
+        return 0, 0     # timeout is done via select
+
     def close(self):
         """Close port"""
         if self.is_open:
             if self.fd is not None:
                 os.close(self.fd)
                 self.fd = None
-                os.close(self.pipe_abort_read_w)
-                os.close(self.pipe_abort_read_r)
-                os.close(self.pipe_abort_write_w)
-                os.close(self.pipe_abort_write_r)
+                self._termios_attr = None
+                self._modem_waiter = None
+                self._read_buffer = None
+                _close_abort_fds(self.pipe_abort_read_r, self.pipe_abort_read_w)
+                _close_abort_fds(self.pipe_abort_write_r, self.pipe_abort_write_w)
                 self.pipe_abort_read_r, self.pipe_abort_read_w = None, None
                 self.pipe_abort_write_r, self.pipe_abort_write_w = None, None
             self.is_open = False
@@ -554,9 +678,8 @@ class Serial(SerialBase, PlatformSpecific):
         """Return the number of bytes currently in the input buffer."""
         #~ s = fcntl.ioctl(self.fd, termios.FIONREAD, TIOCM_zero_str)
         s = fcntl.ioctl(self.fd, TIOCINQ, TIOCM_zero_str)
-        return struct.unpack('I', s)[0]
+        return struct.unpack('I', s)[0] + len(self._read_ahead)
 
-    # select based implementation, proved to work on many systems
     def read(self, size=1):
         """\
         Read size bytes from the serial port. If a timeout is set it may
@@ -565,13 +688,79 @@ class Serial(SerialBase, PlatformSpecific):
         """
         if not self.is_open:
             raise PortNotOpenError()
-        read = bytearray()
+        view = self._get_read_buffer(size)
+        n = self.readinto(view)
+        return bytes(view[:n])
+
+    def _get_read_buffer(self, size):
+        """\
+        Return a writable memoryview of size bytes for read(). Sizes up to
+        READ_BUFFER_SIZE share one buffer, so that reads do not allocate and
+        clear a new bytearray each time.
+        """
+        size = max(size, 0)
+        if size > READ_BUFFER_SIZE:
+            return memoryview(bytearray(size))
+        if self._read_buffer is None or len(self._read_buffer) < size:
+            self._read_buffer = bytearray(size)
+        return memoryview(self._read_buffer)[:size]
+
+    def readinto(self, b):
+        """\
+        Read bytes into a pre-allocated, writable bytes-like object b and
+        return the number of bytes read. The data is read directly into b,
+        timeout and cancel_read() behave the same as for read().
+        """
+        return self._readinto(b, None)
+
+    def read_timestamped(self, size=1, chunks=None):
+        """\
+        Like read() but return a tuple (data, timestamp). See
+        readinto_timestamped() for timestamp and chunks.
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        view = self._get_read_buffer(size)
+        n, timestamp = self.readinto_timestamped(view, chunks)
+        return bytes(view[:n]), timestamp
+
+    def readinto_timestamped(self, b, chunks=None):
+        """\
+        Like readinto() but return a tuple (n, timestamp). timestamp is the
+        time.monotonic_ns() when the first data arrived, taken right after
+        waiting for the port woke up, or None when nothing was read. When a
+        list is passed as chunks, an (offset, timestamp) tuple is appended
+        to it for each chunk of data read. Data already buffered (e.g. the
+        surplus of read_until()) is stamped when it is taken.
+        """
+        stamps = [] if chunks is None else chunks
+        start = len(stamps)
+        n = self._readinto(b, stamps)
+        return n, (stamps[start][1] if len(stamps) > start else None)
+
+    def _take_read_ahead_into(self, view, stamps):
+        """Copy buffered data to the start of view, return the byte count"""
+        data = self._take_read_ahead(len(view))
+        view[:len(data)] = data
+        if stamps is not None and data:
+            stamps.append((0, _monotonic_ns()))
+        return len(data)
+
+    # select based implementation, proved to work on many systems
+    def _readinto(self, b, stamps):
+        """readinto(), stamps is None or a list to append (offset, timestamp) to"""
+        if not self.is_open:
+            raise PortNotOpenError()
+        view = _byte_view(b)
+        size = len(view)
+        n_read = 0
+        if self._read_ahead:
+            n_read = self._take_read_ahead_into(view, stamps)
         timeout = Timeout(self._timeout)
-        while len(read) < size:
+        while n_read < size:
             try:
-                ready, _, _ = select.select([self.fd, self.pipe_abort_read_r], [], [], timeout.time_left())
-                if self.pipe_abort_read_r in ready:
-                    os.read(self.pipe_abort_read_r, 1000)
+                abort, ready = self._wait_read(timeout.time_left())
+                if abort:
                     break
                 # If select was used with a timeout, and the timeout occurs, it
                 # returns with empty lists -> thus abort read operation.
@@ -579,7 +768,11 @@ class Serial(SerialBase, PlatformSpecific):
                 # there is nothing to read.
                 if not ready:
                     break   # timeout
-                buf = os.read(self.fd, size - len(read))
+                if stamps is not None:
+                    woken = _monotonic_ns()
+                if self._stats is not None:
+                    self._stats.read_syscalls += 1
+                n = _os_readinto(self.fd, view[n_read:])
             except OSError as e:
                 # this is for Python 3.x where select.error is a subclass of
                 # OSError ignore BlockingIOErrors and EINTR. other errors are shown
@@ -595,37 +788,123 @@ class Serial(SerialBase, PlatformSpecific):
             else:
                 # read should always return some data as select reported it was
                 # ready to read when we get to this point.
-                if not buf:
+                if not n:
                     # Disconnected devices, at least on Linux, show the
                     # behavior that they are always ready to read immediately
                     # but reading returns nothing.
                     raise SerialException(
                         'device reports readiness to read but returned no data '
                         '(device disconnected or multiple access on port?)')
-                read.extend(buf)
+                if stamps is not None:
+                    stamps.append((n_read, woken))
+                n_read += n
 
             if timeout.expired():
                 break
-        return bytes(read)
+        return n_read
+
+    def read_frame(self, size=4096, gap=None):
+        """\
+        Read a frame that is delimited by silence on the line, as used by
+        Modbus RTU. Wait up to timeout for the first byte, then read until
+        no data arrived for gap seconds (default: 3.5 character times) or
+        size bytes were read. Return the frame as bytes, empty on timeout.
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        if gap is None:
+            gap = 3.5 * self.character_time
+        frame = bytearray(size)
+        view = _byte_view(frame)
+        n_read = 0
+        if self._read_ahead:
+            n_read = self._take_read_ahead_into(view, None)
+        timeout = Timeout(self._timeout)
+        while n_read < size:
+            try:
+                # the first byte may take up to timeout, all others must
+                # follow within the gap
+                abort, ready = self._wait_read(gap if n_read else timeout.time_left())
+                if abort or not ready:
+                    break
+                if self._stats is not None:
+                    self._stats.read_syscalls += 1
+                n = _os_readinto(self.fd, view[n_read:])
+            except OSError as e:
+                # ignore BlockingIOErrors and EINTR, as in _readinto()
+                if e.errno not in (errno.EAGAIN, errno.EALREADY, errno.EWOULDBLOCK, errno.EINPROGRESS, errno.EINTR):
+                    raise SerialException('read failed: {}'.format(e))
+            except select.error as e:
+                # this is for Python 2.x
+                if e[0] not in (errno.EAGAIN, errno.EALREADY, errno.EWOULDBLOCK, errno.EINPROGRESS, errno.EINTR):
+                    raise SerialException('read failed: {}'.format(e))
+            else:
+                if not n:
+                    raise SerialException(
+                        'device reports readiness to read but returned no data '
+                        '(device disconnected or multiple access on port?)')
+                n_read += n
+            if not n_read and timeout.expired():
+                break
+        del view    # release the buffer, so that frame can be resized
+        del frame[n_read:]
+        return bytes(frame)
+
+    def _wait_read(self, timeout):
+        """\
+        Wait until the port is readable or cancel_read() was called. timeout
+        is in seconds, None blocks. Returns a tuple (aborted, ready).
+        """
+        ready, _, _ = select.select([self.fd, self.pipe_abort_read_r], [], [], timeout)
+        if self.pipe_abort_read_r in ready:
+            os.read(self.pipe_abort_read_r, 1000)
+            return True, False
+        return False, bool(ready)
+
+    def _wait_write(self, timeout):
+        """\
+        Wait until the port is writable or cancel_write() was called. timeout
+        is in seconds, None blocks. Returns a tuple (aborted, ready).
+        """
+        abort, ready, _ = select.select([self.pipe_abort_write_r], [self.fd], [], timeout)
+        if abort:
+            os.read(self.pipe_abort_write_r, 1000)
+            return True, False
+        return False, bool(ready)
 
     def cancel_read(self):
         if self.is_open:
-            os.write(self.pipe_abort_read_w, b"x")
+            os.write(self.pipe_abort_read_w, ABORT_TOKEN)
 
     def cancel_write(self):
         if self.is_open:
-            os.write(self.pipe_abort_write_w, b"x")
+            os.write(self.pipe_abort_write_w, ABORT_TOKEN)
 
     def write(self, data):
         """Output the given byte string over the serial port."""
         if not self.is_open:
             raise PortNotOpenError()
-        d = to_bytes(data)
-        tx_len = length = len(d)
+        return self._write_views([memoryview(to_bytes(data))])
+
+    def write_vectored(self, buffers):
+        """\
+        Output a sequence of byte strings over the serial port. The buffers
+        are handed to the OS in one writev() call, without joining them.
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self._write_views([memoryview(to_bytes(b)) for b in buffers])
+
+    def _write_views(self, views):
+        """Write loop for a list of memoryviews, partial writes advance the views."""
+        views = [v for v in views if len(v)]
+        tx_len = length = sum(len(v) for v in views)
         timeout = Timeout(self._write_timeout)
         while tx_len > 0:
             try:
-                n = os.write(self.fd, d)
+                if self._stats is not None:
+                    self._stats.write_syscalls += 1
+                n = _os_writev(self.fd, views)
                 if timeout.is_non_blocking:
                     # Zero timeout indicates non-blocking - simply return the
                     # number of bytes of data actually written
@@ -635,22 +914,20 @@ class Serial(SerialBase, PlatformSpecific):
                     # with the time left as timeout
                     if timeout.expired():
                         raise SerialTimeoutException('Write timeout')
-                    abort, ready, _ = select.select([self.pipe_abort_write_r], [self.fd], [], timeout.time_left())
+                    abort, ready = self._wait_write(timeout.time_left())
                     if abort:
-                        os.read(self.pipe_abort_write_r, 1000)
                         break
                     if not ready:
                         raise SerialTimeoutException('Write timeout')
                 else:
                     assert timeout.time_left() is None
                     # wait for write operation
-                    abort, ready, _ = select.select([self.pipe_abort_write_r], [self.fd], [], None)
+                    abort, ready = self._wait_write(None)
                     if abort:
-                        os.read(self.pipe_abort_write_r, 1)
                         break
                     if not ready:
                         raise SerialException('write failed (select)')
-                d = d[n:]
+                _advance_buffers(views, n)
                 tx_len -= n
             except SerialException:
                 raise
@@ -666,9 +943,55 @@ class Serial(SerialBase, PlatformSpecific):
                 # see also http://www.python.org/dev/peps/pep-3151/#select
                 if e[0] not in (errno.EAGAIN, errno.EALREADY, errno.EWOULDBLOCK, errno.EINPROGRESS, errno.EINTR):
                     raise SerialException('write failed: {}'.format(e))
-            if not timeout.is_non_blocking and timeout.expired():
+            if timeout.is_non_blocking:
+                # nothing could be written without blocking
+                break
+            if timeout.expired():
                 raise SerialTimeoutException('Write timeout')
-        return length - len(d)
+        return length - tx_len
+
+    def send_file(self, fileobj, offset=0, count=None, progress=None):
+        """\
+        Send the contents of a binary file object, starting at offset, count
+        bytes or up to the end of the file. Uses os.sendfile() where
+        possible, so the data is not copied through Python. See
+        SerialBase.send_file() for progress and the return value. While
+        taps are registered, the data is sent with write() so that they see
+        it.
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        total = _send_file_size(fileobj, offset, count)
+        if not hasattr(os, 'sendfile') or total is None or self._taps is not None:
+            return super(Serial, self).send_file(fileobj, offset, count, progress)
+        in_fd = fileobj.fileno()
+        report = _SendFileProgress(progress, total)
+        timeout = Timeout(self._write_timeout)
+        sent = 0
+        while sent < total:
+            try:
+                if self._stats is not None:
+                    self._stats.write_syscalls += 1
+                n = os.sendfile(self.fd, in_fd, offset + sent, min(SEND_FILE_BLOCKSIZE, total - sent))
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    abort, ready = self._wait_write(timeout.time_left())
+                    if abort:
+                        break
+                    if not ready:
+                        raise SerialTimeoutException('Write timeout')
+                    continue
+                if not sent and e.errno in (errno.EINVAL, errno.ENOSYS):
+                    # sendfile() not supported for this file or kernel
+                    return super(Serial, self).send_file(fileobj, offset, count, progress)
+                raise SerialException('send_file failed: {}'.format(e))
+            if not n:
+                break   # end of file, it was truncated meanwhile
+            sent += n
+            report(sent)
+        fileobj.seek(offset + sent)
+        self.flush()
+        return sent
 
     def flush(self):
         """\
@@ -681,6 +1004,7 @@ class Serial(SerialBase, PlatformSpecific):
 
     def _reset_input_buffer(self):
         """Clear input buffer, discarding all that is in the buffer."""
+        del self._read_ahead[:]
         termios.tcflush(self.fd, termios.TCIFLUSH)
 
     def reset_input_buffer(self):
@@ -721,37 +1045,119 @@ class Serial(SerialBase, PlatformSpecific):
         else:
             fcntl.ioctl(self.fd, TIOCMBIC, TIOCM_DTR_str)
 
+    def line_counters(self, since=None):
+        """\
+        Read the line statistics of the driver (TIOCGICOUNT, Linux) and
+        return them as LineCounters tuple. When since is a LineCounters
+        tuple of an earlier call, the differences are returned. Returns None
+        if the port or platform does not provide the counters (e.g. ptys).
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        if TIOCGICOUNT is None:
+            return None
+        try:
+            buf = fcntl.ioctl(self.fd, TIOCGICOUNT, b'\0' * struct.calcsize(ICOUNTER_FORMAT))
+        except IOError as e:
+            if e.errno in (errno.EINVAL, errno.ENOTTY):
+                return None
+            raise SerialException('reading line counters failed: {}'.format(e))
+        counters = LineCounters(*struct.unpack(ICOUNTER_FORMAT, buf)[:len(LineCounters._fields)])
+        if since is not None:
+            # the kernel counters are 32 bit and wrap around
+            counters = LineCounters(*[(now - then) % 2 ** 32 for now, then in zip(counters, since)])
+        return counters
+
+    def _modem_bits(self):
+        """Read the state of all modem lines (TIOCM_* bits)"""
+        s = fcntl.ioctl(self.fd, TIOCMGET, TIOCM_zero_str)
+        return struct.unpack('I', s)[0]
+
+    def modem_status(self):
+        """\
+        Read all modem status lines with one ioctl, returns a ModemStatus
+        tuple (cts, dsr, ri, cd).
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        bits = self._modem_bits()
+        return ModemStatus(bits & TIOCM_CTS != 0, bits & TIOCM_DSR != 0,
+                           bits & TIOCM_RI != 0, bits & TIOCM_CD != 0)
+
+    def wait_modem_change(self, lines=ModemStatus._fields, timeout=None):
+        """\
+        Wait until one of the given modem status lines ('cts', 'dsr', 'ri',
+        'cd') changes. Returns the new ModemStatus or None on timeout.
+
+        Uses the TIOCMIWAIT ioctl (Linux) instead of polling. The ioctl has
+        no timeout, it is run in a helper thread that is reused by the next
+        call if this one times out. Closing the port does not end a pending
+        ioctl, the thread (one per port at most) ends with the next change.
+        Falls back to polling if the driver does not support it.
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        if TIOCMIWAIT is None or self._modem_wait_unsupported:
+            return super(Serial, self).wait_modem_change(lines, timeout)
+        for line in lines:
+            if line not in ModemStatus._fields:
+                raise ValueError('unknown modem line: {!r}'.format(line))
+        timeout = Timeout(timeout)
+        last = before = None
+        woken = False
+        while True:
+            # (re)start the waiter before the lines are read, so that no
+            # change can get lost in between
+            waiter = self._modem_waiter
+            if waiter is None or waiter.done.is_set():
+                waiter = self._modem_waiter = _ModemChangeWaiter(
+                    self.fd, TIOCM_CTS | TIOCM_DSR | TIOCM_RI | TIOCM_CD)
+                waiter.start()
+            status = self.modem_status()
+            if last is None:
+                last = status
+            elif any(getattr(status, line) != getattr(last, line) for line in lines):
+                return status
+            elif woken and status == before and 'ri' in lines:
+                # woken up without visible change: trailing edge of RI
+                return status
+            before = status
+            if not waiter.done.wait(timeout.time_left()):
+                return None
+            if waiter.error is not None:
+                if waiter.error.errno in (errno.EINVAL, errno.ENOTTY):
+                    self._modem_wait_unsupported = True
+                    return super(Serial, self).wait_modem_change(lines, timeout.time_left())
+                raise SerialException('waiting for modem line change failed: {}'.format(waiter.error))
+            woken = True
+
     @property
     def cts(self):
         """Read terminal status line: Clear To Send"""
         if not self.is_open:
             raise PortNotOpenError()
-        s = fcntl.ioctl(self.fd, TIOCMGET, TIOCM_zero_str)
-        return struct.unpack('I', s)[0] & TIOCM_CTS != 0
+        return self._modem_bits() & TIOCM_CTS != 0
 
     @property
     def dsr(self):
         """Read terminal status line: Data Set Ready"""
         if not self.is_open:
             raise PortNotOpenError()
-        s = fcntl.ioctl(self.fd, TIOCMGET, TIOCM_zero_str)
-        return struct.unpack('I', s)[0] & TIOCM_DSR != 0
+        return self._modem_bits() & TIOCM_DSR != 0
 
     @property
     def ri(self):
         """Read terminal status line: Ring Indicator"""
         if not self.is_open:
             raise PortNotOpenError()
-        s = fcntl.ioctl(self.fd, TIOCMGET, TIOCM_zero_str)
-        return struct.unpack('I', s)[0] & TIOCM_RI != 0
+        return self._modem_bits() & TIOCM_RI != 0
 
     @property
     def cd(self):
         """Read terminal status line: Carrier Detect"""
         if not self.is_open:
             raise PortNotOpenError()
-        s = fcntl.ioctl(self.fd, TIOCMGET, TIOCM_zero_str)
-        return struct.unpack('I', s)[0] & TIOCM_CD != 0
+        return self._modem_bits() & TIOCM_CD != 0
 
     # - - platform specific - - - -
 
@@ -797,6 +1203,18 @@ class Serial(SerialBase, PlatformSpecific):
         else:
             termios.tcflow(self.fd, termios.TCOOFF)
 
+    def resync_settings(self):
+        """\
+        Drop the cached termios state, query the port and apply the settings
+        again. Useful when the port was changed by other means, e.g. stty.
+        WARNING: this function is not portable to different platforms!
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        self._termios_attr = None
+        self._termios_custom_baud = None
+        self._reconfigure_port(force_update=True)
+
     def nonblocking(self):
         """DEPRECATED - has no use"""
         import warnings
@@ -810,39 +1228,119 @@ class PosixPollSerial(Serial):
     disconnecting while it's in use (e.g. USB-serial unplugged).
     """
 
-    def read(self, size=1):
-        """\
-        Read size bytes from the serial port. If a timeout is set it may
-        return less characters as requested. With no timeout it will block
-        until the requested number of bytes is read.
-        """
+    def _readinto(self, b, stamps):
+        """readinto(), stamps is None or a list to append (offset, timestamp) to"""
         if not self.is_open:
             raise PortNotOpenError()
-        read = bytearray()
+        view = _byte_view(b)
+        size = len(view)
+        n_read = 0
+        if self._read_ahead:
+            n_read = self._take_read_ahead_into(view, stamps)
         timeout = Timeout(self._timeout)
         poll = select.poll()
         poll.register(self.fd, select.POLLIN | select.POLLERR | select.POLLHUP | select.POLLNVAL)
         poll.register(self.pipe_abort_read_r, select.POLLIN | select.POLLERR | select.POLLHUP | select.POLLNVAL)
-        if size > 0:
-            while len(read) < size:
-                # print "\tread(): size",size, "have", len(read)    #debug
-                # wait until device becomes ready to read (or something fails)
-                for fd, event in poll.poll(None if timeout.is_infinite else (timeout.time_left() * 1000)):
-                    if fd == self.pipe_abort_read_r:
-                        break
-                    if event & (select.POLLERR | select.POLLHUP | select.POLLNVAL):
-                        raise SerialException('device reports error (poll)')
-                    #  we don't care if it is select.POLLIN or timeout, that's
-                    #  handled below
+        while n_read < size:
+            # wait until device becomes ready to read (or something fails)
+            abort = False
+            for fd, event in poll.poll(None if timeout.is_infinite else (timeout.time_left() * 1000)):
                 if fd == self.pipe_abort_read_r:
-                    os.read(self.pipe_abort_read_r, 1000)
+                    abort = True
                     break
-                buf = os.read(self.fd, size - len(read))
-                read.extend(buf)
-                if timeout.expired() \
-                        or (self._inter_byte_timeout is not None and self._inter_byte_timeout > 0) and not buf:
-                    break   # early abort on timeout
-        return bytes(read)
+                if event & (select.POLLERR | select.POLLHUP | select.POLLNVAL):
+                    raise SerialException('device reports error (poll)')
+                #  we don't care if it is select.POLLIN or timeout, that's
+                #  handled below
+            if abort:
+                os.read(self.pipe_abort_read_r, 1000)
+                break
+            if stamps is not None:
+                woken = _monotonic_ns()
+            try:
+                if self._stats is not None:
+                    self._stats.read_syscalls += 1
+                n = _os_readinto(self.fd, view[n_read:])
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EALREADY, errno.EWOULDBLOCK, errno.EINPROGRESS, errno.EINTR):
+                    raise SerialException('read failed: {}'.format(e))
+                n = 0
+            if stamps is not None and n:
+                stamps.append((n_read, woken))
+            n_read += n
+            if timeout.expired() \
+                    or (self._inter_byte_timeout is not None and self._inter_byte_timeout > 0) and not n:
+                break   # early abort on timeout
+        return n_read
+
+
+if hasattr(select, 'epoll'):
+    class EpollSerial(Serial):
+        """\
+        epoll based wait implementation (Linux). The port and the cancel
+        pipes are registered once when the port is opened and reused for all
+        read and write calls. There is no per call setup cost and no
+        FD_SETSIZE limit on the file descriptor numbers.
+        """
+
+        _epoll_read = None
+        _epoll_write = None
+
+        def open(self):
+            """\
+            Open port with current settings. This may throw a SerialException
+            if the port cannot be opened."""
+            super(EpollSerial, self).open()
+            try:
+                self._epoll_read = select.epoll()
+                self._epoll_read.register(self.fd, select.EPOLLIN)
+                self._epoll_read.register(self.pipe_abort_read_r, select.EPOLLIN)
+                self._epoll_write = select.epoll()
+                self._epoll_write.register(self.fd, select.EPOLLOUT)
+                self._epoll_write.register(self.pipe_abort_write_r, select.EPOLLIN)
+            except BaseException:
+                self.close()
+                raise
+
+        def close(self):
+            """Close port"""
+            if self._epoll_read is not None:
+                self._epoll_read.close()
+                self._epoll_read = None
+            if self._epoll_write is not None:
+                self._epoll_write.close()
+                self._epoll_write = None
+            super(EpollSerial, self).close()
+
+        def _wait_read(self, timeout):
+            """\
+            Wait until the port is readable or cancel_read() was called.
+            Error and hang up events report the port as ready, the following
+            read reports the problem.
+            """
+            abort = ready = False
+            for fd, _ in self._epoll_read.poll(-1 if timeout is None else timeout):
+                if fd == self.pipe_abort_read_r:
+                    abort = True
+                else:
+                    ready = True
+            if abort:
+                os.read(self.pipe_abort_read_r, 1000)
+                return True, False
+            return False, ready
+
+        def _wait_write(self, timeout):
+            """Wait until the port is writable or cancel_write() was called."""
+            abort = ready = False
+            for fd, _ in self._epoll_write.poll(-1 if timeout is None else timeout):
+                if fd == self.pipe_abort_write_r:
+                    abort = True
+                else:
+                    ready = True
+            if abort:
+                os.read(self.pipe_abort_write_r, 1000)
+                return True, False
+            return False, ready
 
 
 class VTIMESerial(Serial):
@@ -857,51 +1355,45 @@ class VTIMESerial(Serial):
     just ignore that.
     """
 
-    def _reconfigure_port(self, force_update=True):
+    # the tty does the waiting, a new timeout needs a reconfiguration
+    _timeout_per_read = False
+
+    def _reconfigure_port(self, force_update=False):
         """Set communication parameters on opened port."""
-        super(VTIMESerial, self)._reconfigure_port()
+        super(VTIMESerial, self)._reconfigure_port(force_update)
         fcntl.fcntl(self.fd, fcntl.F_SETFL, 0)  # clear O_NONBLOCK
 
+    def _termios_vmin_vtime(self):
+        """Return the (VMIN, VTIME) values, timeouts are done by the tty"""
         if self._inter_byte_timeout is not None:
-            vmin = 1
-            vtime = int(self._inter_byte_timeout * 10)
+            return 1, int(self._inter_byte_timeout * 10)
         elif self._timeout is None:
-            vmin = 1
-            vtime = 0
+            return 1, 0
         else:
-            vmin = 0
-            vtime = int(self._timeout * 10)
-        try:
-            orig_attr = termios.tcgetattr(self.fd)
-            iflag, oflag, cflag, lflag, ispeed, ospeed, cc = orig_attr
-        except termios.error as msg:      # if a port is nonexistent but has a /dev file, it'll fail here
-            raise serial.SerialException("Could not configure port: {}".format(msg))
+            return 0, int(self._timeout * 10)
 
-        if vtime < 0 or vtime > 255:
-            raise ValueError('Invalid vtime: {!r}'.format(vtime))
-        cc[termios.VTIME] = vtime
-        cc[termios.VMIN] = vmin
-
-        termios.tcsetattr(
-                self.fd,
-                termios.TCSANOW,
-                [iflag, oflag, cflag, lflag, ispeed, ospeed, cc])
-
-    def read(self, size=1):
+    def _readinto(self, b, stamps):
         """\
-        Read size bytes from the serial port. If a timeout is set it may
-        return less characters as requested. With no timeout it will block
-        until the requested number of bytes is read.
+        readinto(), stamps is None or a list to append (offset, timestamp)
+        to. The tty does the waiting, so the time is taken after each read.
         """
         if not self.is_open:
             raise PortNotOpenError()
-        read = bytearray()
-        while len(read) < size:
-            buf = os.read(self.fd, size - len(read))
-            if not buf:
+        view = _byte_view(b)
+        size = len(view)
+        n_read = 0
+        if self._read_ahead:
+            n_read = self._take_read_ahead_into(view, stamps)
+        while n_read < size:
+            if self._stats is not None:
+                self._stats.read_syscalls += 1
+            n = _os_readinto(self.fd, view[n_read:])
+            if not n:
                 break
-            read.extend(buf)
-        return bytes(read)
+            if stamps is not None:
+                stamps.append((n_read, _monotonic_ns()))
+            n_read += n
+        return n_read
 
     # hack to make hasattr return false
     cancel_read = property()
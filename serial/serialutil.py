@@ -9,7 +9,11 @@
 
 from __future__ import absolute_import
 
+import collections
+import contextlib
 import io
+import os
+import stat
 import time
 
 # ``memoryview`` was introduced in Python 2.7 and ``bytes(some_memoryview)``
@@ -68,6 +72,31 @@ def to_bytes(seq):
         return bytes(bytearray(seq))
 
 
+def _advance_buffers(views, n):
+    """\
+    Remove n bytes from the front of a list of memoryviews (in place). Used
+    to continue partial vectored writes without copying the data.
+    """
+    while n and views:
+        first = views[0]
+        if n >= len(first):
+            n -= len(first)
+            del views[0]
+        else:
+            views[0] = first[n:]
+            n = 0
+
+
+def _byte_view(b):
+    """Return a writable, flat memoryview with byte sized items of b"""
+    view = memoryview(b)
+    try:
+        return view.cast('B')
+    except AttributeError:
+        # Python 2.x has no cast(), its buffers are byte oriented anyway
+        return view
+
+
 # create control bytes
 XON = to_bytes([17])
 XOFF = to_bytes([19])
@@ -80,6 +109,9 @@ PARITY_NONE, PARITY_EVEN, PARITY_ODD, PARITY_MARK, PARITY_SPACE = 'N', 'E', 'O',
 STOPBITS_ONE, STOPBITS_ONE_POINT_FIVE, STOPBITS_TWO = (1, 1.5, 2)
 FIVEBITS, SIXBITS, SEVENBITS, EIGHTBITS = (5, 6, 7, 8)
 
+# poll interval of the generic SerialBase.wait_modem_change()
+MODEM_POLL_INTERVAL = 0.01
+
 PARITY_NAMES = {
     PARITY_NONE: 'None',
     PARITY_EVEN: 'Even',
@@ -89,6 +121,10 @@ PARITY_NAMES = {
 }
 
 
+# state of the modem status lines, as returned by modem_status()
+ModemStatus = collections.namedtuple('ModemStatus', 'cts dsr ri cd')
+
+
 class SerialException(IOError):
     """Base class for serial port related exceptions."""
 
@@ -162,6 +198,44 @@ class Timeout(object):
         self.target_time = self.TIME() + duration
 
 
+# block size used by send_file()
+SEND_FILE_BLOCKSIZE = 64 * 1024
+
+
+def _send_file_size(fileobj, offset, count):
+    """Number of bytes send_file() will send, None if unknown"""
+    try:
+        st = os.fstat(fileobj.fileno())
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return count
+    if not stat.S_ISREG(st.st_mode):
+        return count    # e.g. a pipe, the size is not known in advance
+    size = max(st.st_size - offset, 0)
+    return size if count is None else min(size, count)
+
+
+class _SendFileProgress(object):
+    """Call the progress callback of send_file() with (sent, total, rate)"""
+
+    def __init__(self, callback, total):
+        self.callback = callback
+        self.total = total
+        self.start = Timeout.TIME()
+
+    def __call__(self, sent):
+        if self.callback is not None:
+            elapsed = Timeout.TIME() - self.start
+            self.callback(sent, self.total, sent / elapsed if elapsed > 0 else 0.0)
+
+
+if hasattr(time, 'monotonic_ns'):
+    _monotonic_ns = time.monotonic_ns
+else:
+    def _monotonic_ns():
+        """Integer nanoseconds of Timeout.TIME (Python < 3.7)"""
+        return int(Timeout.TIME() * 1e9)
+
+
 class SerialBase(io.RawIOBase):
     """\
     Serial port base class. Provides __init__ function and properties to
@@ -177,6 +251,10 @@ class SerialBase(io.RawIOBase):
     PARITIES = (PARITY_NONE, PARITY_EVEN, PARITY_ODD, PARITY_MARK, PARITY_SPACE)
     STOPBITS = (STOPBITS_ONE, STOPBITS_ONE_POINT_FIVE, STOPBITS_TWO)
 
+    # True when read() takes the timeout from _timeout on each call, so that
+    # it can be limited for one call without reconfiguring the port
+    _timeout_per_read = False
+
     def __init__(self,
                  port=None,
                  baudrate=9600,
@@ -217,6 +295,12 @@ class SerialBase(io.RawIOBase):
         self._dtr_state = True
         self._break_state = False
         self._exclusive = None
+        self._read_ahead = bytearray()  # surplus data of read_until()
+        self._settings_batch = 0        # nesting level of batch_settings()
+        self._settings_pending = False  # changes deferred by batch_settings()
+        self._stats = None              # PortStatistics, see enable_stats()
+        self._taps = None               # tuple of serial.hooks.Tap, see add_tap()
+        self._instrumentation = None    # installed while _stats or _taps are used
 
         # assign values using get/set methods using the properties feature
         self.port = port
@@ -296,7 +380,7 @@ class SerialBase(io.RawIOBase):
                 raise ValueError("Not a valid baudrate: {!r}".format(baudrate))
             self._baudrate = b
             if self.is_open:
-                self._reconfigure_port()
+                self._settings_changed()
 
     @property
     def bytesize(self):
@@ -310,7 +394,7 @@ class SerialBase(io.RawIOBase):
             raise ValueError("Not a valid byte size: {!r}".format(bytesize))
         self._bytesize = bytesize
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
 
     @property
     def exclusive(self):
@@ -322,7 +406,7 @@ class SerialBase(io.RawIOBase):
         """Change the exclusive access setting."""
         self._exclusive = exclusive
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
 
     @property
     def parity(self):
@@ -336,7 +420,7 @@ class SerialBase(io.RawIOBase):
             raise ValueError("Not a valid parity: {!r}".format(parity))
         self._parity = parity
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
 
     @property
     def stopbits(self):
@@ -350,7 +434,7 @@ class SerialBase(io.RawIOBase):
             raise ValueError("Not a valid stop bit size: {!r}".format(stopbits))
         self._stopbits = stopbits
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
 
     @property
     def timeout(self):
@@ -369,7 +453,7 @@ class SerialBase(io.RawIOBase):
                 raise ValueError("Not a valid timeout: {!r}".format(timeout))
         self._timeout = timeout
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
 
     @property
     def write_timeout(self):
@@ -389,7 +473,7 @@ class SerialBase(io.RawIOBase):
 
         self._write_timeout = timeout
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
 
     @property
     def inter_byte_timeout(self):
@@ -409,7 +493,16 @@ class SerialBase(io.RawIOBase):
 
         self._inter_byte_timeout = ic_timeout
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
+
+    @property
+    def character_time(self):
+        """\
+        Time in seconds to transmit one character with the current settings:
+        start bit, data bits, parity bit and stop bits.
+        """
+        bits = 1 + self._bytesize + (self._parity != PARITY_NONE) + self._stopbits
+        return bits / float(self._baudrate)
 
     @property
     def xonxoff(self):
@@ -421,7 +514,7 @@ class SerialBase(io.RawIOBase):
         """Change XON/XOFF setting."""
         self._xonxoff = xonxoff
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
 
     @property
     def rtscts(self):
@@ -433,7 +526,7 @@ class SerialBase(io.RawIOBase):
         """Change RTS/CTS flow control setting."""
         self._rtscts = rtscts
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
 
     @property
     def dsrdtr(self):
@@ -450,7 +543,7 @@ class SerialBase(io.RawIOBase):
             # if defined independently, follow its value
             self._dsrdtr = dsrdtr
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
 
     @property
     def rts(self):
@@ -458,6 +551,8 @@ class SerialBase(io.RawIOBase):
 
     @rts.setter
     def rts(self, value):
+        if self._taps is not None:
+            self._emit_tap('control', ('rts', value))
         self._rts_state = value
         if self.is_open:
             self._update_rts_state()
@@ -468,6 +563,8 @@ class SerialBase(io.RawIOBase):
 
     @dtr.setter
     def dtr(self, value):
+        if self._taps is not None:
+            self._emit_tap('control', ('dtr', value))
         self._dtr_state = value
         if self.is_open:
             self._update_dtr_state()
@@ -478,10 +575,40 @@ class SerialBase(io.RawIOBase):
 
     @break_condition.setter
     def break_condition(self, value):
+        if self._taps is not None:
+            self._emit_tap('control', ('break_condition', value))
         self._break_state = value
         if self.is_open:
             self._update_break_state()
 
+    def modem_status(self):
+        """\
+        Read all modem status lines at once, returns a ModemStatus tuple
+        (cts, dsr, ri, cd). Backends that can, use a single request.
+        """
+        return ModemStatus(self.cts, self.dsr, self.ri, self.cd)
+
+    def wait_modem_change(self, lines=ModemStatus._fields, timeout=None):
+        """\
+        Wait until one of the given modem status lines ('cts', 'dsr', 'ri',
+        'cd') changes. Returns the new ModemStatus or None on timeout. This
+        generic implementation polls modem_status(), backends with OS support
+        for change notifications override it.
+        """
+        for line in lines:
+            if line not in ModemStatus._fields:
+                raise ValueError('unknown modem line: {!r}'.format(line))
+        timeout = Timeout(timeout)
+        last = self.modem_status()
+        while True:
+            time_left = timeout.time_left()
+            time.sleep(MODEM_POLL_INTERVAL if time_left is None else min(MODEM_POLL_INTERVAL, time_left))
+            status = self.modem_status()
+            if any(getattr(status, line) != getattr(last, line) for line in lines):
+                return status
+            if timeout.expired():
+                return None
+
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
     # functions useful for RS-485 adapters
 
@@ -497,7 +624,7 @@ class SerialBase(io.RawIOBase):
     def rs485_mode(self, rs485_settings):
         self._rs485_mode = rs485_settings
         if self.is_open:
-            self._reconfigure_port()
+            self._settings_changed()
 
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
 
@@ -505,6 +632,33 @@ class SerialBase(io.RawIOBase):
                        'dsrdtr', 'rtscts', 'timeout', 'write_timeout',
                        'inter_byte_timeout')
 
+    def _settings_changed(self):
+        """\
+        Called by the setters when a setting of an open port changed.
+        Reconfigures the port, or defers it while in batch_settings().
+        """
+        if self._settings_batch:
+            self._settings_pending = True
+        else:
+            self._reconfigure_port()
+
+    @contextlib.contextmanager
+    def batch_settings(self):
+        """\
+        Context manager that defers port reconfiguration. All settings
+        changed in the with block are applied with one _reconfigure_port()
+        call when the (outermost) block is left.
+        """
+        self._settings_batch += 1
+        try:
+            yield self
+        finally:
+            self._settings_batch -= 1
+            if not self._settings_batch and self._settings_pending:
+                self._settings_pending = False
+                if self.is_open:
+                    self._reconfigure_port()
+
     def get_settings(self):
         """\
         Get current port settings as a dictionary. For use with
@@ -518,9 +672,75 @@ class SerialBase(io.RawIOBase):
         get_settings(). It's allowed to delete keys from the dictionary. These
         values will simply left unchanged.
         """
-        for key in self._SAVED_SETTINGS:
-            if key in d and d[key] != getattr(self, '_' + key):   # check against internal "_" value
-                setattr(self, key, d[key])          # set non "_" value to use properties write function
+        with self.batch_settings():
+            for key in self._SAVED_SETTINGS:
+                if key in d and d[key] != getattr(self, '_' + key):   # check against internal "_" value
+                    setattr(self, key, d[key])          # set non "_" value to use properties write function
+
+    @property
+    def stats(self):
+        """\
+        I/O statistics (a serial.stats.PortStatistics instance) or None
+        when not enabled with enable_stats().
+        """
+        return self._stats
+
+    def enable_stats(self, enable=True):
+        """\
+        Start (or with enable=False stop) recording I/O statistics, see the
+        stats property. Calling it while enabled keeps the statistics, use
+        stats.reset() to clear them. Returns the PortStatistics instance
+        (or None).
+        """
+        if enable:
+            if self._stats is None:
+                from serial.stats import PortStatistics
+                self._stats = PortStatistics()
+        else:
+            self._stats = None
+        self._update_instrumentation()
+        return self._stats
+
+    def add_tap(self, callback, events=None, queued=False):
+        """\
+        Register callback(event, data, timestamp) for the events 'rx',
+        'tx', 'control', 'reconfigure' and 'cancel' (default: all), see
+        serial.hooks. With queued=True the callback is called from a
+        background thread. Returns the serial.hooks.Tap instance, which can
+        also be passed as callback.
+        """
+        from serial.hooks import Tap
+        tap = callback if isinstance(callback, Tap) else Tap(callback, events, queued)
+        self._taps = (self._taps or ()) + (tap,)
+        self._update_instrumentation()
+        return tap
+
+    def remove_tap(self, tap):
+        """Unregister a tap returned by add_tap() and deliver its queued events"""
+        self._taps = tuple(t for t in self._taps or () if t is not tap) or None
+        self._update_instrumentation()
+        tap.close()
+
+    def _emit_tap(self, event, data, timestamp=None):
+        """Pass an event to the taps"""
+        taps = self._taps
+        if taps is not None:
+            if timestamp is None:
+                timestamp = _monotonic_ns()
+            for tap in taps:
+                if event in tap.events:
+                    tap(event, data, timestamp)
+
+    def _update_instrumentation(self):
+        """Install the I/O wrappers while statistics or taps are in use"""
+        if self._stats is not None or self._taps is not None:
+            if self._instrumentation is None:
+                from serial.hooks import _Instrumentation
+                self._instrumentation = _Instrumentation(self)
+                self._instrumentation.install()
+        elif self._instrumentation is not None:
+            self._instrumentation.uninstall()
+            self._instrumentation = None
 
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
 
@@ -655,6 +875,49 @@ class SerialBase(io.RawIOBase):
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
     # additional functionality
 
+    def write_vectored(self, buffers):
+        """\
+        Write a sequence of byte strings (e.g. header, payload, checksum).
+        Backends that support scatter/gather I/O pass the buffers to the OS
+        without joining them, the default implementation joins them and uses
+        write(). Returns the number of bytes written.
+        """
+        return self.write(b''.join(to_bytes(b) for b in buffers))
+
+    def send_file(self, fileobj, offset=0, count=None, progress=None):
+        """\
+        Send the contents of a binary file object, starting at offset, count
+        bytes or up to the end of the file. progress(sent, total, rate) is
+        called after each block, total is None if the size is unknown and
+        rate in bytes per second. Waits once at the end until the data is
+        transmitted (flush()). The file position is left after the last byte
+        sent. Returns the number of bytes sent. Raises SerialTimeoutException
+        when the port takes no more data within the write timeout.
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        report = _SendFileProgress(progress, _send_file_size(fileobj, offset, count))
+        fileobj.seek(offset)
+        block = bytearray(SEND_FILE_BLOCKSIZE)
+        view = memoryview(block)
+        sent = 0
+        while count is None or sent < count:
+            size = SEND_FILE_BLOCKSIZE if count is None else min(SEND_FILE_BLOCKSIZE, count - sent)
+            n = fileobj.readinto(view[:size])
+            if not n:
+                break
+            done = 0
+            while done < n:
+                # short writes, e.g. with write_timeout=0
+                written = self.write(view[done:n])
+                if not written:
+                    raise SerialTimeoutException('Write timeout')
+                done += written
+            sent += n
+            report(sent)
+        self.flush()
+        return sent
+
     def read_all(self):
         """\
         Read all bytes currently available in the buffer of the OS.
@@ -669,20 +932,139 @@ class SerialBase(io.RawIOBase):
         lenterm = len(expected)
         line = bytearray()
         timeout = Timeout(self._timeout)
+        scan_start = 0
         while True:
-            c = self.read(1)
-            if c:
-                line += c
-                if line[-lenterm:] == expected:
-                    break
-                if size is not None and len(line) >= size:
-                    break
-            else:
+            # read all that is there or wait for one byte. data read past the
+            # end of the line is kept for the next call (see _read_ahead)
+            n = max(1, self.in_waiting)
+            if size is not None:
+                n = min(n, size - len(line))
+            c = self.read(n)
+            if not c:
+                break
+            line += c
+            end = None
+            if lenterm:
+                pos = line.find(expected, scan_start)
+                if pos >= 0:
+                    end = pos + lenterm
+                else:
+                    # the expected sequence may start in the data read so far
+                    scan_start = max(0, len(line) - lenterm + 1)
+            if size is not None and len(line) >= size and (end is None or end > size):
+                end = size
+            if end is not None:
+                if end < len(line):
+                    self._read_ahead[0:0] = line[end:]
+                    del line[end:]
                 break
             if timeout.expired():
                 break
         return bytes(line)
 
+    def expect(self, patterns, timeout=None, max_match_size=4096):
+        """\
+        Read until one of the patterns is found or until timeout occurs.
+        patterns is a list of byte strings and/or compiled (bytes) regular
+        expressions. If timeout is None, the port timeout is used and reading
+        stops with the first read returning no data. Otherwise it is the
+        overall time limit in seconds, also with a port timeout of None.
+        Backends that apply the timeout in the driver (e.g. VTIMESerial,
+        Windows) are reconfigured once for it, their reads may then exceed
+        the limit by up to that time.
+
+        Returns a tuple (index, match, data). index is the position of the
+        matching pattern in the list, match the matched byte string or the
+        regular expression match object, data all bytes up to and including
+        the match. On timeout, index and match are None and data holds what
+        was read. Data after the match is kept for the next read.
+
+        Each chunk is only scanned once, regular expressions are re-checked
+        over at most max_match_size bytes of older data, so the cost per
+        chunk does not grow with the amount of data already read.
+        """
+        use_port_timeout = timeout is None
+        timeout = Timeout(self._timeout if use_port_timeout else timeout)
+        port_timeout = self._timeout
+        data = bytearray()
+        try:
+            while True:
+                n = self.in_waiting
+                if n or use_port_timeout:
+                    chunk = self.read(max(1, n))
+                else:
+                    # wait for one byte, but not longer than the overall timeout
+                    chunk = self._read_limited(1, timeout.time_left(), port_timeout)
+                if chunk:
+                    old_len = len(data)
+                    data += chunk
+                    best = None
+                    for index, pattern in enumerate(patterns):
+                        if isinstance(pattern, (bytes, bytearray)):
+                            start = data.find(pattern, max(0, old_len - len(pattern) + 1))
+                            if start < 0:
+                                continue
+                            end = start + len(pattern)
+                            match = pattern
+                        else:
+                            base = max(0, old_len - max_match_size)
+                            match = pattern.search(bytes(data[base:]))
+                            if match is None:
+                                continue
+                            start = base + match.start()
+                            end = base + match.end()
+                        if best is None or start < best[0]:
+                            best = (start, end, index, match)
+                    if best is not None:
+                        _, end, index, match = best
+                        if end < len(data):
+                            self._read_ahead[0:0] = data[end:]
+                            del data[end:]
+                        return index, match, bytes(data)
+                elif use_port_timeout:
+                    break
+                if timeout.expired():
+                    break
+        finally:
+            if self._timeout != port_timeout:
+                self.timeout = port_timeout
+        return None, None, bytes(data)
+
+    def _read_limited(self, size, time_left, port_timeout):
+        """\
+        read() waiting at most time_left seconds, for expect(). With
+        _timeout_per_read, the limit is used for this call only. Otherwise
+        the port is reconfigured once with the limit, the caller restores
+        port_timeout.
+        """
+        if port_timeout is not None and port_timeout <= time_left:
+            return self.read(size)
+        if self._timeout_per_read:
+            self._timeout = time_left
+            try:
+                return self.read(size)
+            finally:
+                self._timeout = port_timeout
+        if self._timeout == port_timeout:
+            self.timeout = time_left
+        return self.read(size)
+
+    def readline(self, size=-1):
+        """\
+        Read until a line feed, the size is exceeded or until timeout occurs.
+        Implemented with read_until().
+        """
+        return self.read_until(LF, None if size is None or size < 0 else size)
+
+    def _take_read_ahead(self, size):
+        """\
+        Remove and return up to size bytes (as bytearray) that read_until()
+        has read ahead. Backends use it as the start of the data in read().
+        """
+        data = self._read_ahead[:size]
+        del self._read_ahead[:size]
+        return data
+
     def iread_until(self, *args, **kwargs):
         """\
         Read lines, implemented as generator. It will raise StopIteration on
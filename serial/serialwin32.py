@@ -257,7 +257,7 @@ class Serial(SerialBase):
         comstat = win32.COMSTAT()
         if not win32.ClearCommError(self._port_handle, ctypes.byref(flags), ctypes.byref(comstat)):
             raise SerialException("ClearCommError failed ({!r})".format(ctypes.WinError()))
-        return comstat.cbInQue
+        return comstat.cbInQue + len(self._read_ahead)
 
     def read(self, size=1):
         """\
@@ -267,6 +267,8 @@ class Serial(SerialBase):
         """
         if not self.is_open:
             raise PortNotOpenError()
+        read_ahead = self._take_read_ahead(size)
+        size -= len(read_ahead)
         if size > 0:
             win32.ResetEvent(self._overlapped_read.hEvent)
             flags = win32.DWORD()
@@ -298,6 +300,8 @@ class Serial(SerialBase):
                 read = bytes()
         else:
             read = bytes()
+        if read_ahead:
+            return bytes(read_ahead + read)
         return bytes(read)
 
     def write(self, data):
@@ -352,6 +356,7 @@ class Serial(SerialBase):
         """Clear input buffer, discarding all that is in the buffer."""
         if not self.is_open:
             raise PortNotOpenError()
+        del self._read_ahead[:]
         win32.PurgeComm(self._port_handle, win32.PURGE_RXCLEAR | win32.PURGE_RXABORT)
 
     def reset_output_buffer(self):
@@ -0,0 +1,177 @@
+#! python
+#
+# I/O statistics of serial ports.
+#
+# This file is part of pySerial. https://github.com/pyserial/pyserial
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Counters and latency histograms for serial ports, see
+SerialBase.enable_stats().
+
+Statistics are off by default. When enabled, the I/O methods of the port
+instance are replaced by recording wrappers (see serial.hooks), so a port
+without statistics runs the unmodified code. The counters are not locked:
+a reader and a writer thread update different fields, but concurrent reads
+(or writes) from several threads may lose counts.
+"""
+
+from __future__ import absolute_import
+
+# histogram bounds in seconds used by PortStatistics.prometheus()
+PROMETHEUS_BUCKETS = (10e-6, 100e-6, 1e-3, 10e-3, 100e-3, 1.0, 10.0)
+
+
+class Histogram(object):
+    """\
+    Log-linear histogram of non-negative integers (HDR style). Values are
+    exact up to 2 * 2**significant_bits, larger values are counted with a
+    relative error of less than 2**-significant_bits, using a fixed number
+    of buckets per power of two.
+    """
+
+    def __init__(self, significant_bits=3):
+        self.significant_bits = significant_bits
+        self.reset()
+
+    def reset(self):
+        """Forget all recorded values"""
+        self._buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value):
+        """Add a value (an int, e.g. nanoseconds)"""
+        value = max(int(value), 0)
+        shift = max(value.bit_length() - self.significant_bits - 1, 0)
+        index = (shift << self.significant_bits) + (value >> shift)
+        self._buckets[index] = self._buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def _bucket_range(self, index):
+        """Return (lowest, highest) value counted in the bucket"""
+        sub_buckets = 1 << self.significant_bits
+        if index < 2 * sub_buckets:
+            return index, index
+        shift = index // sub_buckets - 1
+        mantissa = index - shift * sub_buckets
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def buckets(self):
+        """List of (highest value, count) tuples of the non-empty buckets, sorted"""
+        return [(self._bucket_range(index)[1], self._buckets[index]) for index in sorted(self._buckets)]
+
+    @property
+    def mean(self):
+        """Average of the recorded values, None if empty"""
+        return float(self.total) / self.count if self.count else None
+
+    def percentile(self, percent):
+        """\
+        Return the value below which percent (0...100) of the recorded values
+        are, None if empty. The result is the upper bound of the bucket,
+        limited to the largest recorded value.
+        """
+        if not self.count:
+            return None
+        rank = percent / 100.0 * self.count
+        seen = 0
+        for highest, count in self.buckets():
+            seen += count
+            if seen >= rank:
+                return min(highest, self.max)
+        return self.max
+
+    def count_up_to(self, value):
+        """Number of recorded values in buckets that end at or below value"""
+        return sum(count for highest, count in self.buckets() if highest <= value)
+
+    def as_dict(self):
+        """Summary that can be serialized as JSON"""
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+            'buckets': [list(bucket) for bucket in self.buckets()],
+        }
+
+
+class PortStatistics(object):
+    """\
+    I/O statistics of a port, available as SerialBase.stats. Times are in
+    nanoseconds. read_wait is the time the read methods (read(), readinto()
+    and their variants) took, write_latency the time write(),
+    write_vectored() and send_file() took until the data was handed to the
+    OS (or was sent by the backend).
+    """
+
+    COUNTERS = ('read_calls', 'read_bytes', 'read_syscalls', 'read_timeouts',
+                'write_calls', 'write_bytes', 'write_syscalls', 'write_timeouts',
+                'cancels', 'reconfigures', 'errors')
+
+    def __init__(self):
+        self.read_wait = Histogram()
+        self.write_latency = Histogram()
+        self.reset()
+
+    def reset(self):
+        """Set all counters to zero and clear the histograms"""
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self.read_wait.reset()
+        self.write_latency.reset()
+
+    @property
+    def syscalls(self):
+        """Number of read and write system calls (or equivalent calls of the backend)"""
+        return self.read_syscalls + self.write_syscalls
+
+    def as_dict(self):
+        """All counters and histogram summaries, can be serialized as JSON"""
+        d = dict((name, getattr(self, name)) for name in self.COUNTERS)
+        d['syscalls'] = self.syscalls
+        d['read_wait_ns'] = self.read_wait.as_dict()
+        d['write_latency_ns'] = self.write_latency.as_dict()
+        return d
+
+    def prometheus(self, prefix='pyserial', labels=None):
+        """\
+        Return the statistics in the Prometheus text exposition format.
+        labels is a dictionary, e.g. {'port': '/dev/ttyUSB0'}. Counters are
+        exported as <prefix>_<name>_total, the histograms in seconds with
+        the bounds in PROMETHEUS_BUCKETS.
+        """
+        label_text = ','.join('{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                              for key, value in sorted((labels or {}).items()))
+        braces = '{' + label_text + '}' if label_text else ''
+        le_prefix = label_text + ',' if label_text else ''
+        lines = []
+        for name in self.COUNTERS:
+            metric = '{}_{}_total'.format(prefix, name)
+            lines.append('# TYPE {} counter'.format(metric))
+            lines.append('{}{} {}'.format(metric, braces, getattr(self, name)))
+        for name, histogram in (('read_wait_seconds', self.read_wait),
+                                ('write_latency_seconds', self.write_latency)):
+            metric = '{}_{}'.format(prefix, name)
+            lines.append('# TYPE {} histogram'.format(metric))
+            for bound in PROMETHEUS_BUCKETS:
+                lines.append('{}_bucket{{{}le="{!r}"}} {}'.format(
+                    metric, le_prefix, bound, histogram.count_up_to(int(bound * 1e9))))
+            lines.append('{}_bucket{{{}le="+Inf"}} {}'.format(metric, le_prefix, histogram.count))
+            lines.append('{}_sum{} {!r}'.format(metric, braces, histogram.total / 1e9))
+            lines.append('{}_count{} {}'.format(metric, braces, histogram.count))
+        return '\n'.join(lines) + '\n'
@@ -11,22 +11,60 @@ Support threading with serial ports.
 """
 from __future__ import absolute_import
 
-import serial
+import collections
+import select
+import socket
+import sys
 import threading
+import time
+import traceback
+try:
+    import selectors
+except ImportError:
+    selectors = None    # Python 2.x, PortHub is not available
+
+import serial
+from serial.serialutil import Timeout, to_bytes, _monotonic_ns
+
+
+def _read_timestamped(serial_instance, size):
+    """\
+    Return (data, timestamp), using read_timestamped() of the port if
+    available, else the time is taken when read() returned.
+    """
+    if hasattr(serial_instance, 'read_timestamped'):
+        return serial_instance.read_timestamped(size)
+    data = serial_instance.read(size)
+    return data, _monotonic_ns()
 
 
 class Protocol(object):
     """\
     Protocol as used by the ReaderThread. This base class provides empty
     implementations of all methods.
+
+    Set ``timestamped`` to True to get data_received_timestamped() calls
+    instead of data_received(). When ``frame_gap`` is set (seconds of
+    silence that end a frame), the ReaderThread reads with read_frame() and
+    data_received() gets complete frames.
     """
 
+    timestamped = False
+    frame_gap = None
+
     def connection_made(self, transport):
         """Called when reader thread is started"""
 
     def data_received(self, data):
         """Called with snippets received from the serial port"""
 
+    def data_received_timestamped(self, data, timestamp):
+        """\
+        Called with snippets and their time of arrival (time.monotonic_ns())
+        when timestamped is set. The default passes data to data_received().
+        """
+        self.data_received(data)
+
     def connection_lost(self, exc):
         """\
         Called when the serial port is closed or the reader loop terminated
@@ -120,6 +158,41 @@ class FramedPacket(Protocol):
         pass
 
 
+class FrameReader(Protocol):
+    """
+    Read frames that are delimited by silence on the line, such as Modbus RTU
+    frames. Used with the ReaderThread and a port supporting read_frame()
+    (POSIX), handle_frame() is called for each frame.
+
+    The class also keeps track of the transport.
+    """
+
+    GAP_CHARACTERS = 3.5
+
+    def __init__(self):
+        self.transport = None
+
+    def connection_made(self, transport):
+        """Store transport, calculate the gap from the port settings"""
+        if not hasattr(transport.serial, 'read_frame'):
+            raise serial.SerialException('{} does not support read_frame()'.format(type(transport.serial).__name__))
+        self.transport = transport
+        self.frame_gap = self.GAP_CHARACTERS * transport.serial.character_time
+
+    def connection_lost(self, exc):
+        """Forget transport"""
+        self.transport = None
+        super(FrameReader, self).connection_lost(exc)
+
+    def data_received(self, data):
+        """Each read is a complete frame, call handle_frame"""
+        self.handle_frame(data)
+
+    def handle_frame(self, frame):
+        """Process frames - to be overridden by subclassing"""
+        raise NotImplementedError('please implement functionality in handle_frame')
+
+
 class LineReader(Packetizer):
     """
     Read and write (Unicode) lines from/to serial port.
@@ -192,10 +265,20 @@ class ReaderThread(threading.Thread):
             return
         error = None
         self._connection_made.set()
+        frame_gap = getattr(self.protocol, 'frame_gap', None)
+        # timestamps are not supported for frames
+        timestamped = frame_gap is None and getattr(self.protocol, 'timestamped', False)
         while self.alive and self.serial.is_open:
             try:
-                # read all that is there or wait for one byte (blocking)
-                data = self.serial.read(self.serial.in_waiting or 1)
+                if frame_gap is not None:
+                    # wait for a complete frame
+                    data = self.serial.read_frame(gap=frame_gap)
+                elif timestamped:
+                    # read all that is there or wait for one byte (blocking)
+                    data, timestamp = _read_timestamped(self.serial, self.serial.in_waiting or 1)
+                else:
+                    # read all that is there or wait for one byte (blocking)
+                    data = self.serial.read(self.serial.in_waiting or 1)
             except serial.SerialException as e:
                 # probably some I/O problem such as disconnected USB serial
                 # adapters -> exit
@@ -205,7 +288,10 @@ class ReaderThread(threading.Thread):
                 if data:
                     # make a separated try-except for called user code
                     try:
-                        self.protocol.data_received(data)
+                        if timestamped:
+                            self.protocol.data_received_timestamped(data, timestamp)
+                        else:
+                            self.protocol.data_received(data)
                     except Exception as e:
                         error = e
                         break
@@ -257,14 +343,418 @@ class ReaderThread(threading.Thread):
         self.close()
 
 
+class WriterThread(threading.Thread):
+    """\
+    Write to a serial port from a background thread. write() queues the data
+    and returns, data queued by several calls (and threads) is coalesced into
+    one write_vectored() call on the port.
+
+    When more than high_water bytes are queued, write() blocks until the
+    queue went down to low_water (backpressure). If the port writes only a
+    part (e.g. write_timeout=0), the rest is written before newer data as
+    soon as the port is writable again.
+
+    The writer does not poll out_waiting: the port's write blocks while the
+    OS buffer is full, which paces the writer without extra system calls,
+    and out_waiting is not available on all backends.
+    """
+
+    # time to wait after a short write when the port has no fileno(), also
+    # the interval in which a wait for a writable port checks for stop()
+    retry_interval = 0.01
+
+    def __init__(self, serial_instance, high_water=64 * 1024, low_water=16 * 1024):
+        super(WriterThread, self).__init__()
+        if not high_water >= low_water >= 0:
+            raise ValueError('high_water ({!r}) must be >= low_water ({!r}) must be >= 0'.format(high_water, low_water))
+        self.daemon = True
+        self.serial = serial_instance
+        self.high_water = high_water
+        self.low_water = low_water
+        self.alive = True
+        self.error = None
+        self.bytes_written = 0
+        self.write_calls = 0
+        self._queue = []
+        self._queue_size = 0    # includes the data that is being written
+        self._paused = False
+        self._cond = threading.Condition()
+
+    @property
+    def queue_size(self):
+        """Number of bytes queued and not yet written to the port"""
+        return self._queue_size
+
+    def write(self, data, timeout=None):
+        """\
+        Queue data for writing, return the number of bytes. Blocks while the
+        queue is above the water marks, raises SerialTimeoutException if that
+        takes longer than timeout seconds. Raises SerialException if the
+        writer was stopped or writing failed.
+        """
+        data = to_bytes(data)
+        with self._cond:
+            if self._paused:
+                timeout = Timeout(timeout)
+                while self._paused and self.alive:
+                    if timeout.expired():
+                        raise serial.SerialTimeoutException('Write timeout')
+                    self._cond.wait(timeout.time_left())
+            if not self.alive:
+                raise serial.SerialException('writer stopped: {}'.format(self.error))
+            if data:
+                self._queue.append(data)
+                self._queue_size += len(data)
+                if self._queue_size > self.high_water:
+                    self._paused = True
+                self._cond.notify_all()
+        return len(data)
+
+    def drain(self, timeout=None):
+        """\
+        Wait until all queued data was written to the port. Return False
+        on timeout. The port may still be transmitting, see out_waiting.
+        """
+        timeout = Timeout(timeout)
+        with self._cond:
+            while self._queue_size and self.alive:
+                if timeout.expired():
+                    return False
+                self._cond.wait(timeout.time_left())
+            return not self._queue_size
+
+    def stop(self):
+        """Stop the writer thread, discard queued data and cancel a pending write"""
+        with self._cond:
+            self.alive = False
+            del self._queue[:]
+            self._queue_size = 0
+            self._paused = False
+            self._cond.notify_all()
+        if hasattr(self.serial, 'cancel_write'):
+            self.serial.cancel_write()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(2)
+
+    def close(self, timeout=None):
+        """Write all queued data (drain) and stop the writer thread"""
+        self.drain(timeout)
+        self.stop()
+
+    def run(self):
+        """Writer loop"""
+        while True:
+            with self._cond:
+                while self.alive and not self._queue:
+                    self._cond.wait()
+                if not self.alive:
+                    break
+                buffers, self._queue = self._queue, []
+            try:
+                n = self.serial.write_vectored(buffers)
+            except serial.SerialException as e:
+                with self._cond:
+                    self.error = e
+                    self.alive = False
+                    self._cond.notify_all()
+                break
+            short = False
+            with self._cond:
+                self.bytes_written += n
+                self.write_calls += 1
+                if not self.alive:
+                    break   # stopped while writing, queue already discarded
+                self._queue_size -= n
+                if n < sum(len(b) for b in buffers):
+                    # short write, the unwritten tail goes first next time
+                    short = True
+                    for i, b in enumerate(buffers):
+                        if n < len(b):
+                            break
+                        n -= len(b)
+                    self._queue[0:0] = [memoryview(buffers[i])[n:]] + buffers[i + 1:]
+                if self._paused and self._queue_size <= self.low_water:
+                    self._paused = False
+                self._cond.notify_all()
+            if short:
+                self._wait_writable()
+
+    def _wait_writable(self):
+        """\
+        After a short write (e.g. write_timeout=0 and a full buffer): wait
+        until the port is writable, or retry_interval for ports without
+        fileno(), so that the thread does not spin.
+        """
+        try:
+            fd = self.serial.fileno()
+        except (AttributeError, serial.SerialException):
+            fd = None
+        while self.alive:
+            if fd is None:
+                with self._cond:
+                    if self.alive:
+                        self._cond.wait(self.retry_interval)    # stop() notifies
+                return
+            try:
+                if select.select([], [fd], [], self.retry_interval)[1]:
+                    return
+            except (OSError, select.error):
+                return  # e.g. closed, the next write reports it
+
+    # - -  context manager, returns writer
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Leave context: drain and stop, the port stays open"""
+        self.close()
+
+
+class PortHandle(object):
+    """\
+    A port managed by a PortHub. It is passed as transport to
+    Protocol.connection_made(), like the ReaderThread.
+
+    ``lag`` is the time in seconds the last received data waited behind
+    other ports before it was dispatched, ``max_lag`` the largest one seen.
+    """
+
+    def __init__(self, hub, serial_instance, protocol_factory):
+        self.hub = hub
+        self.serial = serial_instance
+        self.protocol_factory = protocol_factory
+        self.protocol = None
+        self.alive = True
+        self.error = None   # why the port could not be added
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._fileno = None
+        self._lock = threading.Lock()
+        self._connection_made = threading.Event()
+
+    def write(self, data):
+        """Thread safe writing (uses lock)"""
+        with self._lock:
+            return self.serial.write(data)
+
+    def close(self):
+        """\
+        Remove the port from the hub and close it. connection_lost() is
+        called from the hub thread.
+        """
+        self.hub.call(self.hub._remove, self, None, True)
+
+    def connect(self):
+        """\
+        Wait until connection is set up and return the transport and protocol
+        instances. Raises SerialException if the port could not be added.
+        """
+        self._connection_made.wait()
+        if self.error is not None:
+            raise self.error
+        if not self.alive:
+            raise RuntimeError('connection_lost already called')
+        return (self, self.protocol)
+
+
+class PortHub(threading.Thread):
+    """\
+    Serve many serial ports from one thread. The file descriptors of all
+    ports are watched with a selector (epoll on Linux) and received data is
+    dispatched to one Protocol instance per port, in order.
+
+    Ports must provide a selectable fileno(), i.e. the POSIX implementation or
+    socket:// URLs. Python 3.4 or newer is required.
+    """
+
+    max_read_size = 4096
+
+    def __init__(self):
+        if selectors is None:
+            raise RuntimeError('PortHub requires the selectors module (Python 3.4+)')
+        super(PortHub, self).__init__()
+        self.daemon = True
+        self.alive = True
+        self._handles = set()
+        self._pending = collections.deque()
+        self._selector = selectors.DefaultSelector()
+        # used by other threads to wake up the selector loop
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+    @property
+    def handles(self):
+        """List of the PortHandle instances of all served ports"""
+        return list(self._handles)
+
+    def add(self, serial_instance, protocol_factory):
+        """\
+        Serve an (opened) serial port, return its PortHandle. The port is
+        switched to non-blocking reads (timeout = 0). The protocol is
+        created and connection_made() is called from the hub thread, use
+        PortHandle.connect() to wait for it. Protocols with a frame_gap
+        (FrameReader) are rejected, connect() raises SerialException.
+        """
+        handle = PortHandle(self, serial_instance, protocol_factory)
+        self.call(self._add, handle)
+        return handle
+
+    def call(self, function, *args):
+        """Thread safe: run function(*args) in the hub thread"""
+        self._pending.append((function, args))
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass    # wakeup already pending or hub closed
+
+    def stop(self):
+        """\
+        Stop the hub thread. connection_lost() is called for all ports but
+        they are not closed.
+        """
+        self.alive = False
+        self.call(lambda: None)
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(2)
+
+    def close(self):
+        """Close all ports and stop the hub thread"""
+        self.call(self._close_all)
+        self.stop()
+
+    def handle_exception(self, handle, exc):
+        """\
+        Called when a Protocol.connection_lost() raised an exception. As
+        other ports continue to be served, the default prints the traceback.
+        """
+        traceback.print_exception(type(exc), exc, exc.__traceback__, file=sys.stderr)
+
+    def run(self):
+        """Selector loop"""
+        try:
+            while self.alive:
+                events = self._selector.select()
+                ready_time = time.monotonic()
+                for key, _ in events:
+                    handle = key.data
+                    if handle is None:
+                        self._run_pending()
+                    elif handle.alive:
+                        self._dispatch(handle, ready_time)
+        finally:
+            self._run_pending()     # e.g. close() requested while stopping
+            for handle in list(self._handles):
+                self._remove(handle, None, False)
+            self._selector.close()
+            self._wakeup_r.close()
+            self._wakeup_w.close()
+
+    def _run_pending(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while self._pending:
+            function, args = self._pending.popleft()
+            function(*args)
+
+    def _dispatch(self, handle, ready_time):
+        handle.lag = time.monotonic() - ready_time
+        if handle.lag > handle.max_lag:
+            handle.max_lag = handle.lag
+        timestamped = getattr(handle.protocol, 'timestamped', False)
+        try:
+            if timestamped:
+                data, timestamp = _read_timestamped(handle.serial, self.max_read_size)
+            else:
+                data = handle.serial.read(self.max_read_size)
+        except serial.SerialException as e:
+            # probably some I/O problem such as disconnected USB serial
+            # adapters -> remove the port
+            self._remove(handle, e, False)
+            return
+        if data:
+            # make a separated try-except for called user code
+            try:
+                if timestamped:
+                    handle.protocol.data_received_timestamped(data, timestamp)
+                else:
+                    handle.protocol.data_received(data)
+            except Exception as e:
+                self._remove(handle, e, False)
+
+    def _add(self, handle):
+        if not self.alive:
+            handle.alive = False
+            handle._connection_made.set()
+            return
+        try:
+            handle.serial.timeout = 0
+            handle._fileno = handle.serial.fileno()
+            self._selector.register(handle._fileno, selectors.EVENT_READ, handle)
+        except Exception as e:
+            # e.g. a closed port or one that is already served. the other
+            # ports are not affected, connect() raises the error
+            handle.alive = False
+            handle.error = serial.SerialException('could not add port: {}'.format(e))
+            handle._connection_made.set()
+            return
+        self._handles.add(handle)
+        handle.protocol = handle.protocol_factory()
+        try:
+            handle.protocol.connection_made(handle)
+        except Exception as e:
+            self._remove(handle, e, False)
+        else:
+            if getattr(handle.protocol, 'frame_gap', None) is not None:
+                # frames are not split at gaps, serve with a ReaderThread
+                handle.error = serial.SerialException('PortHub does not support frame_gap (FrameReader)')
+                self._remove(handle, handle.error, False)
+        handle._connection_made.set()
+        # data that read_until() read ahead does not make the fd readable
+        while handle.alive and handle.serial._read_ahead:
+            self._dispatch(handle, time.monotonic())
+
+    def _remove(self, handle, error, close_port):
+        if handle not in self._handles:
+            return
+        handle.alive = False
+        self._handles.discard(handle)
+        self._selector.unregister(handle._fileno)
+        if close_port:
+            # use the lock to let other threads finish writing
+            with handle._lock:
+                handle.serial.close()
+        handle._connection_made.set()
+        try:
+            handle.protocol.connection_lost(error)
+        except Exception as e:
+            self.handle_exception(handle, e)
+        handle.protocol = None
+
+    def _close_all(self):
+        for handle in list(self._handles):
+            self._remove(handle, None, True)
+
+    # - -  context manager, returns hub
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Leave context: close all ports"""
+        self.close()
+
+
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 # test
 if __name__ == '__main__':
-    # pylint: disable=wrong-import-position
-    import sys
-    import time
-    import traceback
-
     #~ PORT = 'spy:///dev/ttyUSB0'
     PORT = 'loop://'
 
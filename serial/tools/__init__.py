@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+#
+# Tools for pySerial, e.g. port enumeration, terminal and virtual ports.
+#
+# This file is part of pySerial. https://github.com/pyserial/pyserial
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Tools for pySerial. The tools are modules of this package, virtual_pair()
+is available here for convenience.
+"""
+from __future__ import absolute_import
+
+
+def virtual_pair(pace=False):
+    """\
+    Create two pseudo terminals connected like serial ports with a null
+    modem cable, see serial.tools.pty_pair. POSIX only.
+    """
+    from serial.tools import pty_pair
+    return pty_pair.virtual_pair(pace)
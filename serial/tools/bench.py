@@ -0,0 +1,536 @@
+#!/usr/bin/env python
+#
+# Benchmark the I/O of the serial port implementations.
+#
+# This file is part of pySerial. https://github.com/pyserial/pyserial
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Measure throughput, latency, system calls per byte and CPU time per MB of
+the serial port backends, with the same workloads for each:
+
+- ``read``: read() with different sizes
+- ``read_until``: lines of 64 bytes
+- ``ReaderThread``: serial.threaded.ReaderThread receiving the data
+- ``Packetizer``: serial.threaded.Packetizer with packets of 64 bytes
+- ``latency``: write one byte and read it back, many times
+
+The POSIX classes (Serial, PosixPollSerial, VTIMESerial, EpollSerial) are
+measured on a pair of connected pseudo terminals (serial.tools.pty_pair),
+socket:// and rfc2217:// with a server in the same process that echoes the
+data, loop://, pair:// and spy:// (logging to os.devnull) in memory.
+
+The CPU time is the one of the whole process, so it includes helper threads
+such as the pty relay or the echo servers. The system calls are counted by
+the backends, see serial.stats.
+
+The results are a dictionary that can be saved as JSON, compare() shows the
+changes between two runs.
+"""
+from __future__ import absolute_import
+
+import collections
+import json
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+
+import serial
+import serial.rfc2217
+import serial.threaded
+from serial.serialutil import _monotonic_ns
+from serial.stats import Histogram, PortStatistics
+
+# how long a read may wait for data before the benchmark fails
+TIMEOUT = 2
+
+READ_SIZES = (1, 64, 4096, 65536)
+
+# limit the read() calls, small reads would take too long otherwise
+MAX_CALLS = 20000
+
+# written by the benchmarks for read_until(), ReaderThread and Packetizer
+LINE = b'x' * 63 + b'\n'
+PACKET = b'x' * 63 + b'\0'
+
+BLOCK_SIZE = 64 * 1024
+
+# CPU time of the process, all threads
+_cpu_time = getattr(time, 'process_time', None) or time.clock
+
+
+class BenchmarkError(Exception):
+    """The transfer did not complete"""
+
+
+class _EchoServer(object):
+    """\
+    TCP server on localhost that sends back what it receives, one thread per
+    connection. With rfc2217, the connections are handled by a
+    serial.rfc2217.PortManager with a loop:// port.
+    """
+
+    def __init__(self, rfc2217=False):
+        self.rfc2217 = rfc2217
+        self.alive = True
+        self._threads = []
+        self._sockets = []
+        self._server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._server.bind(('127.0.0.1', 0))
+        self._server.listen(1)
+        self.port = self._server.getsockname()[1]
+        self._start(self._accept)
+
+    def _start(self, target, *args):
+        thread = threading.Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _accept(self):
+        while self.alive:
+            try:
+                connection, address = self._server.accept()
+            except socket.error:
+                break
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._sockets.append(connection)
+            if self.rfc2217:
+                self._start(self._rfc2217, connection)
+            else:
+                self._start(self._echo, connection)
+
+    def _echo(self, connection):
+        try:
+            while True:
+                data = connection.recv(BLOCK_SIZE)
+                if not data:
+                    break
+                connection.sendall(data)
+        except socket.error:
+            pass
+
+    def _rfc2217(self, connection):
+        port = serial.serial_for_url('loop://', timeout=None)
+        lock = threading.Lock()
+
+        class Writer(object):
+            def write(self, data):
+                with lock:
+                    connection.sendall(data)
+
+        manager = serial.rfc2217.PortManager(port, Writer())
+        self._start(self._rfc2217_reader, port, manager)
+        try:
+            while True:
+                data = connection.recv(BLOCK_SIZE)
+                if not data:
+                    break
+                port.write(manager.filter_bytes(data))
+        except socket.error:
+            pass
+        port.close()
+
+    def _rfc2217_reader(self, port, manager):
+        try:
+            while port.is_open:
+                data = port.read(port.in_waiting or 1)
+                if data:
+                    manager.connection.write(manager.escape_bytes(data))
+        except (serial.SerialException, socket.error):
+            pass
+
+    def close(self):
+        self.alive = False
+        for sock in self._sockets + [self._server]:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+            sock.close()
+        for thread in self._threads:
+            thread.join(TIMEOUT)
+
+
+class Connection(object):
+    """\
+    The ports of a benchmark: data written to tx is read from rx (that may
+    be the same port). close() releases everything that was set up.
+    """
+
+    def __init__(self, tx, rx, cleanup=()):
+        self.tx = tx
+        self.rx = rx
+        self._cleanup = list(cleanup)
+
+    @property
+    def ports(self):
+        return [self.tx] if self.tx is self.rx else [self.tx, self.rx]
+
+    def close(self):
+        for port in self.ports:
+            port.close()
+        for function in self._cleanup:
+            function()
+
+
+def _url_connection(url, cleanup=()):
+    port = serial.serial_for_url(url, timeout=TIMEOUT)
+    return Connection(port, port, cleanup)
+
+
+def _pty_connection(cls):
+    from serial.tools import pty_pair
+    pair = pty_pair.PtyPair()
+    pair.start()
+    try:
+        tx = serial.Serial(pair.ports[0], timeout=TIMEOUT)
+        rx = cls(pair.ports[1], timeout=TIMEOUT)
+    except Exception:
+        pair.close()
+        raise
+    return Connection(tx, rx, [pair.close])
+
+
+def _pair_connection():
+    tx = serial.serial_for_url('pair://bench/a', timeout=TIMEOUT)
+    rx = serial.serial_for_url('pair://bench/b', timeout=TIMEOUT)
+    return Connection(tx, rx)
+
+
+def _server_connection(url, rfc2217=False):
+    server = _EchoServer(rfc2217)
+    try:
+        return _url_connection(url.format(server.port), [server.close])
+    except Exception:
+        server.close()
+        raise
+
+
+def _posix_class(name):
+    """Factory for the class from serial.serialposix"""
+    def connect():
+        from serial import serialposix
+        return _pty_connection(getattr(serialposix, name))
+    return connect
+
+
+# name -> function returning a Connection
+BACKENDS = collections.OrderedDict([
+    ('Serial', _posix_class('Serial')),
+    ('PosixPollSerial', _posix_class('PosixPollSerial')),
+    ('VTIMESerial', _posix_class('VTIMESerial')),
+    ('EpollSerial', _posix_class('EpollSerial')),
+    ('loop://', lambda: _url_connection('loop://')),
+    ('pair://', _pair_connection),
+    ('socket://', lambda: _server_connection('socket://127.0.0.1:{}')),
+    ('rfc2217://', lambda: _server_connection('rfc2217://127.0.0.1:{}', rfc2217=True)),
+    ('spy://', lambda: _url_connection('spy://loop://?file={}'.format(os.devnull))),
+])
+
+
+def _count_syscalls(connection):
+    """\
+    Set up the system call counters of the ports. Only the counters, the
+    wrappers of enable_stats() would add their overhead to each call.
+    """
+    for port in connection.ports:
+        port._stats = PortStatistics()
+
+
+def _transfer(connection, data, nbytes, receive):
+    """\
+    Write nbytes of data (repeated) from a thread, call receive() until it
+    returns false or nbytes were received. receive() returns the number of
+    bytes it got. Return the measurements.
+    """
+    _count_syscalls(connection)
+    errors = []
+
+    def writer():
+        try:
+            block = data * max(BLOCK_SIZE // len(data), 1)
+            left = nbytes
+            while left:
+                left -= connection.tx.write(block[:left])
+        except Exception as e:
+            errors.append(e)
+    thread = threading.Thread(target=writer)
+    thread.daemon = True
+    cpu = _cpu_time()
+    start = _monotonic_ns()
+    thread.start()
+    received = 0
+    while received < nbytes:
+        n = receive()
+        if not n:
+            break
+        received += n
+    seconds = (_monotonic_ns() - start) / 1e9
+    cpu = _cpu_time() - cpu
+    thread.join(TIMEOUT)
+    syscalls = connection.tx._stats.write_syscalls + connection.rx._stats.read_syscalls
+    for port in connection.ports:
+        port._stats = None
+    if errors:
+        raise errors[0]
+    if received < nbytes:
+        raise BenchmarkError('received {} of {} bytes'.format(received, nbytes))
+    return collections.OrderedDict([
+        ('bytes', nbytes),
+        ('seconds', seconds),
+        ('bytes_per_second', nbytes / seconds),
+        ('cpu_seconds_per_mb', cpu / (nbytes / 1e6)),
+        ('syscalls_per_byte', float(syscalls) / nbytes),
+    ])
+
+
+def bench_read(connection, nbytes):
+    """read() with the sizes of READ_SIZES"""
+    for size in READ_SIZES:
+        result = _transfer(connection, bytes(bytearray(range(256))), min(nbytes, size * MAX_CALLS),
+                           lambda: len(connection.rx.read(size)))
+        result['read_size'] = size
+        yield result
+
+
+def bench_read_until(connection, nbytes):
+    """read_until() of lines"""
+    nbytes -= nbytes % len(LINE)
+    yield _transfer(connection, LINE, min(nbytes, len(LINE) * MAX_CALLS),
+                    lambda: len(connection.rx.read_until(b'\n')))
+
+
+def _threaded(connection, data, nbytes, protocol_factory, received):
+    """\
+    Receive with a ReaderThread, received() returns the number of bytes the
+    protocol got so far.
+    """
+    done = threading.Event()
+    count = [0]
+
+    def receive():
+        done.wait(TIMEOUT)
+        n = received() - count[0]
+        count[0] += n
+        return n
+    timeout = connection.rx.timeout
+    reader = serial.threaded.ReaderThread(connection.rx, lambda: protocol_factory(done, nbytes))
+    reader.start()
+    try:
+        # the thread may change the timeout, e.g. a network round trip for rfc2217
+        reader.connect()
+        return _transfer(connection, data, nbytes, receive)
+    finally:
+        reader.stop()
+        connection.rx.timeout = timeout
+
+
+def bench_reader_thread(connection, nbytes):
+    """serial.threaded.ReaderThread with a Protocol that counts the bytes"""
+    class Counter(serial.threaded.Protocol):
+        received = 0
+
+        def __init__(self, done, nbytes):
+            self.done = done
+            self.nbytes = nbytes
+
+        def data_received(self, data):
+            Counter.received += len(data)
+            if Counter.received >= self.nbytes:
+                self.done.set()
+    yield _threaded(connection, bytes(bytearray(range(256))), nbytes, Counter, lambda: Counter.received)
+
+
+def bench_packetizer(connection, nbytes):
+    """serial.threaded.Packetizer with packets of 64 bytes"""
+    class Packets(serial.threaded.Packetizer):
+        received = 0
+
+        def __init__(self, done, nbytes):
+            super(Packets, self).__init__()
+            self.done = done
+            self.nbytes = nbytes
+
+        def handle_packet(self, packet):
+            Packets.received += len(packet) + 1
+            if Packets.received >= self.nbytes:
+                self.done.set()
+    nbytes -= nbytes % len(PACKET)
+    result = _threaded(connection, PACKET, nbytes, Packets, lambda: Packets.received)
+    result['packets'] = nbytes // len(PACKET)
+    yield result
+
+
+def bench_latency(connection, nbytes, round_trips=1000):
+    """Write a byte and read it, round_trips times"""
+    histogram = Histogram()
+    tx = connection.tx
+    rx = connection.rx
+    for i in range(round_trips):
+        start = _monotonic_ns()
+        tx.write(b'x')
+        if rx.read(1) != b'x':
+            raise BenchmarkError('no answer')
+        histogram.record(_monotonic_ns() - start)
+    yield collections.OrderedDict([
+        ('round_trips', round_trips),
+        ('latency_us', collections.OrderedDict(
+            (name, histogram_value / 1e3) for name, histogram_value in (
+                ('mean', histogram.mean),
+                ('p50', histogram.percentile(50)),
+                ('p99', histogram.percentile(99)),
+                ('max', histogram.max)))),
+    ])
+
+
+BENCHMARKS = collections.OrderedDict([
+    ('read', bench_read),
+    ('read_until', bench_read_until),
+    ('ReaderThread', bench_reader_thread),
+    ('Packetizer', bench_packetizer),
+    ('latency', bench_latency),
+])
+
+
+def run(backends=None, benchmarks=None, nbytes=1024 * 1024, progress=None):
+    """\
+    Run the benchmarks (names from BENCHMARKS, default all) with the
+    backends (names from BACKENDS, default all), transferring nbytes per
+    measurement. progress(result) is called for each result. Backends that
+    are not available on this platform are reported with an 'error'.
+    Return a dictionary with the platform and the results.
+    """
+    results = []
+
+    def add(result):
+        results.append(result)
+        if progress is not None:
+            progress(result)
+
+    for backend in backends or BACKENDS:
+        for benchmark in benchmarks or BENCHMARKS:
+            try:
+                connection = BACKENDS[backend]()
+            except Exception as e:
+                add(collections.OrderedDict([('backend', backend), ('benchmark', benchmark),
+                                             ('error', 'not available: {}'.format(e))]))
+                continue
+            try:
+                for result in BENCHMARKS[benchmark](connection, nbytes):
+                    result['backend'] = backend
+                    result['benchmark'] = benchmark
+                    add(result)
+            except Exception as e:
+                add(collections.OrderedDict([('backend', backend), ('benchmark', benchmark),
+                                             ('error', '{}: {}'.format(e.__class__.__name__, e))]))
+            finally:
+                connection.close()
+    return collections.OrderedDict([
+        ('pyserial', serial.__version__),
+        ('python', platform.python_version()),
+        ('implementation', platform.python_implementation()),
+        ('platform', platform.platform()),
+        ('time', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())),
+        ('bytes', nbytes),
+        ('results', results),
+    ])
+
+
+def _key(result):
+    return (result['backend'], result['benchmark'], result.get('read_size'))
+
+
+def _name(result):
+    name = '{backend} {benchmark}'.format(**result)
+    if 'read_size' in result:
+        name += '({})'.format(result['read_size'])
+    return name
+
+
+def _value(result):
+    """The main figure of a result: throughput or mean latency"""
+    if 'bytes_per_second' in result:
+        return result['bytes_per_second']
+    if 'latency_us' in result:
+        return result['latency_us']['mean']
+    return None
+
+
+def compare(old, new):
+    """\
+    Compare two results of run(). Return a list of (name, old value, new
+    value, ratio) tuples for the results found in both, where the value is
+    the throughput in bytes per second or the mean latency in microseconds.
+    Ratios above 1 are improvements.
+    """
+    old_results = dict((_key(result), result) for result in old['results'])
+    rows = []
+    for result in new['results']:
+        previous = old_results.get(_key(result))
+        if previous is None or _value(previous) is None or _value(result) is None:
+            continue
+        ratio = _value(result) / _value(previous)
+        if 'latency_us' in result:
+            ratio = 1 / ratio
+        rows.append((_name(result), _value(previous), _value(result), ratio))
+    return rows
+
+
+def format_result(result):
+    """One line summary"""
+    if 'error' in result:
+        return '{:32} {}'.format(_name(result), result['error'])
+    if 'latency_us' in result:
+        return '{:32} {mean:10.1f} us mean {p50:10.1f} us p50 {p99:10.1f} us p99'.format(
+            _name(result), **result['latency_us'])
+    return '{:32} {:10.3f} MB/s {:8.3f} s CPU/MB {:8.4f} syscalls/byte'.format(
+        _name(result), result['bytes_per_second'] / 1e6, result['cpu_seconds_per_mb'],
+        result['syscalls_per_byte'])
+
+
+def main():
+    """Run the benchmarks, print the results as JSON"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the serial port implementations. Writes the results as JSON.')
+    parser.add_argument('-b', '--backend', action='append', choices=list(BACKENDS),
+                        help='backend to measure, can be given multiple times, default: all')
+    parser.add_argument('-t', '--benchmark', action='append', choices=list(BENCHMARKS),
+                        help='benchmark to run, can be given multiple times, default: all')
+    parser.add_argument('-n', '--bytes', type=int, default=1024 * 1024,
+                        help='bytes per measurement, default: %(default)s')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='write the JSON results to FILE instead of stdout')
+    parser.add_argument('-c', '--compare', metavar='FILE',
+                        help='compare with the results of a previous run')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='suppress non error messages')
+    args = parser.parse_args()
+
+    def progress(result):
+        if not args.quiet:
+            sys.stderr.write('{}\n'.format(format_result(result)))
+
+    results = run(args.backend, args.benchmark, args.bytes, progress)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        sys.stderr.write('--- compared with {} ({}) ---\n'.format(args.compare, old.get('time')))
+        for name, before, after, ratio in compare(old, results):
+            sys.stderr.write('{:32} {:12.1f} {:12.1f} {:6.2f}x\n'.format(name, before, after, ratio))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+#
+# Forward data between serial ports and network connections.
+#
+# This file is part of pySerial. https://github.com/pyserial/pyserial
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Forward data between POSIX serial ports and connected TCP or unix sockets,
+many ports served from one thread.
+
+In raw mode the data is moved with os.splice() through a pipe (Linux, Python
+3.10+), so it never enters Python. Elsewhere an event loop copies it with
+large os.read()/os.write() calls. The RFC 2217 mode escapes and filters the
+data block wise and lets a serial.rfc2217.PortManager handle the Telnet
+commands.
+"""
+from __future__ import absolute_import
+
+import collections
+import errno
+import os
+import socket
+import sys
+try:
+    import selectors
+except ImportError:
+    selectors = None    # Python 2.x, BridgeHub is not available
+
+import serial
+import serial.rfc2217
+from serial.serialutil import Timeout
+
+# maximal number of bytes moved per system call
+BLOCK_SIZE = 64 * 1024
+
+# errors that just mean "try again later"
+_RETRY_ERRORS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+
+class _Channel(object):
+    """\
+    One direction of a bridge: data from src to dst (file descriptors). With
+    splice, the data is kept in a kernel pipe, else in a bytearray.
+    """
+
+    def __init__(self, src, dst, transform=None):
+        self.src = src
+        self.dst = dst
+        self.transform = transform
+        self.bytes_forwarded = 0
+        self.buffer = bytearray()
+        self.pipe = None
+        self.in_pipe = 0
+        if transform is None and hasattr(os, 'splice'):
+            self.pipe = os.pipe()
+
+    @property
+    def backlog(self):
+        """Number of bytes read from src and not yet written to dst"""
+        return self.in_pipe + len(self.buffer)
+
+    def fill(self):
+        """src is readable: read a block, return False on end of file"""
+        if self.pipe is not None:
+            try:
+                n = os.splice(self.src, self.pipe[1], BLOCK_SIZE, flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+            except OSError as e:
+                if e.errno in _RETRY_ERRORS:
+                    return True
+                if e.errno == errno.EINVAL and not self.in_pipe:
+                    # splice() not supported for this fd, copy instead
+                    self.close()
+                    return self.fill()
+                raise
+            self.in_pipe += n
+            return n > 0
+        try:
+            data = os.read(self.src, BLOCK_SIZE)
+        except OSError as e:
+            if e.errno in _RETRY_ERRORS:
+                return True
+            raise
+        if self.transform is not None:
+            self.buffer += self.transform(data)
+        else:
+            self.buffer += data
+        return bool(data)
+
+    def flush(self):
+        """Write as much of the backlog to dst as possible"""
+        try:
+            # with splice, the buffer holds data that was read before the
+            # bridge was set up, it goes first
+            while self.buffer:
+                n = os.write(self.dst, self.buffer)
+                del self.buffer[:n]
+                self.bytes_forwarded += n
+            if self.pipe is not None:
+                while self.in_pipe:
+                    n = os.splice(self.pipe[0], self.dst, self.in_pipe, flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+                    self.in_pipe -= n
+                    self.bytes_forwarded += n
+        except OSError as e:
+            if e.errno not in _RETRY_ERRORS:
+                raise
+
+    def close(self):
+        """Release the pipe (if any)"""
+        if self.pipe is not None:
+            os.close(self.pipe[0])
+            os.close(self.pipe[1])
+            self.pipe = None
+
+
+class Bridge(object):
+    """\
+    Forward data between a serial port and a connected socket. Created with
+    BridgeHub.add(), all methods are called from the hub thread.
+    """
+
+    def __init__(self, hub, serial_instance, sock, rfc2217=False, on_close=None):
+        self.hub = hub
+        self.serial = serial_instance
+        self.socket = sock
+        self.on_close = on_close
+        self.alive = True
+        self.rfc2217 = None
+        self._masks = {}
+        sock.setblocking(False)
+        serial_fd = serial_instance.fileno()
+        if rfc2217:
+            # Telnet commands are handled by the port manager, the data is
+            # escaped and filtered block wise
+            self.to_socket = _Channel(serial_fd, sock.fileno(), serial.rfc2217.PortManager.escape_bytes)
+            self.to_serial = _Channel(sock.fileno(), serial_fd, self._filter)
+            self.rfc2217 = serial.rfc2217.PortManager(serial_instance, self)
+        else:
+            self.to_socket = _Channel(serial_fd, sock.fileno())
+            self.to_serial = _Channel(sock.fileno(), serial_fd)
+        if serial_instance._read_ahead:
+            # data that read_until() read ahead is not seen on the fd
+            data = bytes(serial_instance._take_read_ahead(len(serial_instance._read_ahead)))
+            transform = self.to_socket.transform
+            self.to_socket.buffer += data if transform is None else transform(data)
+
+    @property
+    def stats(self):
+        """Tuple (bytes serial->socket, bytes socket->serial)"""
+        return (self.to_socket.bytes_forwarded, self.to_serial.bytes_forwarded)
+
+    def write(self, data):
+        """Used by the RFC 2217 port manager to send Telnet commands"""
+        self.to_socket.buffer += data
+        if self in self.hub._bridges:
+            # else it is sent when the bridge is added to the hub
+            self.to_socket.flush()
+            self._update()
+
+    def _filter(self, data):
+        return self.rfc2217.filter_bytes(data)
+
+    def close(self, error=None):
+        """Stop forwarding and close the socket, the serial port stays open"""
+        if not self.alive:
+            return
+        self.alive = False
+        self.hub._bridges.discard(self)
+        for fd in list(self._masks):
+            self.hub._selector.unregister(fd)
+        self._masks.clear()
+        self.to_socket.close()
+        self.to_serial.close()
+        self.socket.close()
+        if self.on_close is not None:
+            self.on_close(self, error)
+
+    def _update(self):
+        """Register the file descriptors for the events that are of interest"""
+        wanted = collections.defaultdict(int)
+        for channel in (self.to_socket, self.to_serial):
+            if channel.backlog:
+                # backpressure: do not read more until the data is written
+                wanted[channel.dst] |= selectors.EVENT_WRITE
+            else:
+                wanted[channel.src] |= selectors.EVENT_READ
+        for fd in set(self._masks) | set(wanted):
+            mask = wanted.get(fd, 0)
+            if mask == self._masks.get(fd, 0):
+                continue
+            if not mask:
+                self.hub._selector.unregister(fd)
+                del self._masks[fd]
+            elif fd in self._masks:
+                self.hub._selector.modify(fd, mask, self)
+                self._masks[fd] = mask
+            else:
+                self.hub._selector.register(fd, mask, self)
+                self._masks[fd] = mask
+
+    def _handle(self, fd, mask):
+        """Called by the hub for events on fd"""
+        try:
+            for channel in (self.to_socket, self.to_serial):
+                if mask & selectors.EVENT_READ and channel.src == fd and not channel.backlog:
+                    if not channel.fill():
+                        channel.flush()
+                        self.close()
+                        return
+                    channel.flush()
+                if mask & selectors.EVENT_WRITE and channel.dst == fd:
+                    channel.flush()
+        except (OSError, serial.SerialException) as e:
+            self.close(e)
+            return
+        self._update()
+
+    def _poll(self):
+        """Called periodically by the hub, send modem line changes for RFC 2217"""
+        if self.rfc2217 is not None:
+            try:
+                self.rfc2217.check_modem_lines()
+            except (OSError, serial.SerialException):
+                pass    # the port does not support modem lines, e.g. a pty
+
+
+class BridgeHub(object):
+    """\
+    Serve many bridges from one thread with a selector (epoll on Linux).
+    serve_forever() runs the loop, add(), call() and stop() are thread safe.
+    """
+
+    poll_interval = 1.0
+
+    def __init__(self):
+        if selectors is None:
+            raise RuntimeError('BridgeHub requires the selectors module (Python 3.4+)')
+        self.alive = True
+        self._bridges = set()
+        self._pending = collections.deque()
+        self._selector = selectors.DefaultSelector()
+        # used by other threads to wake up the selector loop
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+    @property
+    def bridges(self):
+        """List of the active bridges"""
+        return list(self._bridges)
+
+    def add(self, serial_instance, sock, rfc2217=False, on_close=None):
+        """\
+        Forward data between an open (POSIX) serial port and a connected
+        socket. on_close(bridge, error) is called from the hub thread when
+        the connection ended. Return the Bridge.
+        """
+        bridge = Bridge(self, serial_instance, sock, rfc2217, on_close)
+        self.call(self._add, bridge)
+        return bridge
+
+    def call(self, function, *args):
+        """Thread safe: run function(*args) in the hub thread"""
+        self._pending.append((function, args))
+        try:
+            self._wakeup_w.send(b'\0')
+        except (BlockingIOError, OSError):
+            pass    # wakeup already pending or hub closed
+
+    def stop(self):
+        """Stop serve_forever() and close all bridges"""
+        self.alive = False
+        self.call(lambda: None)
+
+    def serve_forever(self):
+        """Selector loop"""
+        next_poll = Timeout.TIME() + self.poll_interval
+        try:
+            while self.alive:
+                for key, mask in self._selector.select(max(next_poll - Timeout.TIME(), 0)):
+                    if key.data is None:
+                        self._run_pending()
+                    elif key.data.alive:
+                        key.data._handle(key.fd, mask)
+                if Timeout.TIME() >= next_poll:
+                    next_poll = Timeout.TIME() + self.poll_interval
+                    for bridge in list(self._bridges):
+                        bridge._poll()
+        finally:
+            self._run_pending()
+            for bridge in list(self._bridges):
+                bridge.close()
+            self._selector.close()
+            self._wakeup_r.close()
+            self._wakeup_w.close()
+
+    def _run_pending(self):
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        while self._pending:
+            function, args = self._pending.popleft()
+            function(*args)
+
+    def _add(self, bridge):
+        self._bridges.add(bridge)
+        bridge.to_socket.flush()    # e.g. Telnet negotiation of RFC 2217
+        bridge._update()
+
+
+def main():
+    """Serve a serial port on a TCP port, one connection at a time"""
+    import argparse
+    import threading
+
+    parser = argparse.ArgumentParser(
+        description='Forward data between a serial port and TCP connections.',
+        epilog="""\
+NOTE: no security measures are implemented. Anyone can remotely connect
+to this service over the network. A new connection replaces the previous one.
+""")
+    parser.add_argument('SERIALPORT', help='serial port name or URL')
+    parser.add_argument('BAUDRATE', type=int, nargs='?', default=9600,
+                        help='set baud rate, default: %(default)s')
+    parser.add_argument('-P', '--localport', type=int, default=7777,
+                        help='local TCP port, default: %(default)s')
+    parser.add_argument('--rfc2217', action='store_true',
+                        help='speak RFC 2217, remote clients can change the port settings')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='suppress non error messages')
+    args = parser.parse_args()
+
+    ser = serial.serial_for_url(args.SERIALPORT, args.BAUDRATE, do_not_open=True)
+    ser.timeout = 0
+    try:
+        ser.open()
+    except serial.SerialException as e:
+        sys.stderr.write('Could not open serial port {}: {}\n'.format(ser.name, e))
+        sys.exit(1)
+
+    def closed(bridge, error):
+        if not args.quiet:
+            sys.stderr.write('Disconnected{}\n'.format(': {}'.format(error) if error else ''))
+
+    hub = BridgeHub()
+    hub_thread = threading.Thread(target=hub.serve_forever)
+    hub_thread.daemon = True
+    hub_thread.start()
+
+    srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    srv.bind(('', args.localport))
+    srv.listen(1)
+    if not args.quiet:
+        sys.stderr.write('--- Forwarding {} <-> TCP port {} ---\n'.format(ser.name, args.localport))
+    try:
+        while True:
+            client_socket, addr = srv.accept()
+            if not args.quiet:
+                sys.stderr.write('Connected by {}\n'.format(addr))
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for bridge in hub.bridges:
+                hub.call(bridge.close)
+            hub.add(ser, client_socket, rfc2217=args.rfc2217, on_close=closed)
+    except KeyboardInterrupt:
+        pass
+    hub.stop()
+    hub_thread.join(2)
+    ser.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -654,18 +654,19 @@ class Miniterm(object):
                 try:
                     with open(filename, 'rb') as f:
                         sys.stderr.write('--- Sending file {} ---\n'.format(filename))
-                        while True:
-                            block = f.read(1024)
-                            if not block:
-                                break
-                            self.serial.write(block)
-                            # Wait for output buffer to drain.
-                            self.serial.flush()
-                            sys.stderr.write('.')   # Progress indicator.
+                        self.serial.send_file(f, progress=self._upload_progress)
                     sys.stderr.write('\n--- File {} sent ---\n'.format(filename))
                 except IOError as e:
                     sys.stderr.write('--- ERROR opening file {}: {} ---\n'.format(filename, e))
 
+    @staticmethod
+    def _upload_progress(sent, total, rate):
+        """Progress indicator for upload_file"""
+        if total:
+            sys.stderr.write('\r--- {} of {} bytes, {:.0f} bytes/s '.format(sent, total, rate))
+        else:
+            sys.stderr.write('\r--- {} bytes, {:.0f} bytes/s '.format(sent, rate))
+
     def change_filter(self):
         """change the i/o transformations"""
         sys.stderr.write('\n--- Available Filters:\n')
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+#
+# Two pseudo terminals connected like serial ports with a null modem cable.
+#
+# This file is part of pySerial. https://github.com/pyserial/pyserial
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Create two pseudo terminals and relay the data between them, so that they
+can be opened with serial.Serial like two real ports connected with a null
+modem cable. Useful to test and benchmark the POSIX implementation (termios,
+select, ioctl) without hardware.
+
+The relay is a thread with a selector loop (epoll on Linux). Optionally it
+paces the data at the speed the sending port is configured to. The settings
+are read from the pseudo terminal; note that Linux ptys always use 8 data
+bits without parity.
+
+Only the data is relayed: ptys do not implement the modem control lines
+(TIOCMGET/TIOCMSET fail), so RTS/CTS and DTR/DSR cannot be wired.
+"""
+from __future__ import absolute_import
+
+import array
+import errno
+import fcntl
+import os
+import pty
+import sys
+import termios
+import threading
+import time
+import tty
+try:
+    import selectors
+except ImportError:
+    selectors = None    # Python 2.x, PtyPair is not available
+
+from serial import serialposix
+from serial.serialutil import Timeout
+
+# maximal number of bytes buffered and moved per system call
+BLOCK_SIZE = 64 * 1024
+
+# errors that just mean "try again later"
+_RETRY_ERRORS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+# baud rates by termios speed constant
+_SPEEDS = dict((getattr(termios, name), int(name[1:]))
+               for name in dir(termios) if name[0] == 'B' and name[1:].isdigit())
+
+_DATA_BITS = {termios.CS5: 5, termios.CS6: 6, termios.CS7: 7, termios.CS8: 8}
+
+
+def character_time(fd):
+    """\
+    Time to transmit one character with the settings of the terminal fd
+    (a pty master reads the settings of its slave). None when the speed is
+    not known or 0 (hang up).
+    """
+    iflag, oflag, cflag, lflag, ispeed, ospeed, cc = termios.tcgetattr(fd)
+    baudrate = _SPEEDS.get(ospeed)
+    if baudrate is None and ospeed == getattr(serialposix, 'BOTHER', None):
+        # custom baud rate, see serialposix.PlatformSpecific._set_special_baudrate
+        buf = array.array('i', [0] * 64)
+        try:
+            fcntl.ioctl(fd, serialposix.TCGETS2, buf)
+            baudrate = buf[serialposix.BAUDRATE_OFFSET + 1]
+        except IOError:
+            pass
+    if not baudrate:
+        return None
+    bits = 1 + _DATA_BITS.get(cflag & termios.CSIZE, 8)
+    bits += 1 if cflag & termios.PARENB else 0
+    bits += 2 if cflag & termios.CSTOPB else 1
+    return float(bits) / baudrate
+
+
+class _Direction(object):
+    """\
+    Data from the pty master src to the pty master dst, buffered in a
+    bytearray. When pacing, the bytes are released at the speed of src.
+    """
+
+    def __init__(self, src, dst, pace):
+        self.src = src
+        self.dst = dst
+        self.pace = pace
+        self.buffer = bytearray()
+        self.bytes_forwarded = 0
+        self.pace_time = 0      # when the transmission of the next byte ends
+        self.character_time = None
+
+    def fill(self):
+        """Read what is available from src"""
+        try:
+            data = os.read(self.src, BLOCK_SIZE - len(self.buffer))
+        except OSError as e:
+            if e.errno in _RETRY_ERRORS or e.errno == errno.EIO:
+                return
+            raise
+        if self.pace:
+            if not self.buffer:
+                # the line was idle, no burst of saved up time
+                self.pace_time = max(self.pace_time, Timeout.TIME())
+            # checked on each read, the port may have been reconfigured
+            self.character_time = character_time(self.src)
+        self.buffer += data
+
+    def sendable(self, now):
+        """Number of bytes that are transmitted by now"""
+        if not self.pace or self.character_time is None:
+            return len(self.buffer)
+        return min(int(max(now - self.pace_time, 0) / self.character_time), len(self.buffer))
+
+    def delay(self, now, interval):
+        """\
+        Time until the bytes of interval seconds (or all) can be sent, None
+        when nothing is pending. One wakeup per block, not per byte.
+        """
+        if not self.buffer:
+            return None
+        if not self.pace or self.character_time is None:
+            return 0
+        n = min(len(self.buffer), max(1, int(interval / self.character_time)))
+        return max(self.pace_time + n * self.character_time - now, 0)
+
+    def flush(self, now):
+        """Write what can be sent to dst"""
+        n = self.sendable(now)
+        if not n:
+            return
+        try:
+            n = os.write(self.dst, self.buffer[:n])
+        except OSError as e:
+            if e.errno in _RETRY_ERRORS:
+                return
+            raise
+        del self.buffer[:n]
+        self.bytes_forwarded += n
+        if self.pace and self.character_time is not None:
+            self.pace_time += n * self.character_time
+            if not self.buffer:
+                self.pace_time = max(self.pace_time, now)
+
+
+class PtyPair(object):
+    """\
+    Two connected pseudo terminals. ports is the tuple of the device names,
+    to be opened with serial.Serial. With pace, the data is delayed as on a
+    line with the baud rate of the sending port. The relay thread runs from
+    start() until close().
+    """
+
+    # pacing: minimal time between two wakeups of the relay
+    pace_interval = 0.002
+
+    def __init__(self, pace=False):
+        if selectors is None:
+            raise RuntimeError('PtyPair requires the selectors module (Python 3.4+)')
+        self.pace = pace
+        self._masters = []
+        self._slaves = []
+        for i in range(2):
+            master, slave = pty.openpty()
+            self._masters.append(master)
+            self._slaves.append(slave)
+            # no echo or line editing until a serial port configures it. the
+            # slave is kept open so that the pty and its settings persist
+            # while no port is open
+            tty.setraw(slave)
+            fl = fcntl.fcntl(master, fcntl.F_GETFL)
+            fcntl.fcntl(master, fcntl.F_SETFL, fl | os.O_NONBLOCK)
+        self.ports = tuple(os.ttyname(slave) for slave in self._slaves)
+        a, b = self._masters
+        self._directions = (_Direction(a, b, pace), _Direction(b, a, pace))
+        self._wakeup = list(os.pipe())
+        self._thread = None
+        self.alive = False
+
+    def __enter__(self):
+        if self._thread is None:
+            self.start()
+        return self.ports
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    @property
+    def bytes_forwarded(self):
+        """Tuple (bytes from ports[0] to ports[1], bytes from ports[1] to ports[0])"""
+        return tuple(direction.bytes_forwarded for direction in self._directions)
+
+    def start(self):
+        """Start the relay thread"""
+        self.alive = True
+        self._thread = threading.Thread(target=self._run, name='pty-pair')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        """Stop the relay and close the ptys"""
+        if self._thread is not None:
+            self.alive = False
+            os.write(self._wakeup[1], b'\0')
+            self._thread.join()
+            self._thread = None
+        for fd in self._masters + self._slaves + self._wakeup:
+            os.close(fd)
+        self._masters = self._slaves = self._wakeup = []
+
+    def _run(self):
+        """Selector loop"""
+        selector = selectors.DefaultSelector()
+        selector.register(self._wakeup[0], selectors.EVENT_READ)
+        events = {}
+        try:
+            while self.alive:
+                now = Timeout.TIME()
+                timeout = None
+                wanted = dict((fd, 0) for fd in self._masters)
+                for direction in self._directions:
+                    if len(direction.buffer) < BLOCK_SIZE:
+                        wanted[direction.src] |= selectors.EVENT_READ
+                    delay = direction.delay(now, self.pace_interval)
+                    if delay == 0:
+                        wanted[direction.dst] |= selectors.EVENT_WRITE
+                    elif delay is not None:
+                        timeout = delay if timeout is None else min(timeout, delay)
+                for fd, mask in wanted.items():
+                    if mask != events.get(fd, 0):
+                        if not mask:
+                            selector.unregister(fd)
+                        elif events.get(fd):
+                            selector.modify(fd, mask)
+                        else:
+                            selector.register(fd, mask)
+                        events[fd] = mask
+                ready = dict((key.fd, mask) for key, mask in selector.select(timeout))
+                for direction in self._directions:
+                    if ready.get(direction.src, 0) & selectors.EVENT_READ:
+                        direction.fill()
+                now = Timeout.TIME()
+                for direction in self._directions:
+                    direction.flush(now)
+        finally:
+            selector.close()
+
+
+def virtual_pair(pace=False):
+    """\
+    Create two connected pseudo terminals and start the relay. Return the
+    PtyPair, its ports attribute holds the device names.
+    """
+    pair = PtyPair(pace)
+    pair.start()
+    return pair
+
+
+def main():
+    """Create a pair and print the device names, relay until interrupted"""
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(
+        description='Create two pseudo terminals connected like serial ports with a null modem cable.')
+    parser.add_argument('--pace', action='store_true',
+                        help='deliver the data at the speed of the configured baud rate')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='suppress non error messages')
+    args = parser.parse_args()
+
+    # terminate cleanly, e.g. when started by a test script
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    pair = virtual_pair(args.pace)
+    sys.stdout.write('{} {}\n'.format(*pair.ports))
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        pair.close()
+    if not args.quiet:
+        sys.stderr.write('--- forwarded {} and {} bytes ---\n'.format(*pair.bytes_forwarded))
+
+
+if __name__ == '__main__':
+    main()
@@ -66,6 +66,8 @@ class Serial(SerialBase):
                  38400, 57600, 115200, 230400, 460800, 500000, 576000,
                  921600, 1000000)
 
+    _timeout_per_read = True
+
     def __init__(self, *args, **kwargs):
         self._hid_handle = None
         self._read_buffer = None
@@ -181,7 +183,7 @@ class Serial(SerialBase):
 
     @property
     def in_waiting(self):
-        return self._read_buffer.qsize()
+        return self._read_buffer.qsize() + len(self._read_ahead)
 
     def reset_input_buffer(self):
         if not self.is_open:
@@ -189,6 +191,7 @@ class Serial(SerialBase):
         self._hid_handle.send_feature_report(
             bytes((_REPORT_SET_PURGE_FIFOS, _PURGE_RX_FIFO)))
         # empty read buffer
+        del self._read_ahead[:]
         while self._read_buffer.qsize():
             self._read_buffer.get(False)
 
@@ -216,7 +219,7 @@ class Serial(SerialBase):
         if not self.is_open:
             raise PortNotOpenError()
 
-        data = bytearray()
+        data = self._take_read_ahead(size)
         try:
             timeout = Timeout(self._timeout)
             while len(data) < size:
@@ -236,14 +239,17 @@ class Serial(SerialBase):
         if not self.is_open:
             raise PortNotOpenError()
         data = to_bytes(data)
-        tx_len = len(data)
+        length = tx_len = len(data)
         while tx_len > 0:
             to_be_sent = min(tx_len, 0x3F)
             report = to_bytes([to_be_sent]) + data[:to_be_sent]
+            if self._stats is not None:
+                self._stats.write_syscalls += 1
             self._hid_handle.write(report)
 
             data = data[to_be_sent:]
             tx_len = len(data)
+        return length
 
     def _hid_read_loop(self):
         try:
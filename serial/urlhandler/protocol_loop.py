@@ -10,24 +10,23 @@
 #
 # SPDX-License-Identifier:    BSD-3-Clause
 #
-# URL format:    loop://[option[/option...]]
+# URL format:    loop://[?option[=value][&option[=value]]]
 # options:
-# - "debug" print diagnostic messages
+# - "logging=debug" print diagnostic messages
+# - "pace=1" deliver the data at the speed of the configured baud rate
 from __future__ import absolute_import
 
 import logging
 import numbers
+import threading
 import time
 try:
     import urlparse
 except ImportError:
     import urllib.parse as urlparse
-try:
-    import queue
-except ImportError:
-    import Queue as queue
 
-from serial.serialutil import SerialBase, SerialException, to_bytes, iterbytes, SerialTimeoutException, PortNotOpenError
+from serial.serialutil import SerialBase, SerialException, to_bytes, SerialTimeoutException, \
+    PortNotOpenError, Timeout, _byte_view
 
 # map log level names to constants. used in from_url()
 LOGGER_LEVELS = {
@@ -38,17 +37,168 @@ LOGGER_LEVELS = {
 }
 
 
+class RingBuffer(object):
+    """\
+    Bounded FIFO of bytes, stored in a preallocated bytearray. Not thread
+    safe, the user has to lock.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._start = 0     # position of the oldest byte
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def free(self):
+        """Number of bytes that can be added"""
+        return self.size - self._count
+
+    def put(self, data):
+        """\
+        Append as much of data (a memoryview of bytes) as fits, return the
+        number of bytes added.
+        """
+        n = min(len(data), self.size - self._count)
+        end = (self._start + self._count) % self.size
+        first = min(n, self.size - end)
+        self._view[end:end + first] = data[:first]
+        self._view[:n - first] = data[first:n]
+        self._count += n
+        return n
+
+    def get_into(self, view):
+        """\
+        Move up to len(view) bytes to the start of view (a writable
+        memoryview), return the number of bytes.
+        """
+        n = min(len(view), self._count)
+        first = min(n, self.size - self._start)
+        view[:first] = self._view[self._start:self._start + first]
+        view[first:n] = self._view[:n - first]
+        self._start = (self._start + n) % self.size
+        self._count -= n
+        return n
+
+    def clear(self):
+        """Discard all data"""
+        self._start = 0
+        self._count = 0
+
+    def discard(self, n):
+        """Remove the n oldest bytes"""
+        n = min(n, self._count)
+        self._start = (self._start + n) % self.size
+        self._count -= n
+
+    def truncate(self, n):
+        """Keep only the n oldest bytes"""
+        self._count = min(n, self._count)
+
+
+class Channel(object):
+    """\
+    One direction of a connection: a RingBuffer and the model of the
+    transmission. Readers and writers wait on condition for data or space,
+    the methods have to be called with it held.
+
+    Without pacing written bytes are readable immediately. With pacing they
+    become readable one character_time after another.
+    """
+
+    def __init__(self, size, pace=False):
+        self.buffer = RingBuffer(size)
+        self.condition = threading.Condition()
+        self.pace = pace
+        self.character_time = 0
+        # bytes at the start of the buffer that can be read, the others
+        # are still being "transmitted" when pacing
+        self.readable = 0
+        self.pace_time = 0              # when the transmission of the next byte ends
+
+    def release(self):
+        """\
+        Make the bytes that are transmitted by now readable. Without pacing
+        that are all, else at the rate given by character_time.
+        """
+        if not self.pace:
+            self.readable = len(self.buffer)
+            return
+        now = Timeout.TIME()
+        in_flight = len(self.buffer) - self.readable
+        n = min(int(max(now - self.pace_time, 0) / self.character_time), in_flight)
+        self.readable += n
+        self.pace_time += n * self.character_time
+        if n == in_flight:
+            # the line is idle, the next byte starts when it is written
+            self.pace_time = max(self.pace_time, now)
+
+    def in_flight(self):
+        """Number of bytes not yet transmitted"""
+        self.release()
+        return len(self.buffer) - self.readable
+
+    def delay(self, wanted, time_left):
+        """\
+        Time to wait until wanted bytes (or all in flight) are readable, not
+        longer than time_left (None: no limit). Call after release().
+        """
+        in_flight = len(self.buffer) - self.readable
+        if not self.pace or not in_flight:
+            return time_left
+        # one wakeup for the whole block instead of one per byte
+        delay = max(self.pace_time + min(wanted, in_flight) * self.character_time - Timeout.TIME(), 0)
+        return delay if time_left is None else min(delay, time_left)
+
+    def set_character_time(self, character_time):
+        """Change the speed, what is sent by now was at the old one"""
+        if self.pace and self.character_time:
+            self.release()
+            self.condition.notify_all()
+        self.character_time = character_time
+
+    def discard_received(self):
+        """Discard the readable bytes, without pacing all"""
+        if self.pace:
+            self.release()
+            self.buffer.discard(self.readable)
+        else:
+            self.buffer.clear()
+        self.readable = 0
+        self.condition.notify_all()
+
+    def discard_unsent(self):
+        """Discard the bytes in flight, without pacing all"""
+        if self.pace:
+            self.release()
+            self.buffer.truncate(self.readable)
+        else:
+            self.buffer.clear()
+            self.readable = 0
+        self.condition.notify_all()
+
+
 class Serial(SerialBase):
     """Serial port implementation that simulates a loop back connection in plain software."""
 
     BAUDRATES = (50, 75, 110, 134, 150, 200, 300, 600, 1200, 1800, 2400, 4800,
                  9600, 19200, 38400, 57600, 115200)
 
+    _timeout_per_read = True
+
     def __init__(self, *args, **kwargs):
         self.buffer_size = 4096
-        self.queue = None
         self.logger = None
+        # the Channel data is read from and written to, the same for loop://
+        self._rx = None
+        self._tx = None
+        self._cancel_read = False
         self._cancel_write = False
+        self._pace = False
         super(Serial, self).__init__(*args, **kwargs)
 
     def open(self):
@@ -59,34 +209,49 @@ class Serial(SerialBase):
         if self.is_open:
             raise SerialException("Port is already open.")
         self.logger = None
-        self.queue = queue.Queue(self.buffer_size)
+        self._cancel_read = False
+        self._pace = False
 
         if self._port is None:
             raise SerialException("Port must be configured before it can be used.")
         # not that there is anything to open, but the function applies the
         # options found in the URL
         self.from_url(self.port)
-
-        # not that there anything to configure...
-        self._reconfigure_port()
-        # all things set up get, now a clean start
-        self.is_open = True
-        if not self._dsrdtr:
-            self._update_dtr_state()
-        if not self._rtscts:
-            self._update_rts_state()
-        self.reset_input_buffer()
-        self.reset_output_buffer()
+        self._connect()
+        try:
+            # not that there anything to configure...
+            self._reconfigure_port()
+            # all things set up get, now a clean start
+            self.is_open = True
+            if not self._dsrdtr:
+                self._update_dtr_state()
+            if not self._rtscts:
+                self._update_rts_state()
+            self.reset_input_buffer()
+            self.reset_output_buffer()
+        except BaseException:
+            # e.g. an invalid baud rate, the channels are not used
+            self.is_open = False
+            self._disconnect()
+            raise
 
     def close(self):
         if self.is_open:
             self.is_open = False
-            try:
-                self.queue.put_nowait(None)
-            except queue.Full:
-                pass
+            # wake up blocked readers and writers
+            for channel in (self._rx, self._tx):
+                with channel.condition:
+                    channel.condition.notify_all()
+            self._disconnect()
         super(Serial, self).close()
 
+    def _connect(self):
+        """Set up the channels, the data sent is received"""
+        self._rx = self._tx = Channel(self.buffer_size, self._pace)
+
+    def _disconnect(self):
+        """Called from close()"""
+
     def _reconfigure_port(self):
         """\
         Set communication parameters on opened port. For the loop://
@@ -97,6 +262,8 @@ class Serial(SerialBase):
             raise ValueError("invalid baudrate: {!r}".format(self._baudrate))
         if self.logger:
             self.logger.info('_reconfigure_port()')
+        with self._tx.condition:
+            self._tx.set_character_time(self.character_time)
 
     def from_url(self, url):
         """extract host and port from an URL string"""
@@ -104,7 +271,7 @@ class Serial(SerialBase):
         if parts.scheme != "loop":
             raise SerialException(
                 'expected a string in the form '
-                '"loop://[?logging={debug|info|warning|error}]": not starting '
+                '"loop://[?logging={{debug|info|warning|error}}][&pace=1]": not starting '
                 'with loop:// ({!r})'.format(parts.scheme))
         try:
             # process options now, directly altering self
@@ -114,12 +281,14 @@ class Serial(SerialBase):
                     self.logger = logging.getLogger('pySerial.loop')
                     self.logger.setLevel(LOGGER_LEVELS[values[0]])
                     self.logger.debug('enabled logging')
+                elif option == 'pace':
+                    self._pace = values[0] not in ('0', 'false', 'no')
                 else:
                     raise ValueError('unknown option: {!r}'.format(option))
         except ValueError as e:
             raise SerialException(
                 'expected a string in the form '
-                '"loop://[?logging={debug|info|warning|error}]": {}'.format(e))
+                '"loop://[?logging={{debug|info|warning|error}}][&pace=1]": {}'.format(e))
 
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
 
@@ -128,11 +297,14 @@ class Serial(SerialBase):
         """Return the number of bytes currently in the input buffer."""
         if not self.is_open:
             raise PortNotOpenError()
+        with self._rx.condition:
+            self._rx.release()
+            n = self._rx.readable
         if self.logger:
             # attention the logged value can differ from return value in
             # threaded environments...
-            self.logger.debug('in_waiting -> {:d}'.format(self.queue.qsize()))
-        return self.queue.qsize()
+            self.logger.debug('in_waiting -> {:d}'.format(n))
+        return n + len(self._read_ahead)
 
     def read(self, size=1):
         """\
@@ -142,36 +314,54 @@ class Serial(SerialBase):
         """
         if not self.is_open:
             raise PortNotOpenError()
-        if self._timeout is not None and self._timeout != 0:
-            timeout = time.time() + self._timeout
-        else:
-            timeout = None
-        data = bytearray()
-        while size > 0 and self.is_open:
-            try:
-                b = self.queue.get(timeout=self._timeout)  # XXX inter char timeout
-            except queue.Empty:
-                if self._timeout == 0:
+        read = bytearray(max(size, 0))
+        n = self.readinto(read)
+        del read[n:]
+        return bytes(read)
+
+    def readinto(self, b):
+        """\
+        Read bytes into a pre-allocated, writable bytes-like object b and
+        return the number of bytes read. Timeout and cancel_read() behave
+        the same as for read().
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        view = _byte_view(b)
+        size = len(view)
+        data = self._take_read_ahead(size)
+        n_read = len(data)
+        view[:n_read] = data
+        timeout = Timeout(self._timeout)     # XXX inter char timeout
+        rx = self._rx
+        with rx.condition:
+            while n_read < size and self.is_open:
+                rx.release()
+                n = rx.buffer.get_into(view[n_read:n_read + rx.readable])
+                if n:
+                    n_read += n
+                    rx.readable -= n
+                    rx.condition.notify_all()   # there is space for writers
+                    continue
+                if self._cancel_read:
+                    self._cancel_read = False
                     break
-            else:
-                if b is not None:
-                    data += b
-                    size -= 1
-                else:
+                if timeout.expired():
+                    if self.logger and not timeout.is_non_blocking:
+                        self.logger.info('read timeout')
                     break
-            # check for timeout now, after data has been read.
-            # useful for timeout = 0 (non blocking) read
-            if timeout and time.time() > timeout:
-                if self.logger:
-                    self.logger.info('read timeout')
-                break
-        return bytes(data)
+                rx.condition.wait(rx.delay(size - n_read, timeout.time_left()))
+        return n_read
 
     def cancel_read(self):
-        self.queue.put_nowait(None)
+        with self._rx.condition:
+            self._cancel_read = True
+            self._rx.condition.notify_all()
 
     def cancel_write(self):
-        self._cancel_write = True
+        with self._tx.condition:
+            self._cancel_write = True
+            self._tx.condition.notify_all()
 
     def write(self, data):
         """\
@@ -186,8 +376,10 @@ class Serial(SerialBase):
         # calculate aprox time that would be used to send the data
         time_used_to_send = 10.0 * len(data) / self._baudrate
         # when a write timeout is configured check if we would be successful
-        # (not sending anything, not even the part that would have time)
-        if self._write_timeout is not None and time_used_to_send > self._write_timeout:
+        # (not sending anything, not even the part that would have time).
+        # non-blocking writes take what fits into the buffer. when pacing,
+        # the buffer fills up at the real speed.
+        if not self._pace and self._write_timeout and time_used_to_send > self._write_timeout:
             # must wait so that unit test succeeds
             time_left = self._write_timeout
             while time_left > 0 and not self._cancel_write:
@@ -196,9 +388,30 @@ class Serial(SerialBase):
             if self._cancel_write:
                 return 0  # XXX
             raise SerialTimeoutException('Write timeout')
-        for byte in iterbytes(data):
-            self.queue.put(byte, timeout=self._write_timeout)
-        return len(data)
+        return self._put(memoryview(data))
+
+    def _put(self, view):
+        """\
+        Add the bytes to the transmit channel, blocking while it is full,
+        return the number of bytes.
+        """
+        tx = self._tx
+        n_written = 0
+        timeout = Timeout(self._write_timeout)
+        with tx.condition:
+            while n_written < len(view) and self.is_open:
+                tx.release()    # the line may have been idle
+                n = tx.buffer.put(view[n_written:])
+                if n:
+                    n_written += n
+                    tx.condition.notify_all()   # there is data for readers
+                    continue
+                if self._cancel_write or timeout.is_non_blocking:
+                    break
+                if timeout.expired():
+                    raise SerialTimeoutException('Write timeout')
+                tx.condition.wait(timeout.time_left())
+        return n_written
 
     def reset_input_buffer(self):
         """Clear input buffer, discarding all that is in the buffer."""
@@ -206,11 +419,9 @@ class Serial(SerialBase):
             raise PortNotOpenError()
         if self.logger:
             self.logger.info('reset_input_buffer()')
-        try:
-            while self.queue.qsize():
-                self.queue.get_nowait()
-        except queue.Empty:
-            pass
+        del self._read_ahead[:]
+        with self._rx.condition:
+            self._rx.discard_received()
 
     def reset_output_buffer(self):
         """\
@@ -221,22 +432,39 @@ class Serial(SerialBase):
             raise PortNotOpenError()
         if self.logger:
             self.logger.info('reset_output_buffer()')
-        try:
-            while self.queue.qsize():
-                self.queue.get_nowait()
-        except queue.Empty:
-            pass
+        with self._tx.condition:
+            self._tx.discard_unsent()
+
+    def flush(self):
+        """\
+        Wait until all data is written. When pacing, that is when the last
+        byte was transmitted at the baud rate.
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        tx = self._tx
+        with tx.condition:
+            while tx.pace and self.is_open:
+                in_flight = tx.in_flight()
+                if not in_flight:
+                    break
+                tx.condition.wait(tx.delay(in_flight, None))
 
     @property
     def out_waiting(self):
         """Return how many bytes the in the outgoing buffer"""
         if not self.is_open:
             raise PortNotOpenError()
+        with self._tx.condition:
+            if self._tx.pace:
+                n = self._tx.in_flight()    # not yet transmitted
+            else:
+                n = len(self._tx.buffer)
         if self.logger:
             # attention the logged value can differ from return value in
             # threaded environments...
-            self.logger.debug('out_waiting -> {:d}'.format(self.queue.qsize()))
-        return self.queue.qsize()
+            self.logger.debug('out_waiting -> {:d}'.format(n))
+        return n
 
     def _update_break_state(self):
         """\
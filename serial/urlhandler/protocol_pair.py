@@ -0,0 +1,184 @@
+#! python
+#
+# This module implements a null modem connection between two ports in the
+# same process: what one end sends, the other receives.
+#
+# This file is part of pySerial. https://github.com/pyserial/pyserial
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# URL format:    pair://<name>/{a|b}[?option[=value][&option[=value]]]
+# options:
+# - "logging=debug" print diagnostic messages
+# - "pace=1" send the data at the speed of the configured baud rate
+from __future__ import absolute_import
+
+import logging
+import threading
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+from serial.serialutil import SerialException, PortNotOpenError, to_bytes
+from serial.urlhandler import protocol_loop
+from serial.urlhandler.protocol_loop import Channel, LOGGER_LEVELS
+
+ENDPOINTS = {'a': 'b', 'b': 'a'}
+
+# connections by name, while at least one end is open
+_links = {}
+_links_lock = threading.Lock()
+
+
+class _Link(object):
+    """The two ends of a connection and a Channel for each direction"""
+
+    def __init__(self, buffer_size):
+        # channels by sending end
+        self.channels = {'a': Channel(buffer_size), 'b': Channel(buffer_size)}
+        self.ports = {'a': None, 'b': None}
+
+
+class Serial(protocol_loop.Serial):
+    """\
+    One end of a null modem connection in plain software. TX is connected to
+    the RX of the other end, RTS to CTS and DTR to DSR and CD. The
+    directions are independent, a reader and a writer only share a lock
+    when they use the same direction.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._name = None
+        self._endpoint = None
+        self._link = None
+        super(Serial, self).__init__(*args, **kwargs)
+
+    def from_url(self, url):
+        """extract the name, the end and options from an URL string"""
+        parts = urlparse.urlsplit(url)
+        if parts.scheme != 'pair':
+            raise SerialException(
+                'expected a string in the form '
+                '"pair://<name>/{{a|b}}[?logging={{debug|info|warning|error}}][&pace=1]": '
+                'not starting with pair:// ({!r})'.format(parts.scheme))
+        try:
+            self._name = parts.netloc
+            self._endpoint = parts.path.strip('/')
+            if not self._name:
+                raise ValueError('name missing')
+            if self._endpoint not in ENDPOINTS:
+                raise ValueError('end must be "a" or "b", not {!r}'.format(self._endpoint))
+            # process options now, directly altering self
+            for option, values in urlparse.parse_qs(parts.query, True).items():
+                if option == 'logging':
+                    logging.basicConfig()   # XXX is that good to call it here?
+                    self.logger = logging.getLogger('pySerial.pair')
+                    self.logger.setLevel(LOGGER_LEVELS[values[0]])
+                    self.logger.debug('enabled logging')
+                elif option == 'pace':
+                    self._pace = values[0] not in ('0', 'false', 'no')
+                else:
+                    raise ValueError('unknown option: {!r}'.format(option))
+        except ValueError as e:
+            raise SerialException(
+                'expected a string in the form '
+                '"pair://<name>/{{a|b}}[?logging={{debug|info|warning|error}}][&pace=1]": {}'.format(e))
+
+    def _connect(self):
+        """Attach to the connection, create it when this is the first end"""
+        with _links_lock:
+            link = _links.get(self._name)
+            if link is None:
+                link = _links[self._name] = _Link(self.buffer_size)
+            if link.ports[self._endpoint] is not None:
+                raise SerialException('pair://{}/{} is already open'.format(self._name, self._endpoint))
+            link.ports[self._endpoint] = self
+        self._link = link
+        self._tx = link.channels[self._endpoint]
+        self._rx = link.channels[ENDPOINTS[self._endpoint]]
+        with self._tx.condition:
+            self._tx.pace = self._pace
+
+    def _disconnect(self):
+        """Detach, the connection is removed when both ends are closed"""
+        with _links_lock:
+            self._link.ports[self._endpoint] = None
+            if not any(self._link.ports.values()):
+                del _links[self._name]
+        self._link = None
+
+    @property
+    def peer(self):
+        """The other end when it is open, else None"""
+        if self._link is None:
+            return None
+        return self._link.ports[ENDPOINTS[self._endpoint]]
+
+    def write(self, data):
+        """\
+        Output the given byte string. Blocks while the receive buffer of the
+        other end is full.
+        """
+        self._cancel_write = False
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self._put(memoryview(to_bytes(data)))
+
+    def _update_rts_state(self):
+        """Set terminal status line: Request To Send"""
+        if self.logger:
+            self.logger.info('_update_rts_state({!r}) -> CTS of other end'.format(self._rts_state))
+
+    def _update_dtr_state(self):
+        """Set terminal status line: Data Terminal Ready"""
+        if self.logger:
+            self.logger.info('_update_dtr_state({!r}) -> DSR and CD of other end'.format(self._dtr_state))
+
+    def _peer_line(self, name):
+        """State of a line of the other end, inactive when it is closed"""
+        if not self.is_open:
+            raise PortNotOpenError()
+        peer = self.peer
+        state = peer is not None and peer.is_open and getattr(peer, name)
+        if self.logger:
+            self.logger.info('{} of other end -> {!r}'.format(name, state))
+        return state
+
+    @property
+    def cts(self):
+        """Read terminal status line: Clear To Send"""
+        return self._peer_line('_rts_state')
+
+    @property
+    def dsr(self):
+        """Read terminal status line: Data Set Ready"""
+        return self._peer_line('_dtr_state')
+
+    @property
+    def ri(self):
+        """Read terminal status line: Ring Indicator"""
+        if not self.is_open:
+            raise PortNotOpenError()
+        return False
+
+    @property
+    def cd(self):
+        """Read terminal status line: Carrier Detect"""
+        return self._peer_line('_dtr_state')
+
+
+# simple client test
+if __name__ == '__main__':
+    import sys
+    a = Serial('pair://test/a', timeout=1)
+    b = Serial('pair://test/b', timeout=1)
+    sys.stdout.write('{}\n{}\n'.format(a, b))
+
+    sys.stdout.write("write...\n")
+    a.write(b"hello\n")
+    sys.stdout.write("read: {!r}\n".format(b.read(6)))
+
+    b.close()
+    a.close()
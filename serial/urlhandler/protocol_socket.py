@@ -22,14 +22,20 @@ import errno
 import logging
 import select
 import socket
+import struct
 import time
 try:
     import urlparse
 except ImportError:
     import urllib.parse as urlparse
+try:
+    import fcntl
+    import termios
+except ImportError:
+    fcntl = None    # Windows, in_waiting only reports readiness
 
 from serial.serialutil import SerialBase, SerialException, to_bytes, \
-    PortNotOpenError, SerialTimeoutException, Timeout
+    PortNotOpenError, SerialTimeoutException, Timeout, _advance_buffers
 
 # map log level names to constants. used in from_url()
 LOGGER_LEVELS = {
@@ -41,6 +47,9 @@ LOGGER_LEVELS = {
 
 POLL_TIMEOUT = 5
 
+# limit the number of buffers passed to sendmsg() (IOV_MAX on Linux is 1024)
+SENDMSG_MAX_BUFFERS = 1024
+
 
 class Serial(SerialBase):
     """Serial port implementation for plain sockets."""
@@ -48,6 +57,8 @@ class Serial(SerialBase):
     BAUDRATES = (50, 75, 110, 134, 150, 200, 300, 600, 1200, 1800, 2400, 4800,
                  9600, 19200, 38400, 57600, 115200)
 
+    _timeout_per_read = True
+
     def open(self):
         """\
         Open port with current settings. This may throw a SerialException
@@ -137,10 +148,17 @@ class Serial(SerialBase):
         """Return the number of bytes currently in the input buffer."""
         if not self.is_open:
             raise PortNotOpenError()
+        if fcntl is not None:
+            # the number of bytes received, so that e.g. read_until() reads
+            # them with one call
+            n = struct.unpack('I', fcntl.ioctl(self._socket.fileno(), termios.FIONREAD, b'\0' * 4))[0]
+            if n:
+                return n + len(self._read_ahead)
         # Poll the socket to see if it is ready for reading.
-        # If ready, at least one byte will be to read.
+        # If ready, at least one byte will be to read (or the connection
+        # was closed).
         lr, lw, lx = select.select([self._socket], [], [], 0)
-        return len(lr)
+        return len(lr) + len(self._read_ahead)
 
     # select based implementation, similar to posix, but only using socket API
     # to be portable, additionally handle socket timeout which is used to
@@ -153,7 +171,7 @@ class Serial(SerialBase):
         """
         if not self.is_open:
             raise PortNotOpenError()
-        read = bytearray()
+        read = self._take_read_ahead(size)
         timeout = Timeout(self._timeout)
         while len(read) < size:
             try:
@@ -164,6 +182,8 @@ class Serial(SerialBase):
                 # there is nothing to read.
                 if not ready:
                     break   # timeout
+                if self._stats is not None:
+                    self._stats.read_syscalls += 1
                 buf = self._socket.recv(size - len(read))
                 # read should always return some data as select reported it was
                 # ready to read when we get to this point, unless it is EOF
@@ -194,13 +214,30 @@ class Serial(SerialBase):
         """
         if not self.is_open:
             raise PortNotOpenError()
+        return self._write_views([memoryview(to_bytes(data))])
+
+    def write_vectored(self, buffers):
+        """\
+        Output a sequence of byte strings. The buffers are passed to
+        sendmsg() in one call, without joining them.
+        """
+        if not self.is_open:
+            raise PortNotOpenError()
+        return self._write_views([memoryview(to_bytes(b)) for b in buffers])
 
-        d = to_bytes(data)
-        tx_len = length = len(d)
+    def _write_views(self, views):
+        """Write loop for a list of memoryviews, partial writes advance the views."""
+        views = [v for v in views if len(v)]
+        tx_len = length = sum(len(v) for v in views)
         timeout = Timeout(self._write_timeout)
         while tx_len > 0:
             try:
-                n = self._socket.send(d)
+                if self._stats is not None:
+                    self._stats.write_syscalls += 1
+                if len(views) > 1 and hasattr(self._socket, 'sendmsg'):
+                    n = self._socket.sendmsg(views[:SENDMSG_MAX_BUFFERS])
+                else:
+                    n = self._socket.send(views[0])
                 if timeout.is_non_blocking:
                     # Zero timeout indicates non-blocking - simply return the
                     # number of bytes of data actually written
@@ -219,7 +256,7 @@ class Serial(SerialBase):
                     _, ready, _ = select.select([], [self._socket], [], None)
                     if not ready:
                         raise SerialException('write failed (select)')
-                d = d[n:]
+                _advance_buffers(views, n)
                 tx_len -= n
             except SerialException:
                 raise
@@ -235,14 +272,18 @@ class Serial(SerialBase):
                 # see also http://www.python.org/dev/peps/pep-3151/#select
                 if e[0] not in (errno.EAGAIN, errno.EALREADY, errno.EWOULDBLOCK, errno.EINPROGRESS, errno.EINTR):
                     raise SerialException('write failed: {}'.format(e))
-            if not timeout.is_non_blocking and timeout.expired():
+            if timeout.is_non_blocking:
+                # nothing could be written without blocking
+                break
+            if timeout.expired():
                 raise SerialTimeoutException('Write timeout')
-        return length - len(d)
+        return length - tx_len
 
     def reset_input_buffer(self):
         """Clear input buffer, discarding all that is in the buffer."""
         if not self.is_open:
             raise PortNotOpenError()
+        del self._read_ahead[:]
 
         # just use recv to remove input, while there is some
         ready = True
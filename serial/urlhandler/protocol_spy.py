@@ -15,6 +15,9 @@
 # - dev=X   a file or device to write to
 # - color   use escape code to colorize output
 # - raw     forward raw bytes instead of hexdump
+# - queued  format and write the output in a background thread
+#
+# The wrapped port can be a device name or an other URL, e.g. spy://loop://
 #
 # example:
 #   redirect output to an other terminal window on Posix (Linux):
@@ -24,10 +27,9 @@ from __future__ import absolute_import
 
 import logging
 import sys
-import time
 
 import serial
-from serial.serialutil import  to_bytes
+from serial.serialutil import _monotonic_ns
 
 try:
     import urlparse
@@ -83,21 +85,21 @@ class FormatRaw(object):
         self.rx_color = '\x1b[32m'
         self.tx_color = '\x1b[31m'
 
-    def rx(self, data):
+    def rx(self, data, timestamp=None):
         """show received data"""
         if self.color:
             self.output.write(self.rx_color)
         self.output.write(data)
         self.output.flush()
 
-    def tx(self, data):
+    def tx(self, data, timestamp=None):
         """show transmitted data"""
         if self.color:
             self.output.write(self.tx_color)
         self.output.write(data)
         self.output.flush()
 
-    def control(self, name, value):
+    def control(self, name, value, timestamp=None):
         """(do not) show control calls"""
         pass
 
@@ -118,7 +120,7 @@ class FormatHexdump(object):
     """
 
     def __init__(self, output, color):
-        self.start_time = time.time()
+        self.start_time = _monotonic_ns()
         self.output = output
         self.color = color
         self.rx_color = '\x1b[32m'
@@ -129,28 +131,32 @@ class FormatHexdump(object):
         self.output.write('{:010.3f} {:4} {}{}\n'.format(timestamp, label, value, value2))
         self.output.flush()
 
-    def rx(self, data):
+    def elapsed(self, timestamp):
+        """seconds since start, timestamp is a time.monotonic_ns() or None for now"""
+        return ((_monotonic_ns() if timestamp is None else timestamp) - self.start_time) / 1e9
+
+    def rx(self, data, timestamp=None):
         """show received data as hex dump"""
         if self.color:
             self.output.write(self.rx_color)
         if data:
             for offset, row in hexdump(data):
-                self.write_line(time.time() - self.start_time, 'RX', '{:04X}  '.format(offset), row)
+                self.write_line(self.elapsed(timestamp), 'RX', '{:04X}  '.format(offset), row)
         else:
-            self.write_line(time.time() - self.start_time, 'RX', '<empty>')
+            self.write_line(self.elapsed(timestamp), 'RX', '<empty>')
 
-    def tx(self, data):
+    def tx(self, data, timestamp=None):
         """show transmitted data as hex dump"""
         if self.color:
             self.output.write(self.tx_color)
         for offset, row in hexdump(data):
-            self.write_line(time.time() - self.start_time, 'TX', '{:04X}  '.format(offset), row)
+            self.write_line(self.elapsed(timestamp), 'TX', '{:04X}  '.format(offset), row)
 
-    def control(self, name, value):
+    def control(self, name, value, timestamp=None):
         """show control calls"""
         if self.color:
             self.output.write(self.control_color)
-        self.write_line(time.time() - self.start_time, name, value)
+        self.write_line(self.elapsed(timestamp), name, value)
 
 
 class FormatLog(object):
@@ -162,16 +168,16 @@ class FormatLog(object):
         # output and color is ignored
         self.log = logging.getLogger(output)
 
-    def rx(self, data):
+    def rx(self, data, timestamp=None):
         """show received data"""
         if data:
             self.log.info('RX {!r}'.format(data))
 
-    def tx(self, data):
+    def tx(self, data, timestamp=None):
         """show transmitted data"""
         self.log.info('TX {!r}'.format(data))
 
-    def control(self, name, value):
+    def control(self, name, value, timestamp=None):
         """show control calls"""
         self.log.info('{}: {}'.format(name, value))
 
@@ -181,154 +187,202 @@ class FormatLogHex(FormatLog):
     Write data to logging module.
     """
 
-    def rx(self, data):
+    def rx(self, data, timestamp=None):
         """show received data"""
         if data:
             for offset, row in hexdump(data):
                 self.log.info('RX {}{}'.format('{:04X}  '.format(offset), row))
 
-    def tx(self, data):
+    def tx(self, data, timestamp=None):
         """show transmitted data"""
         for offset, row in hexdump(data):
             self.log.info('TX {}{}'.format('{:04X}  '.format(offset), row))
 
 
-class Serial(serial.Serial):
+# control events of the taps: name -> (label, format of the value)
+CONTROL_LABELS = {
+    'rts': ('RTS', None),
+    'dtr': ('DTR', None),
+    'break_condition': ('BRK', None),
+    'cts': ('CTS', None),
+    'dsr': ('DSR', None),
+    'ri': ('RI', None),
+    'cd': ('CD', None),
+    'send_break': ('BRK', 'send_break {}s'),
+    'flush': ('Q-TX', 'flush'),
+    'reset_input_buffer': ('Q-RX', 'reset_input_buffer'),
+    'reset_output_buffer': ('Q-TX', 'reset_output_buffer'),
+    'send_file': ('Q-TX', 'send_file -> {}'),
+    'in_waiting': ('Q-RX', 'in_waiting -> {}'),
+}
+
+
+class SpyTap(object):
+    """\
+    Tap callback that passes the events of a port to a formatter. Empty
+    reads and reconfigurations are only shown when show_all is true.
+    """
+
+    def __init__(self, formatter, show_all=False):
+        self.formatter = formatter
+        self.show_all = show_all
+
+    def __call__(self, event, data, timestamp):
+        if event == 'rx':
+            if data or self.show_all:
+                self.formatter.rx(data, timestamp)
+        elif event == 'tx':
+            self.formatter.tx(data, timestamp)
+        elif event == 'control':
+            name, value = data
+            label, text = CONTROL_LABELS.get(name, (name, '{}'))
+            if text is None:
+                text = 'active' if value else 'inactive'
+            self.formatter.control(label, text.format(value), timestamp)
+        elif event == 'cancel':
+            self.formatter.control('Q-RX' if data == 'read' else 'Q-TX', 'cancel_{}'.format(data), timestamp)
+        elif event == 'reconfigure' and self.show_all:
+            self.formatter.control('CFG', '{baudrate},{bytesize},{parity},{stopbits}'.format(**data), timestamp)
+
+
+def spy_class(base):
     """\
-    Inherit the native Serial port implementation and wrap all the methods and
-    attributes.
+    Return a subclass of the port class base that is configured with a
+    spy:// URL and shows the traffic with a SpyTap.
     """
-    # pylint: disable=no-member
-
-    def __init__(self, *args, **kwargs):
-        super(Serial, self).__init__(*args, **kwargs)
-        self.formatter = None
-        self.show_all = False
-
-    @serial.Serial.port.setter
-    def port(self, value):
-        if value is not None:
-            serial.Serial.port.__set__(self, self.from_url(value))
-
-    def from_url(self, url):
-        """extract host and port from an URL string"""
-        parts = urlparse.urlsplit(url)
-        if parts.scheme != 'spy':
-            raise serial.SerialException(
-                'expected a string in the form '
-                '"spy://port[?option[=value][&option[=value]]]": '
-                'not starting with spy:// ({!r})'.format(parts.scheme))
-        # process options now, directly altering self
-        formatter = FormatHexdump
-        color = False
-        output = sys.stderr
-        try:
-            for option, values in urlparse.parse_qs(parts.query, True).items():
-                if option == 'file':
-                    output = open(values[0], 'w')
-                elif option == 'color':
-                    color = True
-                elif option == 'raw':
-                    formatter = FormatRaw
-                elif option == 'rawlog':
-                    formatter = FormatLog
-                    output = values[0] if values[0] else 'serial'
-                elif option == 'log':
-                    formatter = FormatLogHex
-                    output = values[0] if values[0] else 'serial'
-                elif option == 'all':
-                    self.show_all = True
-                else:
-                    raise ValueError('unknown option: {!r}'.format(option))
-        except ValueError as e:
-            raise serial.SerialException(
-                'expected a string in the form '
-                '"spy://port[?option[=value][&option[=value]]]": {}'.format(e))
-        self.formatter = formatter(output, color)
-        return ''.join([parts.netloc, parts.path])
-
-    def write(self, tx):
-        tx = to_bytes(tx)
-        self.formatter.tx(tx)
-        return super(Serial, self).write(tx)
-
-    def read(self, size=1):
-        rx = super(Serial, self).read(size)
-        if rx or self.show_all:
-            self.formatter.rx(rx)
-        return rx
-
-    if hasattr(serial.Serial, 'cancel_read'):
-        def cancel_read(self):
-            self.formatter.control('Q-RX', 'cancel_read')
-            super(Serial, self).cancel_read()
-
-    if hasattr(serial.Serial, 'cancel_write'):
-        def cancel_write(self):
-            self.formatter.control('Q-TX', 'cancel_write')
-            super(Serial, self).cancel_write()
-
-    @property
-    def in_waiting(self):
-        n = super(Serial, self).in_waiting
-        if self.show_all:
-            self.formatter.control('Q-RX', 'in_waiting -> {}'.format(n))
-        return n
-
-    def flush(self):
-        self.formatter.control('Q-TX', 'flush')
-        super(Serial, self).flush()
-
-    def reset_input_buffer(self):
-        self.formatter.control('Q-RX', 'reset_input_buffer')
-        super(Serial, self).reset_input_buffer()
-
-    def reset_output_buffer(self):
-        self.formatter.control('Q-TX', 'reset_output_buffer')
-        super(Serial, self).reset_output_buffer()
-
-    def send_break(self, duration=0.25):
-        self.formatter.control('BRK', 'send_break {}s'.format(duration))
-        super(Serial, self).send_break(duration)
-
-    @serial.Serial.break_condition.setter
-    def break_condition(self, level):
-        self.formatter.control('BRK', 'active' if level else 'inactive')
-        serial.Serial.break_condition.__set__(self, level)
-
-    @serial.Serial.rts.setter
-    def rts(self, level):
-        self.formatter.control('RTS', 'active' if level else 'inactive')
-        serial.Serial.rts.__set__(self, level)
-
-    @serial.Serial.dtr.setter
-    def dtr(self, level):
-        self.formatter.control('DTR', 'active' if level else 'inactive')
-        serial.Serial.dtr.__set__(self, level)
-
-    @serial.Serial.cts.getter
-    def cts(self):
-        level = super(Serial, self).cts
-        self.formatter.control('CTS', 'active' if level else 'inactive')
-        return level
-
-    @serial.Serial.dsr.getter
-    def dsr(self):
-        level = super(Serial, self).dsr
-        self.formatter.control('DSR', 'active' if level else 'inactive')
-        return level
-
-    @serial.Serial.ri.getter
-    def ri(self):
-        level = super(Serial, self).ri
-        self.formatter.control('RI', 'active' if level else 'inactive')
-        return level
-
-    @serial.Serial.cd.getter
-    def cd(self):
-        level = super(Serial, self).cd
-        self.formatter.control('CD', 'active' if level else 'inactive')
-        return level
+    try:
+        return _spy_classes[base]
+    except KeyError:
+        pass
+
+    class Serial(base):
+        """\
+        Wrap a port: the URL options select the output, all I/O is passed
+        to a SpyTap.
+        """
+        # pylint: disable=no-member
+
+        def __init__(self, *args, **kwargs):
+            self.formatter = None
+            self.show_all = False
+            self.spy_tap = None
+            super(Serial, self).__init__(*args, **kwargs)
+
+        @base.port.setter
+        def port(self, value):
+            if value is not None:
+                base.port.__set__(self, self.spy_from_url(value))
+
+        def spy_from_url(self, url):
+            """extract the wrapped port from an URL string, set up the tap"""
+            parts = urlparse.urlsplit(url)
+            if parts.scheme != 'spy':
+                raise serial.SerialException(
+                    'expected a string in the form '
+                    '"spy://port[?option[=value][&option[=value]]]": '
+                    'not starting with spy:// ({!r})'.format(parts.scheme))
+            port = ''.join([parts.netloc, parts.path])
+            # process options now, directly altering self
+            formatter = FormatHexdump
+            color = False
+            queued = False
+            output = sys.stderr
+            other_options = []
+            try:
+                for option, values in urlparse.parse_qs(parts.query, True).items():
+                    if option == 'file':
+                        output = open(values[0], 'w')
+                    elif option == 'color':
+                        color = True
+                    elif option == 'raw':
+                        formatter = FormatRaw
+                    elif option == 'rawlog':
+                        formatter = FormatLog
+                        output = values[0] if values[0] else 'serial'
+                    elif option == 'log':
+                        formatter = FormatLogHex
+                        output = values[0] if values[0] else 'serial'
+                    elif option == 'all':
+                        self.show_all = True
+                    elif option == 'queued':
+                        queued = True
+                    elif '://' in port:
+                        # an option of the wrapped URL
+                        other_options.extend((option, value) for value in values)
+                    else:
+                        raise ValueError('unknown option: {!r}'.format(option))
+            except ValueError as e:
+                raise serial.SerialException(
+                    'expected a string in the form '
+                    '"spy://port[?option[=value][&option[=value]]]": {}'.format(e))
+            if other_options:
+                port = '{}?{}'.format(port, '&'.join(
+                    '{}={}'.format(option, value) if value else option for option, value in other_options))
+            self.formatter = formatter(output, color)
+            if self.spy_tap is not None:
+                self.remove_tap(self.spy_tap)
+            self.spy_tap = self.add_tap(SpyTap(self.formatter, self.show_all), queued=queued)
+            return port
+
+        if not hasattr(base, 'from_url'):
+            from_url = spy_from_url    # name used before URLs could be wrapped
+
+        def close(self):
+            super(Serial, self).close()
+            if self.spy_tap is not None:
+                self.spy_tap.drain()
+
+        # reading the status lines is only shown for spy:// ports
+
+        @property
+        def in_waiting(self):
+            n = base.in_waiting.__get__(self)
+            if self.show_all:
+                self._emit_tap('control', ('in_waiting', n))
+            return n
+
+        @property
+        def cts(self):
+            level = base.cts.__get__(self)
+            self._emit_tap('control', ('cts', level))
+            return level
+
+        @property
+        def dsr(self):
+            level = base.dsr.__get__(self)
+            self._emit_tap('control', ('dsr', level))
+            return level
+
+        @property
+        def ri(self):
+            level = base.ri.__get__(self)
+            self._emit_tap('control', ('ri', level))
+            return level
+
+        @property
+        def cd(self):
+            level = base.cd.__get__(self)
+            self._emit_tap('control', ('cd', level))
+            return level
+
+    _spy_classes[base] = Serial
+    return Serial
+
+
+_spy_classes = {}
+
+# wrapping the native port
+Serial = spy_class(serial.Serial)
+
+
+def serial_class_for_url(url):
+    """Return the URL and a spy class for the implementation of the wrapped port"""
+    parts = urlparse.urlsplit(url)
+    port = ''.join([parts.netloc, parts.path])
+    if '://' in port:
+        return url, spy_class(serial._class_for_url(port)[1])
+    return url, Serial
+
 
 # - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 if __name__ == '__main__':
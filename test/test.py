@@ -189,6 +189,27 @@ class Test0_DataWires(unittest.TestCase):
         """Test RI"""
         self.assertTrue(not self.s.ri, "RI -> 0")
 
+    def test4_ModemStatus(self):
+        """Test reading all lines at once"""
+        self.s.rts = False
+        self.s.dtr = True
+        time.sleep(1.1)
+        status = self.s.modem_status()
+        self.assertEqual((status.cts, status.dsr, status.ri), (False, True, False))
+
+    def test5_WaitModemChange(self):
+        """Test waiting for line changes"""
+        self.s.rts = True
+        time.sleep(1.1)
+        self.assertEqual(self.s.wait_modem_change(['cts'], timeout=0.2), None)
+        timer = threading.Timer(0.2, setattr, args=(self.s, 'rts', False))
+        timer.start()
+        status = self.s.wait_modem_change(['cts'], timeout=3)
+        timer.join()
+        self.assertTrue(status is not None, "CTS change not detected")
+        self.assertFalse(status.cts)
+        self.assertRaises(ValueError, self.s.wait_modem_change, ['xyz'], 0)
+
 
 class Test_MoreTimeouts(unittest.TestCase):
     """Test with timeouts"""
@@ -28,22 +28,46 @@ else:
         """Test asyncio related functionality"""
 
         def setUp(self):
-            self.loop = asyncio.get_event_loop()
-            # create a closed serial port
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self.port = PORT
+            self.master = self.slave = None
+            if not os.path.exists(PORT):
+                # no hardware with a loop back connector available: use a
+                # pseudo terminal and echo everything on the master side.
+                # the slave is kept open, else the master reports a hang up
+                self.master, self.slave = os.openpty()
+                self.port = os.ttyname(self.slave)
+                os.set_blocking(self.master, False)
+                self.loop.add_reader(self.master, self._echo)
 
         def tearDown(self):
+            if self.master is not None:
+                self.loop.remove_reader(self.master)
+                os.close(self.master)
+                os.close(self.slave)
+            asyncio.set_event_loop(None)
             self.loop.close()
 
+        def _echo(self):
+            try:
+                os.write(self.master, os.read(self.master, 4096))
+            except OSError:
+                pass    # nothing to read or the echo would block
+
         def test_asyncio(self):
             TEXT = b'hello world\n'
             received = []
             actions = []
+            hardware = self.master is None
 
             class Output(asyncio.Protocol):
                 def connection_made(self, transport):
                     self.transport = transport
                     actions.append('open')
-                    transport.serial.rts = False
+                    if hardware:
+                        # control lines are not supported by pseudo terminals
+                        transport.serial.rts = False
                     transport.write(TEXT)
 
                 def data_received(self, data):
@@ -64,12 +88,69 @@ else:
                     actions.append('resume')
                     print(self.transport.get_write_buffer_size())
 
-            coro = serial.aio.create_serial_connection(self.loop, Output, PORT, baudrate=115200)
+            coro = serial.aio.create_serial_connection(self.loop, Output, self.port, baudrate=115200)
             self.loop.run_until_complete(coro)
             self.loop.run_forever()
             self.assertEqual(b''.join(received), TEXT)
             self.assertEqual(actions, ['open', 'close'])
 
+        def test_streams(self):
+            async def echo():
+                reader, writer = await serial.aio.open_serial_connection(url=self.port, baudrate=115200)
+                writer.write(b'hello\nworld\n')
+                lines = [await reader.readline(), await reader.readline()]
+                writer.close()
+                return lines
+            lines = self.loop.run_until_complete(asyncio.wait_for(echo(), 5))
+            self.assertEqual(lines, [b'hello\n', b'world\n'])
+
+        def test_read_ahead(self):
+            """data that read_until() read past the line is delivered"""
+            received = []
+
+            class Collect(asyncio.Protocol):
+                def data_received(self, data):
+                    received.append(data)
+
+            ser = serial.serial_for_url(self.port, timeout=1)
+            ser.write(b'hello\nworld')
+            self.loop.run_until_complete(asyncio.sleep(0.1))  # echo
+            self.assertEqual(ser.read_until(), b'hello\n')
+            transport = serial.aio.SerialTransport(self.loop, Collect(), ser)
+            self.loop.run_until_complete(asyncio.sleep(0.1))
+            transport.close()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.assertEqual(b''.join(received), b'world')
+
+        def test_flow_control(self):
+            actions = []
+
+            class Writer(asyncio.Protocol):
+                def connection_made(self, transport):
+                    transport.pause_reading()   # make the output back up
+                    transport.set_write_buffer_limits(high=4096, low=0)
+                    transport.write(b'x' * 1024 * 1024)
+                    actions.append(transport.get_write_buffer_size() > 0)
+
+                def pause_writing(self):
+                    actions.append('pause')
+
+                def resume_writing(self):
+                    actions.append('resume')
+
+                def connection_lost(self, exc):
+                    asyncio.get_event_loop().stop()
+
+            if self.master is not None:
+                self.loop.remove_reader(self.master)  # nobody takes the data
+            transport, protocol = self.loop.run_until_complete(
+                serial.aio.create_serial_connection(self.loop, Writer, self.port))
+            self.loop.run_until_complete(asyncio.sleep(0.1))
+            self.assertEqual(actions, ['pause', True])
+            transport.abort()
+            self.loop.run_forever()
+            self.assertIsNone(transport.serial.fd)
+
 
 if __name__ == '__main__':
     import sys
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+#
+# This file is part of pySerial - Cross platform serial port support for Python
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Test the benchmark runner serial.tools.bench with small transfers.
+"""
+
+import json
+import unittest
+from serial.tools import bench
+
+
+class Test_Bench(unittest.TestCase):
+    """Run the benchmarks on in-memory and network backends"""
+
+    def test_run(self):
+        results = bench.run(['loop://', 'socket://'], nbytes=4096)
+        # the results can be saved as JSON
+        results = json.loads(json.dumps(results))
+        self.assertEqual(results['bytes'], 4096)
+        errors = [result for result in results['results'] if 'error' in result]
+        self.assertEqual(errors, [])
+        names = [(result['backend'], result['benchmark'], result.get('read_size'))
+                 for result in results['results']]
+        self.assertEqual(names[:len(bench.READ_SIZES)],
+                         [('loop://', 'read', size) for size in bench.READ_SIZES])
+        self.assertTrue(('socket://', 'Packetizer', None) in names)
+        for result in results['results']:
+            if result['benchmark'] == 'latency':
+                self.assertTrue(0 < result['latency_us']['p50'] <= result['latency_us']['max'])
+            else:
+                self.assertTrue(result['bytes_per_second'] > 0)
+            if result['backend'] == 'socket://' and result['benchmark'] == 'read':
+                self.assertTrue(result['syscalls_per_byte'] > 0)
+        # unchanged results
+        rows = bench.compare(results, results)
+        self.assertEqual(len(rows), len(names))
+        self.assertTrue(all(ratio == 1 for name, before, after, ratio in rows))
+
+    def test_error(self):
+        results = bench.run(['rfc2217://'], ['latency'], nbytes=64)
+        self.assertEqual([result.get('error') for result in results['results']], [None])
+
+        def fail(connection, nbytes):
+            raise bench.BenchmarkError('test')
+            yield
+        bench.BENCHMARKS['fail'] = fail
+        try:
+            results = bench.run(['loop://'], ['fail'])
+        finally:
+            del bench.BENCHMARKS['fail']
+        self.assertEqual(results['results'][0]['error'], 'BenchmarkError: test')
+
+
+if __name__ == '__main__':
+    import sys
+    sys.stdout.write(__doc__)
+    sys.argv[1:] = ['-v']
+    # When this module is executed from the command-line, it runs all its tests
+    unittest.main()
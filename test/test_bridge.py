@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#
+# This file is part of pySerial - Cross platform serial port support for Python
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Test serial.tools.bridge with pseudo terminals and socket pairs.
+"""
+
+import os
+import socket
+import threading
+import time
+import unittest
+
+import serial
+import serial.rfc2217
+import serial.tools.bridge
+
+
+def read_exactly(read, size, timeout=2):
+    """call read(n) until size bytes were read"""
+    data = bytearray()
+    deadline = time.time() + timeout
+    while len(data) < size and time.time() < deadline:
+        try:
+            data += read(size - len(data))
+        except (BlockingIOError, socket.timeout):
+            time.sleep(0.01)
+    return bytes(data)
+
+
+@unittest.skipIf(serial.tools.bridge.selectors is None or os.name != 'posix', 'requires selectors and pseudo terminals')
+class Test_Bridge(unittest.TestCase):
+    """Forward data between a pty and a socket"""
+
+    def setUp(self):
+        self.master, self.slave = os.openpty()
+        self.serial = serial.Serial(os.ttyname(self.slave), timeout=0)
+        self.hub = serial.tools.bridge.BridgeHub()
+        self.thread = threading.Thread(target=self.hub.serve_forever)
+        self.thread.start()
+        self.closed = threading.Event()
+        self.local, self.remote = socket.socketpair()
+        self.remote.settimeout(2)
+
+    def tearDown(self):
+        self.hub.stop()
+        self.thread.join(2)
+        self.serial.close()
+        self.remote.close()
+        os.close(self.master)
+        os.close(self.slave)
+
+    def _on_close(self, bridge, error):
+        self.error = error
+        self.closed.set()
+
+    def test_raw(self):
+        bridge = self.hub.add(self.serial, self.local, on_close=self._on_close)
+        data = bytes(bytearray(range(256))) * 200
+        os.write(self.master, data[:1000])
+        self.assertEqual(read_exactly(self.remote.recv, 1000), data[:1000])
+        writer = threading.Thread(target=self.remote.sendall, args=(data,))
+        writer.start()
+        self.assertEqual(read_exactly(lambda n: os.read(self.master, n), len(data)), data)
+        writer.join()
+        # the remote end closes the connection
+        self.remote.close()
+        self.assertTrue(self.closed.wait(2))
+        self.assertIsNone(self.error)
+        self.assertEqual(bridge.stats, (1000, len(data)))
+        self.assertEqual(self.hub.bridges, [])
+        self.assertTrue(self.serial.is_open)
+
+    def test_read_ahead(self):
+        """data that read_until() read past the line is forwarded first"""
+        os.write(self.master, b'hello\nworld')
+        self.serial.timeout = 1
+        self.assertEqual(self.serial.read_until(), b'hello\n')
+        self.serial.timeout = 0
+        self.hub.add(self.serial, self.local)
+        os.write(self.master, b'!')
+        self.assertEqual(read_exactly(self.remote.recv, 6), b'world!')
+
+    def test_rfc2217(self):
+        self.hub.add(self.serial, self.local, rfc2217=True)
+        # the port manager starts with the Telnet negotiation
+        self.assertTrue(self.remote.recv(1024).startswith(serial.rfc2217.IAC))
+        os.write(self.master, b'a\xffb')
+        self.assertEqual(read_exactly(self.remote.recv, 4), b'a\xff\xffb')
+        self.remote.sendall(b'c\xff\xffd')
+        self.assertEqual(read_exactly(lambda n: os.read(self.master, n), 3), b'c\xffd')
+
+    def test_filter_bytes(self):
+        """block wise filter gives the same result as the byte wise one"""
+        class Connection(object):
+            def write(self, data):
+                pass
+
+        data = b'abc\xff\xffdef\xff\xfa\x2c\x01\x00\x00\x4b\x00\xff\xf0ghi'
+        results = []
+        for byte_wise in (True, False):
+            manager = serial.rfc2217.PortManager(serial.serial_for_url('loop://'), Connection())
+            if byte_wise:
+                output = b''.join(manager.filter(data[:5])) + b''.join(manager.filter(data[5:]))
+            else:
+                output = manager.filter_bytes(data[:5]) + manager.filter_bytes(data[5:])
+            results.append(output)
+            self.assertEqual(manager.serial.baudrate, 19200)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(results[1], b'abc\xffdefghi')
+
+
+if __name__ == '__main__':
+    import sys
+    sys.stdout.write(__doc__)
+    sys.argv[1:] = ['-v']
+    # When this module is executed from the command-line, it runs all its tests
+    unittest.main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+#
+# This file is part of pySerial - Cross platform serial port support for Python
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Tests for the I/O taps and the spy:// handler that uses them.
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+import serial
+import serial.hooks
+
+
+class Test_Taps(unittest.TestCase):
+    """Test taps on loop://"""
+
+    def setUp(self):
+        self.s = serial.serial_for_url('loop://', timeout=0.05)
+        self.events = []
+
+    def tearDown(self):
+        self.s.close()
+
+    def record(self, event, data, timestamp):
+        self.events.append((event, data))
+
+    def test_events(self):
+        self.s.add_tap(self.record)
+        self.s.rts = False
+        self.s.write(b'hello')
+        buf = bytearray(3)
+        self.assertEqual(self.s.readinto(buf), 3)
+        self.assertEqual(self.s.read(5), b'lo')
+        self.s.baudrate = 19200
+        self.s.cancel_read()
+        self.s.flush()
+        self.assertEqual(self.events[:4], [
+            ('control', ('rts', False)),
+            ('tx', b'hello'),
+            ('rx', b'hel'),
+            ('rx', b'lo')])
+        self.assertEqual(self.events[4][0], 'reconfigure')
+        self.assertEqual(self.events[4][1]['baudrate'], 19200)
+        self.assertEqual(self.events[5:], [('cancel', 'read'), ('control', ('flush', None))])
+
+    def test_event_filter(self):
+        tap = self.s.add_tap(self.record, events=['tx'])
+        self.assertTrue(isinstance(tap, serial.hooks.Tap))
+        self.s.write(b'x')
+        self.s.read(1)
+        self.assertEqual(self.events, [('tx', b'x')])
+        self.assertRaises(ValueError, self.s.add_tap, self.record, ['bogus'])
+
+    def test_read_until(self):
+        self.s.add_tap(self.record, events=['rx'])
+        stats = self.s.enable_stats()
+        self.s.write(b'a\nb\nc\n')
+        self.assertEqual(self.s.read_until(), b'a\n')
+        self.assertEqual(self.s.read_until(), b'b\n')
+        self.assertEqual(self.s.expect([b'c'])[2], b'c')
+        self.assertEqual(self.s.read(1), b'\n')
+        # the data kept after the end of the line is reported once
+        self.assertEqual(self.events, [('rx', b'a\n'), ('rx', b'b\n'), ('rx', b'c'), ('rx', b'\n')])
+        self.assertEqual((stats.read_calls, stats.read_bytes), (4, 6))
+
+    def test_send_file(self):
+        self.s.add_tap(self.record, events=['tx', 'control'])
+        with tempfile.TemporaryFile() as f:
+            f.write(b'hello')
+            self.assertEqual(self.s.send_file(f), 5)
+        self.assertEqual(self.events, [('tx', b'hello'), ('control', ('flush', None)),
+                                       ('control', ('send_file', 5))])
+
+    def test_remove(self):
+        tap = self.s.add_tap(self.record)
+        self.assertTrue('read' in self.s.__dict__)
+        self.s.remove_tap(tap)
+        self.assertFalse('read' in self.s.__dict__)
+        self.s.write(b'x')
+        self.assertEqual(self.events, [])
+        # statistics keep the wrappers installed
+        self.s.enable_stats()
+        tap = self.s.add_tap(self.record)
+        self.s.remove_tap(tap)
+        self.assertEqual(self.s.read(1), b'x')
+        self.assertEqual(self.s.stats.read_bytes, 1)
+
+    def test_queued(self):
+        thread_names = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow(event, data, timestamp):
+            started.set()
+            release.wait(1)
+            thread_names.append(threading.current_thread().name)
+            self.record(event, data, timestamp)
+        tap = self.s.add_tap(slow, events=['tx'], queued=True)
+        tap.max_queue = 2
+        self.s.write(b'a')
+        self.assertTrue(started.wait(1))
+        for data in (b'b', b'c', b'd'):
+            self.s.write(data)
+        self.assertFalse(tap.drain(0.01))  # the consumer is blocked, I/O is not
+        release.set()
+        self.assertTrue(tap.drain(1))
+        self.s.remove_tap(tap)
+        # the first event was taken by the consumer, two queued, one dropped
+        self.assertEqual(self.events, [('tx', b'a'), ('tx', b'b'), ('tx', b'c')])
+        self.assertEqual(tap.dropped, 1)
+        self.assertEqual(set(thread_names), set(['serial-tap']))
+
+
+class Test_Spy(unittest.TestCase):
+    """Test the spy:// handler"""
+
+    def test_wrap_url(self):
+        fd, name = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            with serial.serial_for_url('spy://loop://?file={}&queued'.format(name), timeout=0.05) as s:
+                self.assertTrue(isinstance(s, serial.urlhandler.protocol_loop.Serial))
+                s.dtr = False
+                s.write(b'hello')
+                self.assertEqual(s.read(5), b'hello')
+                s.send_break(0)
+            with open(name) as f:
+                lines = [line.split(None, 1)[1].rstrip() for line in f]
+        finally:
+            os.remove(name)
+        self.assertTrue('DTR  inactive' in lines)
+        self.assertTrue('BRK  send_break 0s' in lines)
+        tx = [line for line in lines if line.startswith('TX')]
+        rx = [line for line in lines if line.startswith('RX')]
+        self.assertEqual(len(tx), 1)
+        self.assertTrue(tx[0].endswith('hello'))
+        self.assertEqual(tx[0][2:], rx[0][2:])
+
+    def test_options(self):
+        s = serial.serial_for_url('spy://loop://?logging=debug&raw', do_not_open=True)
+        self.assertEqual(s.port, 'loop://?logging=debug')
+        self.assertRaises(serial.SerialException, serial.serial_for_url, 'spy:///dev/null?bogus', do_not_open=True)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.stdout.write(__doc__)
+    sys.argv[1:] = ['-v']
+    # When this module is executed from the command-line, it runs all its tests
+    unittest.main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+#
+# This file is part of pySerial - Cross platform serial port support for Python
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Tests for the loop:// URL handler and its ring buffer.
+"""
+
+import tempfile
+import threading
+import time
+import unittest
+import serial
+from serial.urlhandler.protocol_loop import RingBuffer
+
+
+class Test_RingBuffer(unittest.TestCase):
+    """Test the bounded FIFO"""
+
+    def test_wrap_around(self):
+        ring = RingBuffer(8)
+        out = bytearray(8)
+        self.assertEqual(ring.put(memoryview(b'abcdef')), 6)
+        self.assertEqual(ring.get_into(memoryview(out)[:4]), 4)
+        self.assertEqual(out[:4], b'abcd')
+        # wraps around the end of the storage, only what fits is taken
+        self.assertEqual(ring.put(memoryview(b'ghijklmn')), 6)
+        self.assertEqual((len(ring), ring.free), (8, 0))
+        self.assertEqual(ring.get_into(memoryview(out)), 8)
+        self.assertEqual(out, b'efghijkl')
+        self.assertEqual(len(ring), 0)
+        ring.clear()
+        self.assertEqual(ring.free, 8)
+
+    def test_discard_truncate(self):
+        ring = RingBuffer(8)
+        out = bytearray(8)
+        ring.put(memoryview(b'abcdef'))
+        ring.discard(2)
+        ring.truncate(3)
+        self.assertEqual(ring.get_into(memoryview(out)), 3)
+        self.assertEqual(out[:3], b'cde')
+
+
+class Test_Loop(unittest.TestCase):
+    """Test loop:// data transfer"""
+
+    def setUp(self):
+        self.s = serial.serial_for_url('loop://', timeout=1)
+
+    def tearDown(self):
+        self.s.close()
+
+    def test_bulk(self):
+        data = bytes(bytearray(range(256))) * 1000
+        received = bytearray()
+
+        def reader():
+            buf = bytearray(10000)
+            while len(received) < len(data):
+                n = self.s.readinto(buf)
+                if not n:
+                    break
+                received.extend(buf[:n])
+        thread = threading.Thread(target=reader)
+        thread.start()
+        self.assertEqual(self.s.write(data), len(data))
+        thread.join(5)
+        self.assertEqual(bytes(received), data)
+
+    def test_counts(self):
+        self.s.write(b'hello')
+        self.assertEqual((self.s.in_waiting, self.s.out_waiting), (5, 5))
+        self.assertEqual(self.s.read(2), b'he')
+        self.assertEqual(self.s.in_waiting, 3)
+        self.s.reset_input_buffer()
+        self.assertEqual(self.s.in_waiting, 0)
+
+    def test_buffer_full(self):
+        self.s.write_timeout = 0
+        # non-blocking writes take what fits into the buffer
+        self.assertEqual(self.s.write(b'x' * 5000), self.s.buffer_size)
+        self.assertEqual(self.s.write(b'x'), 0)
+        self.s.write_timeout = 0.05
+        self.assertRaises(serial.SerialTimeoutException, self.s.write, b'x')
+        self.assertEqual(len(self.s.read(5000)), self.s.buffer_size)
+
+    def test_send_file_short_write(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(b'x' * 100000)
+            self.s.write_timeout = 0
+            # what does not fit is not reported as sent
+            self.assertRaises(serial.SerialTimeoutException, self.s.send_file, f)
+            self.assertEqual(self.s.in_waiting, self.s.buffer_size)
+            self.s.reset_input_buffer()
+            self.s.write_timeout = None
+            reader = threading.Thread(target=self.s.read, args=(6000,))
+            reader.start()
+            self.assertEqual(self.s.send_file(f, count=6000), 6000)
+            reader.join()
+
+    def test_cancel_read(self):
+        self.s.timeout = None
+        timer = threading.Timer(0.1, self.s.cancel_read)
+        timer.start()
+        self.assertEqual(self.s.read(10), b'')
+        timer.join()
+        self.s.write(b'abc')
+        self.assertEqual(self.s.read(3), b'abc')
+
+
+class Test_LoopPace(unittest.TestCase):
+    """Test loop:// with the data rate of the baud rate"""
+
+    def setUp(self):
+        # 9600 baud 8N1: 960 bytes per second
+        self.s = serial.serial_for_url('loop://?pace=1', baudrate=9600, timeout=1)
+
+    def tearDown(self):
+        self.s.close()
+
+    def test_rate(self):
+        start = time.time()
+        self.s.write(b'x' * 96)
+        self.assertEqual(self.s.read(96), b'x' * 96)
+        duration = time.time() - start
+        self.assertTrue(0.09 < duration < 0.3, duration)
+
+    def test_flush(self):
+        self.s.write(b'x' * 96)
+        self.assertEqual(self.s.in_waiting, 0)
+        first = self.s.out_waiting
+        self.assertTrue(first > 90, first)
+        time.sleep(0.03)
+        self.assertTrue(self.s.out_waiting < first)
+        start = time.time()
+        self.s.flush()
+        self.assertTrue(time.time() - start > 0.04)
+        self.assertEqual((self.s.in_waiting, self.s.out_waiting), (96, 0))
+
+    def test_reset(self):
+        self.s.write(b'x' * 96)
+        time.sleep(0.03)
+        self.s.reset_output_buffer()
+        self.assertEqual(self.s.out_waiting, 0)
+        n = self.s.in_waiting
+        self.assertTrue(10 < n < 96, n)
+        self.assertEqual(len(self.s.read(96)), n)
+
+    def test_off(self):
+        s = serial.serial_for_url('loop://?pace=0', baudrate=300)
+        s.write(b'hello')
+        self.assertEqual(s.in_waiting, 5)
+        s.close()
+        self.assertRaises(serial.SerialException, serial.serial_for_url, 'loop://?bogus=1')
+
+
+if __name__ == '__main__':
+    import sys
+    sys.stdout.write(__doc__)
+    sys.argv[1:] = ['-v']
+    # When this module is executed from the command-line, it runs all its tests
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+# This file is part of pySerial - Cross platform serial port support for Python
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Tests for the pair:// URL handler.
+"""
+
+import threading
+import time
+import unittest
+import serial
+import serial.urlhandler.protocol_pair
+
+
+class Test_Pair(unittest.TestCase):
+    """Test a connection between two pair:// ports"""
+
+    def setUp(self):
+        self.a = serial.serial_for_url('pair://test/a', timeout=1)
+        self.b = serial.serial_for_url('pair://test/b', timeout=1)
+
+    def tearDown(self):
+        self.a.close()
+        self.b.close()
+
+    def test_data(self):
+        self.a.write(b'hello')
+        self.b.write(b'world')
+        self.assertEqual(self.a.out_waiting, 5)
+        self.assertEqual(self.b.in_waiting, 5)
+        self.assertEqual(self.b.read(5), b'hello')
+        self.assertEqual(self.a.read(5), b'world')
+        self.assertEqual(self.a.in_waiting, 0)
+
+    def test_bulk(self):
+        data = bytes(bytearray(range(256))) * 1000
+        writer = threading.Thread(target=self.a.write, args=(data,))
+        writer.start()
+        received = bytearray()
+        while len(received) < len(data):
+            chunk = self.b.read(10000)
+            if not chunk:
+                break
+            received += chunk
+        writer.join(5)
+        self.assertEqual(bytes(received), data)
+
+    def test_lines(self):
+        self.a.rts = False
+        self.a.dtr = True
+        self.assertEqual((self.b.cts, self.b.dsr, self.b.cd, self.b.ri), (False, True, True, False))
+        self.b.rts = True
+        self.assertTrue(self.a.cts)
+        self.b.close()
+        self.assertFalse(self.a.cts)
+        self.assertFalse(self.a.dsr)
+
+    def test_busy(self):
+        self.assertRaises(serial.SerialException, serial.serial_for_url, 'pair://test/a')
+        self.assertRaises(serial.SerialException, serial.serial_for_url, 'pair://test/c')
+        # other names are independent
+        with serial.serial_for_url('pair://other/a', timeout=0) as c:
+            self.a.write(b'x')
+            self.assertEqual(c.read(1), b'')
+
+    def test_failed_open(self):
+        self.assertRaises(ValueError, serial.serial_for_url, 'pair://failed/a', baudrate=0)
+        # the end was released
+        with serial.serial_for_url('pair://failed/a', timeout=0) as c:
+            self.assertTrue(c.is_open)
+        self.assertFalse('failed' in serial.urlhandler.protocol_pair._links)
+
+    def test_pace(self):
+        self.a.close()
+        # 9600 baud 8N1: 960 bytes per second
+        self.a = serial.serial_for_url('pair://test/a?pace=1', baudrate=9600, timeout=1)
+        start = time.time()
+        self.a.write(b'x' * 96)
+        self.assertTrue(self.a.out_waiting > 0)
+        self.assertEqual(self.b.read(96), b'x' * 96)
+        self.assertTrue(time.time() - start > 0.09)
+        # the other direction is not paced
+        self.b.write(b'y' * 96)
+        self.assertEqual(self.a.in_waiting, 96)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.stdout.write(__doc__)
+    sys.argv[1:] = ['-v']
+    # When this module is executed from the command-line, it runs all its tests
+    unittest.main()
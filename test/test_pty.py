@@ -8,8 +8,13 @@
 Test PTY related functionality.
 """
 
+import io
 import os
 import sys
+import tempfile
+import termios
+import threading
+import time
 
 try:
     import pty
@@ -17,9 +22,14 @@ except ImportError:
     pty = None
 import unittest
 import serial
+import serial.threaded
 
 DATA = b'Hello\n'
 
+SERIAL_CLASSES = (serial.Serial, serial.PosixPollSerial)
+if hasattr(serial, 'EpollSerial'):
+    SERIAL_CLASSES += (serial.EpollSerial,)
+
 @unittest.skipIf(pty is None, "pty module not supported on platform")
 class Test_Pty_Serial_Open(unittest.TestCase):
     """Test PTY serial open"""
@@ -48,6 +58,339 @@ class Test_Pty_Serial_Open(unittest.TestCase):
                 out = fd.read(len(DATA))
                 self.assertEqual(DATA, out)
 
+    def test_pty_serial_readinto(self):
+        for cls in SERIAL_CLASSES + (serial.VTIMESerial,):
+            with cls(os.ttyname(self.slave), timeout=1) as slave:
+                os.write(self.master, DATA)
+                buf = bytearray(len(DATA))
+                self.assertEqual(slave.readinto(buf), len(DATA))
+                self.assertEqual(buf, DATA)
+                # partial fill into a slice of a larger buffer
+                os.write(self.master, DATA)
+                buf = bytearray(10)
+                self.assertEqual(slave.readinto(memoryview(buf)[2:2 + len(DATA)]), len(DATA))
+                self.assertEqual(bytes(buf[2:2 + len(DATA)]), DATA)
+
+    def test_pty_serial_read_timestamped(self):
+        for cls in SERIAL_CLASSES + (serial.VTIMESerial,):
+            with cls(os.ttyname(self.slave), timeout=1) as slave:
+                before = time.monotonic()
+                os.write(self.master, b'abc')
+                timer = threading.Timer(0.1, os.write, (self.master, b'def'))
+                timer.start()
+                chunks = []
+                data, timestamp = slave.read_timestamped(6, chunks)
+                timer.join()
+                self.assertEqual(data, b'abcdef')
+                self.assertTrue(before * 1e9 <= timestamp <= time.monotonic_ns())
+                self.assertEqual(timestamp, chunks[0][1])
+                self.assertEqual([offset for offset, _ in chunks], [0, 3])
+                self.assertGreater(chunks[1][1] - chunks[0][1], 0.05e9)
+                # nothing read, no timestamp
+                slave.timeout = 0
+                self.assertEqual(slave.readinto_timestamped(bytearray(1)), (0, None))
+
+    def test_pty_serial_read_timestamped_tap(self):
+        """taps get the arrival time, not the time the call returned"""
+        events = []
+        with serial.Serial(os.ttyname(self.slave), timeout=1) as slave:
+            slave.add_tap(lambda event, data, timestamp: events.append((data, timestamp)), events=['rx'])
+            timer = threading.Timer(0.05, os.write, (self.master, b'abc'))
+            timer.start()
+            # waits for the timeout after the data arrived
+            data, timestamp = slave.read_timestamped(10)
+            timer.join()
+            os.write(self.master, b'def')
+            buf = bytearray(3)
+            n, timestamp2 = slave.readinto_timestamped(buf)
+        self.assertEqual(events, [(b'abc', timestamp), (b'def', timestamp2)])
+
+    def test_pty_serial_read_frame(self):
+        for cls in SERIAL_CLASSES + (serial.VTIMESerial,):
+            with cls(os.ttyname(self.slave), baudrate=19200, timeout=1) as slave:
+                self.assertAlmostEqual(slave.character_time, 10 / 19200.0)
+                os.write(self.master, b'\x01\x03\x00')
+                timers = [threading.Timer(0.01, os.write, (self.master, b'\x00\x00\x01')),
+                          threading.Timer(0.2, os.write, (self.master, b'\x02\x03'))]
+                for timer in timers:
+                    timer.start()
+                self.assertEqual(slave.read_frame(gap=0.1), b'\x01\x03\x00\x00\x00\x01')
+                self.assertEqual(slave.read_frame(), b'\x02\x03')
+                for timer in timers:
+                    timer.join()
+                slave.timeout = 0.05
+                self.assertEqual(slave.read_frame(), b'')
+
+    def test_pty_frame_reader(self):
+        frames = []
+
+        class Frames(serial.threaded.FrameReader):
+            def handle_frame(self, frame):
+                frames.append(frame)
+
+        with serial.Serial(os.ttyname(self.slave), baudrate=19200) as slave:
+            with serial.threaded.ReaderThread(slave, Frames) as protocol:
+                self.assertAlmostEqual(protocol.frame_gap, 3.5 * 10 / 19200.0)
+                os.write(self.master, b'\x01\x03')
+                time.sleep(0.1)
+                os.write(self.master, b'\x02\x03')
+                time.sleep(0.1)
+        self.assertEqual(frames, [b'\x01\x03', b'\x02\x03'])
+
+    def test_pty_serial_send_file(self):
+        content = bytes(bytearray(range(256))) * 1024
+        with tempfile.TemporaryFile() as f:
+            f.write(content)
+            f.flush()
+            for send_file in (serial.Serial.send_file, serial.serialutil.SerialBase.send_file):
+                with serial.Serial(os.ttyname(self.slave), timeout=1) as slave:
+                    received = bytearray()
+                    reader = threading.Thread(target=self._read_master, args=(received, 200000))
+                    reader.start()
+                    reports = []
+                    sent = send_file(slave, f, 1000, 200000, lambda *args: reports.append(args))
+                    reader.join()
+                    self.assertEqual(sent, 200000)
+                    self.assertEqual(received, content[1000:201000])
+                    self.assertEqual(f.tell(), 201000)
+                    self.assertEqual(reports[-1][:2], (200000, 200000))
+                    self.assertTrue(all(rate >= 0 for _, _, rate in reports))
+                    # up to the end of the file
+                    reader = threading.Thread(target=self._read_master, args=(received, 10))
+                    reader.start()
+                    self.assertEqual(send_file(slave, f, len(content) - 10), 10)
+                    reader.join()
+
+    def test_pty_serial_send_file_tap(self):
+        """taps see the data, os.sendfile() bypasses write()"""
+        sent = []
+        with tempfile.TemporaryFile() as f:
+            f.write(DATA)
+            with serial.Serial(os.ttyname(self.slave), timeout=1) as slave:
+                slave.add_tap(lambda event, data, timestamp: sent.append(data), events=['tx'])
+                self.assertEqual(slave.send_file(f), len(DATA))
+                self.assertEqual(os.read(self.master, 100), DATA)
+        self.assertEqual(b''.join(sent), DATA)
+
+    def test_pty_serial_send_file_tap_full(self):
+        """data the port does not take is not reported as sent"""
+        with tempfile.TemporaryFile() as f:
+            f.write(b'x' * 1000000)
+            with serial.Serial(os.ttyname(self.slave), write_timeout=0) as slave:
+                slave.add_tap(lambda event, data, timestamp: None)
+                self.assertRaises(serial.SerialTimeoutException, slave.send_file, f)
+
+    def _read_master(self, received, size):
+        del received[:]
+        while len(received) < size:
+            received.extend(os.read(self.master, size - len(received)))
+
+    def test_pty_serial_readinto_timeout(self):
+        with serial.Serial(os.ttyname(self.slave), timeout=0.1) as slave:
+            os.write(self.master, b'abc')
+            buf = bytearray(10)
+            self.assertEqual(slave.readinto(buf), 3)
+            self.assertEqual(buf[:3], b'abc')
+
+    def test_pty_serial_buffered_reader(self):
+        with serial.Serial(os.ttyname(self.slave), timeout=1) as slave:
+            os.write(self.master, DATA)
+            reader = io.BufferedReader(slave)
+            self.assertEqual(reader.readline(), DATA)
+
+    def test_pty_serial_read_until(self):
+        for cls in SERIAL_CLASSES:
+            with cls(os.ttyname(self.slave), timeout=1) as slave:
+                os.write(self.master, b'$GPGGA,1*00\r\n$GPRMC,2*00\r\n')
+                self.assertEqual(slave.read_until(b'\r\n'), b'$GPGGA,1*00\r\n')
+                self.assertEqual(slave.readline(), b'$GPRMC,2*00\r\n')
+                self.assertEqual(slave.in_waiting, 0)
+
+    def test_pty_serial_reconfigure(self):
+        calls = []
+        tcsetattr = termios.tcsetattr
+        tcgetattr = termios.tcgetattr
+
+        def counting_tcsetattr(*args):
+            calls.append('set')
+            return tcsetattr(*args)
+
+        def counting_tcgetattr(*args):
+            calls.append('get')
+            return tcgetattr(*args)
+        with serial.Serial(os.ttyname(self.slave), timeout=1) as slave:
+            termios.tcsetattr = counting_tcsetattr
+            termios.tcgetattr = counting_tcgetattr
+            try:
+                slave.stopbits = serial.STOPBITS_TWO
+                self.assertEqual(calls, ['set'])
+                slave.timeout = 2     # no change in termios state
+                self.assertEqual(calls, ['set'])
+            finally:
+                termios.tcsetattr = tcsetattr
+                termios.tcgetattr = tcgetattr
+            self.assertTrue(tcgetattr(slave.fd)[2] & termios.CSTOPB)
+
+    def test_pty_serial_resync_settings(self):
+        with serial.Serial(os.ttyname(self.slave), timeout=1) as slave:
+            # changed behind the back of the instance, e.g. by stty
+            attr = termios.tcgetattr(self.slave)
+            attr[2] |= termios.CSTOPB
+            attr[3] |= termios.ECHO
+            termios.tcsetattr(self.slave, termios.TCSANOW, attr)
+            slave.timeout = 2     # cached state, port is not touched
+            self.assertTrue(termios.tcgetattr(slave.fd)[2] & termios.CSTOPB)
+            slave.resync_settings()
+            attr = termios.tcgetattr(slave.fd)
+            self.assertFalse(attr[2] & termios.CSTOPB)
+            self.assertFalse(attr[3] & termios.ECHO)
+        self.assertRaises(serial.PortNotOpenError, slave.resync_settings)
+
+    def test_pty_vtime_serial_reconfigure(self):
+        with serial.VTIMESerial(os.ttyname(self.slave), timeout=0.5) as slave:
+            cc = termios.tcgetattr(slave.fd)[6]
+            self.assertEqual((cc[termios.VMIN], cc[termios.VTIME]), (0, 5))
+            slave.timeout = None
+            cc = termios.tcgetattr(slave.fd)[6]
+            self.assertEqual((cc[termios.VMIN], cc[termios.VTIME]), (1, 0))
+
+    def test_pty_serial_expect_timeout(self):
+        """the expect timeout changes the port timeout at most once"""
+        for cls, reconfigures in ((serial.Serial, 0), (serial.VTIMESerial, 2)):
+            with cls(os.ttyname(self.slave), timeout=None) as slave:
+                stats = slave.enable_stats()
+                timer = threading.Timer(0.1, os.write, (self.master, b'x'))
+                timer.start()
+                self.assertEqual(slave.expect([b'OK'], timeout=0.5), (None, None, b'x'))
+                timer.join()
+                self.assertEqual(stats.reconfigures, reconfigures)
+                self.assertEqual(slave.timeout, None)
+
+    def test_pty_serial_line_counters(self):
+        with serial.Serial(os.ttyname(self.slave), timeout=1) as slave:
+            counters = slave.line_counters()
+            if counters is None:
+                return  # not supported by pty driver, that is OK too
+            self.assertEqual(counters._fields[:6], ('cts', 'dsr', 'ri', 'cd', 'rx', 'tx'))
+            self.assertEqual(slave.line_counters(since=counters).frame, 0)
+
+    def test_pty_serial_wait_modem_change(self):
+        """TIOCMIWAIT in a helper thread, simulated as ptys have no modem lines"""
+        if serial.serialposix.TIOCMIWAIT is None:
+            self.skipTest('TIOCMIWAIT not available')
+        bits = [0]
+        changed = threading.Event()
+        fcntl = serial.serialposix.fcntl
+
+        class FakeFcntl(object):
+            def __getattr__(self, name):
+                return getattr(fcntl, name)
+
+            def ioctl(self, fd, request, *args):
+                if request == serial.serialposix.TIOCMIWAIT:
+                    os.fstat(fd)    # still open
+                    changed.wait()
+                    changed.clear()
+                    return 0
+                return fcntl.ioctl(fd, request, *args)
+
+        def change(value):
+            bits[0] = value
+            changed.set()
+        serial.serialposix.fcntl = FakeFcntl()
+        try:
+            with serial.Serial(os.ttyname(self.slave)) as slave:
+                slave._modem_bits = lambda: bits[0]
+                self.assertEqual(slave.wait_modem_change(['cts'], timeout=0.1), None)
+                waiter = slave._modem_waiter
+                # the helper thread has its own file descriptor
+                self.assertNotEqual(waiter.fd, slave.fd)
+                timer = threading.Timer(0.1, change, (serial.serialposix.TIOCM_CTS,))
+                timer.start()
+                status = slave.wait_modem_change(['cts'], timeout=2)
+                timer.join()
+                self.assertTrue(status.cts)
+                self.assertFalse(slave._modem_wait_unsupported)
+                # a wait pending on close ends with the next change
+                self.assertEqual(slave.wait_modem_change(['cts'], timeout=0.1), None)
+                waiter = slave._modem_waiter
+            self.assertTrue(waiter.is_alive())
+            change(0)
+            waiter.join(1)
+            self.assertFalse(waiter.is_alive())
+            self.assertRaises(OSError, os.fstat, waiter.fd)
+        finally:
+            serial.serialposix.fcntl = fcntl
+
+    def test_pty_serial_wait_modem_change_fallback(self):
+        """ptys reject TIOCMIWAIT, modem_status() is polled instead"""
+        if serial.serialposix.TIOCMIWAIT is None:
+            self.skipTest('TIOCMIWAIT not available')
+        bits = [0]
+        with serial.Serial(os.ttyname(self.slave)) as slave:
+            slave._modem_bits = lambda: bits[0]
+            timer = threading.Timer(0.2, bits.__setitem__, (0, serial.serialposix.TIOCM_DSR))
+            timer.start()
+            status = slave.wait_modem_change(['dsr'], timeout=2)
+            timer.join()
+            self.assertTrue(status.dsr)
+            self.assertTrue(slave._modem_wait_unsupported)
+            self.assertEqual(slave.wait_modem_change(['dsr'], timeout=0.1), None)
+
+    def test_pty_serial_cancel_read(self):
+        for cls in SERIAL_CLASSES:
+            with cls(os.ttyname(self.slave), timeout=None) as slave:
+                timer = threading.Timer(0.2, slave.cancel_read)
+                timer.start()
+                self.assertEqual(slave.read(10), b'')
+                timer.join()
+                # the port remains usable after the cancel
+                os.write(self.master, DATA)
+                self.assertEqual(slave.read(len(DATA)), DATA)
+
+    def test_pty_serial_cancel_fds(self):
+        """cancel works with eventfds and with the pipe fallback"""
+        eventfd = getattr(os, 'eventfd', None)
+        try:
+            for use_eventfd in ((False, True) if eventfd else (False,)):
+                if not use_eventfd and eventfd:
+                    del os.eventfd
+                elif eventfd:
+                    os.eventfd = eventfd
+                with serial.Serial(os.ttyname(self.slave), timeout=None) as slave:
+                    self.assertEqual(slave.pipe_abort_read_r == slave.pipe_abort_read_w, use_eventfd)
+                    slave.cancel_read()
+                    self.assertEqual(slave.read(1), b'')
+                    os.write(self.master, DATA)
+                    self.assertEqual(slave.read(len(DATA)), DATA)
+                    fds = (slave.pipe_abort_read_r, slave.pipe_abort_write_w)
+                for fd in fds:
+                    self.assertRaises(OSError, os.fstat, fd)
+        finally:
+            if eventfd:
+                os.eventfd = eventfd
+
+    def test_pty_serial_write_vectored(self):
+        with serial.Serial(os.ttyname(self.slave), timeout=1) as slave:
+            self.assertEqual(slave.write_vectored([b'He', bytearray(b'llo'), memoryview(b'\n')]), len(DATA))
+            slave.flush()
+            self.assertEqual(os.read(self.master, 100), DATA)
+
+    def test_pty_serial_write_large(self):
+        data = bytes(bytearray(range(256))) * 1024
+        for cls in SERIAL_CLASSES:
+            with cls(os.ttyname(self.slave), timeout=1, write_timeout=5) as slave:
+                received = bytearray()
+
+                def reader():
+                    while len(received) < len(data):
+                        received.extend(os.read(self.master, 65536))
+                thread = threading.Thread(target=reader)
+                thread.start()
+                self.assertEqual(slave.write(data), len(data))
+                thread.join(5)
+                self.assertEqual(bytes(received), data)
+
 if __name__ == '__main__':
     sys.stdout.write(__doc__)
     # When this module is executed from the command-line, it runs all its tests
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+#
+# This file is part of pySerial - Cross platform serial port support for Python
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Test the connected pseudo terminals of serial.tools.pty_pair.
+"""
+
+import threading
+import time
+import unittest
+import serial
+import serial.tools
+
+try:
+    from serial.tools import pty_pair
+except ImportError:
+    pty_pair = None
+
+
+@unittest.skipIf(pty_pair is None or pty_pair.selectors is None, "ptys not supported on platform")
+class Test_PtyPair(unittest.TestCase):
+    """Test data transfer between the two ports"""
+
+    def test_transfer(self):
+        with serial.tools.virtual_pair() as (port_a, port_b):
+            with serial.Serial(port_a, timeout=1) as a, serial.Serial(port_b, timeout=1) as b:
+                a.write(b'hello')
+                self.assertEqual(b.read(5), b'hello')
+                b.write(b'world')
+                self.assertEqual(a.read(5), b'world')
+                # more than fits into the pty buffers
+                data = bytes(bytearray(range(256))) * 1024
+                writer = threading.Thread(target=a.write, args=(data,))
+                writer.start()
+                self.assertEqual(b.read(len(data)), data)
+                writer.join()
+
+    def test_pace(self):
+        pair = pty_pair.PtyPair(pace=True)
+        pair.start()
+        try:
+            with serial.Serial(pair.ports[0], baudrate=9600, timeout=1) as a:
+                with serial.Serial(pair.ports[1], timeout=1) as b:
+                    # 9600 baud 8N1: 960 bytes per second
+                    start = time.time()
+                    a.write(b'x' * 96)
+                    self.assertEqual(b.read(96), b'x' * 96)
+                    self.assertTrue(time.time() - start > 0.09)
+        finally:
+            pair.close()
+        self.assertEqual(pair.bytes_forwarded, (96, 0))
+
+    def test_character_time(self):
+        with serial.tools.virtual_pair() as (port_a, port_b):
+            with serial.Serial(port_a, baudrate=19200, stopbits=serial.STOPBITS_TWO) as a:
+                self.assertAlmostEqual(pty_pair.character_time(a.fd), 11 / 19200.0)
+
+
+if __name__ == '__main__':
+    import sys
+    sys.stdout.write(__doc__)
+    sys.argv[1:] = ['-v']
+    # When this module is executed from the command-line, it runs all its tests
+    unittest.main()
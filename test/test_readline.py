@@ -21,6 +21,8 @@ Shortcut these pin pairs:
 On a 9 pole DSUB these are the pins (2-3) (4-6) (7-8)
 """
 
+import threading
+import time
 import unittest
 import sys
 import serial
@@ -92,6 +94,94 @@ class Test_Readline(unittest.TestCase):
                     self.s.readline(eol=serial.to_bytes("\r\n")),
                     serial.to_bytes("no\rno\nyes\r\n"))
 
+    def test_read_until_keeps_surplus(self):
+        """Test that data read ahead by read_until is returned by read"""
+        self.s.write(b'first\r\nsecond\r\nrest')
+        self.assertEqual(self.s.read_until(b'\r\n'), b'first\r\n')
+        self.assertEqual(self.s.in_waiting, 12)
+        self.assertEqual(self.s.read(3), b'sec')
+        self.assertEqual(self.s.read_until(b'\r\n'), b'ond\r\n')
+        self.assertEqual(self.s.read(4), b'rest')
+
+    def test_read_until_size(self):
+        """Test read_until with size limit"""
+        self.s.write(b'abcdef\nxyz')
+        self.assertEqual(self.s.read_until(b'\n', size=3), b'abc')
+        self.assertEqual(self.s.read_until(b'\n', size=10), b'def\n')
+        self.s.timeout = 0.1
+        self.assertEqual(self.s.read_until(b'\n', size=10), b'xyz')
+
+    def test_read_until_split_terminator(self):
+        """Test that a terminator is found when it arrives in pieces"""
+        self.s.write(b'ab\r')
+        self.assertEqual(self.s.read_until(b'\r\n', size=3), b'ab\r')
+        self.s.write(b'cd\r')
+        self.s.write(b'\nef')
+        self.assertEqual(self.s.read_until(b'\r\n'), b'cd\r\n')
+        self.s.reset_input_buffer()
+        self.assertEqual(self.s.in_waiting, 0)
+
+    def test_iread_until(self):
+        """Test iread_until generator"""
+        self.s.write(b'1;2;3;')
+        self.s.timeout = 0.1
+        self.assertEqual(list(self.s.iread_until(b';')), [b'1;', b'2;', b'3;'])
+
+    def test_expect(self):
+        """Test expect with byte strings and regular expressions"""
+        import re
+        self.s.write(b'AT\r\r\n+CME ERROR: 10\r\nOK\r\n')
+        index, match, data = self.s.expect([b'OK\r\n', re.compile(br'\+CME ERROR: (\d+)\r\n')])
+        self.assertEqual(index, 1)
+        self.assertEqual(match.group(1), b'10')
+        self.assertEqual(data, b'AT\r\r\n+CME ERROR: 10\r\n')
+        # the rest is available for the next call
+        self.assertEqual(self.s.expect([b'ERROR', b'OK']), (1, b'OK', b'OK'))
+        self.assertEqual(self.s.read(2), b'\r\n')
+
+    def test_expect_timeout(self):
+        """Test expect when no pattern matches"""
+        self.s.timeout = 0.1
+        self.s.write(b'nothing')
+        self.assertEqual(self.s.expect([b'OK'], timeout=0.3), (None, None, b'nothing'))
+
+    def test_expect_split_pattern(self):
+        """Test expect with a pattern that arrives in pieces"""
+        self.s.timeout = 0.1
+        self.s.write(b'> ready')
+        self.assertEqual(self.s.expect([b'ready>'], timeout=0.2), (None, None, b'> ready'))
+        self.s.write(b'xxread')
+        timer = threading.Timer(0.2, self.s.write, args=(b'y>',))
+        timer.start()
+        index, match, data = self.s.expect([b'ready>'], timeout=1)
+        timer.join()
+        self.assertEqual(index, 0)
+        self.assertEqual(data, b'xxready>')
+
+    def test_expect_blocking_port(self):
+        """Test that the expect timeout also applies to a port without timeout"""
+        self.s.timeout = None
+        self.s.write(b'nothing')
+        start = time.time()
+        self.assertEqual(self.s.expect([b'OK'], timeout=0.3), (None, None, b'nothing'))
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(self.s.timeout, None)
+        timer = threading.Timer(0.1, self.s.write, args=(b'OK',))
+        timer.start()
+        self.assertEqual(self.s.expect([b'OK'], timeout=1), (0, b'OK', b'OK'))
+        timer.join()
+        self.assertEqual(self.s.timeout, None)
+
+    def test_expect_no_reconfigure(self):
+        """Test that the expect timeout does not reconfigure the port"""
+        self.s.timeout = None
+        stats = self.s.enable_stats()
+        for data in (b'a', b'b', b'c'):
+            threading.Timer(0.05, self.s.write, args=(data,)).start()
+            self.assertEqual(self.s.expect([b'OK'], timeout=0.1)[0], None)
+        self.assertEqual(stats.reconfigures, 0)
+        self.assertEqual(self.s.timeout, None)
+
 
 if __name__ == '__main__':
     import sys
@@ -68,6 +68,50 @@ class Test_SettingsDict(unittest.TestCase):
             self.assertEqual(getattr(ser, setting), value)
             self.assertEqual(d[setting], value)
 
+    def _count_reconfigure(self, ser):
+        """wrap _reconfigure_port of the instance, return list of calls"""
+        calls = []
+        original = ser._reconfigure_port
+
+        def counting_reconfigure(*args, **kwargs):
+            calls.append(args)
+            return original(*args, **kwargs)
+        ser._reconfigure_port = counting_reconfigure
+        return calls
+
+    def test_apply_settings_reconfigures_once(self):
+        """apply_settings applies all changes with one reconfiguration"""
+        ser = serial.serial_for_url(PORT, timeout=1)
+        try:
+            calls = self._count_reconfigure(ser)
+            ser.apply_settings({'baudrate': 19200, 'timeout': 2, 'xonxoff': True, 'write_timeout': 3})
+            self.assertEqual(len(calls), 1)
+            self.assertEqual((ser.baudrate, ser.timeout, ser.xonxoff, ser.write_timeout), (19200, 2, True, 3))
+        finally:
+            ser.close()
+
+    def test_batch_settings(self):
+        """changes in batch_settings() are deferred to the end of the block"""
+        ser = serial.serial_for_url(PORT, timeout=1)
+        try:
+            calls = self._count_reconfigure(ser)
+            with ser.batch_settings():
+                ser.baudrate = 19200
+                with ser.batch_settings():
+                    ser.parity = serial.PARITY_EVEN
+                    ser.timeout = 2
+                self.assertEqual(len(calls), 0)
+            self.assertEqual(len(calls), 1)
+            # nothing changed, no reconfiguration
+            with ser.batch_settings():
+                pass
+            self.assertEqual(len(calls), 1)
+            # without batch, each change is applied immediately
+            ser.baudrate = 9600
+            self.assertEqual(len(calls), 2)
+        finally:
+            ser.close()
+
 
 if __name__ == '__main__':
     import sys
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#
+# This file is part of pySerial - Cross platform serial port support for Python
+# (C) 2016 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Test socket:// URL handler against a local server.
+"""
+
+import os
+import socket
+import sys
+import time
+import unittest
+import serial
+
+
+class Test_Socket(unittest.TestCase):
+    """Test socket:// with a listening socket on localhost"""
+
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(1)
+        self.s = serial.serial_for_url(
+            'socket://127.0.0.1:{}'.format(self.server.getsockname()[1]), timeout=1)
+        self.peer, _ = self.server.accept()
+        self.peer.settimeout(1)
+
+    def tearDown(self):
+        self.s.close()
+        self.peer.close()
+        self.server.close()
+
+    def _recv(self, size):
+        data = bytearray()
+        while len(data) < size:
+            data.extend(self.peer.recv(size - len(data)))
+        return bytes(data)
+
+    def test_write_read(self):
+        self.assertEqual(self.s.write(b'hello'), 5)
+        self.assertEqual(self._recv(5), b'hello')
+        self.peer.sendall(b'world')
+        self.assertEqual(self.s.read(5), b'world')
+
+    def test_read_until(self):
+        """received data is read with one call, not byte by byte"""
+        stats = self.s.enable_stats()
+        self.peer.sendall(b'x' * 99 + b'\n' + b'y' * 10)
+        time.sleep(0.1)
+        if os.name == 'posix':
+            self.assertEqual(self.s.in_waiting, 110)
+        self.assertEqual(self.s.read_until(), b'x' * 99 + b'\n')
+        self.assertEqual(self.s.read(10), b'y' * 10)
+        if os.name == 'posix':
+            self.assertEqual(stats.read_syscalls, 1)
+
+    def test_write_vectored(self):
+        self.assertEqual(self.s.write_vectored([b'head', bytearray(b'payload'), b'', b'crc']), 14)
+        self.assertEqual(self._recv(14), b'headpayloadcrc')
+
+
+if __name__ == '__main__':
+    sys.stdout.write(__doc__)
+    sys.argv[1:] = ['-v']
+    # When this module is executed from the command-line, it runs all its tests
+    unittest.main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+#
+# This file is part of pySerial - Cross platform serial port support for Python
+# (C) 2020 Chris Liechti <cliechti@gmx.net>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+"""\
+Tests for the I/O statistics of serial ports.
+"""
+
+import json
+import os
+import unittest
+import serial
+import serial.stats
+
+try:
+    import pty
+except ImportError:
+    pty = None
+
+
+class Test_Histogram(unittest.TestCase):
+    """Test the log-linear histogram"""
+
+    def test_small_values_exact(self):
+        h = serial.stats.Histogram()
+        for value in range(16):
+            h.record(value)
+        self.assertEqual(h.buckets(), [(value, 1) for value in range(16)])
+        self.assertEqual((h.min, h.max, h.count, h.total), (0, 15, 16, 120))
+
+    def test_relative_error(self):
+        h = serial.stats.Histogram(significant_bits=3)
+        for value in (1000, 123456, 10 ** 9, 2 ** 40 + 1):
+            h.reset()
+            h.record(value)
+            (highest, count), = h.buckets()
+            self.assertEqual(count, 1)
+            self.assertTrue(value <= highest < value * 1.125, (value, highest))
+
+    def test_percentile(self):
+        h = serial.stats.Histogram()
+        self.assertEqual(h.percentile(50), None)
+        for value in range(1, 1001):
+            h.record(value)
+        self.assertTrue(500 <= h.percentile(50) < 500 * 1.125)
+        self.assertTrue(990 <= h.percentile(99) <= 1000)
+        self.assertEqual(h.percentile(100), 1000)
+        self.assertEqual(h.mean, 500.5)
+        self.assertEqual(h.count_up_to(15), 15)
+
+
+class Test_PortStatistics(unittest.TestCase):
+    """Test statistics recorded by the ports"""
+
+    def test_disabled(self):
+        s = serial.serial_for_url('loop://', timeout=0)
+        self.assertEqual(s.stats, None)
+        self.assertFalse('read' in s.__dict__)
+        s.close()
+
+    def test_loop(self):
+        s = serial.serial_for_url('loop://', timeout=0.05)
+        stats = s.enable_stats()
+        self.assertTrue(s.stats is stats)
+        self.assertEqual(s.write(b'hello'), 5)
+        self.assertEqual(s.read(5), b'hello')
+        self.assertEqual(s.read(1), b'')    # timeout
+        s.baudrate = 19200
+        s.cancel_read()
+        self.assertEqual(
+            (stats.read_calls, stats.read_bytes, stats.read_timeouts,
+             stats.write_calls, stats.write_bytes, stats.reconfigures, stats.cancels),
+            (2, 5, 1, 1, 5, 1, 1))
+        self.assertEqual(stats.read_wait.count, 2)
+        self.assertTrue(stats.read_wait.max >= 0.04e9)
+        self.assertEqual(stats.write_latency.count, 1)
+        # enabling again keeps the statistics, disabling removes the wrappers
+        self.assertTrue(s.enable_stats() is stats)
+        s.enable_stats(False)
+        self.assertEqual(s.stats, None)
+        self.assertFalse('read' in s.__dict__)
+        s.close()
+
+    def test_write_timeout(self):
+        s = serial.serial_for_url('loop://', baudrate=300, write_timeout=0.01)
+        stats = s.enable_stats()
+        self.assertRaises(serial.SerialTimeoutException, s.write, b'0123456789')
+        self.assertEqual(stats.write_timeouts, 1)
+        s.close()
+
+    @unittest.skipIf(pty is None, "pty module not supported on platform")
+    def test_pty_syscalls(self):
+        master, slave = pty.openpty()
+        try:
+            with serial.Serial(os.ttyname(slave), timeout=1) as s:
+                stats = s.enable_stats()
+                os.write(master, b'abc')
+                # read() uses readinto(), only counted once
+                self.assertEqual(s.read(3), b'abc')
+                s.write_vectored([b'x', b'y'])
+                self.assertEqual(os.read(master, 10), b'xy')
+                self.assertEqual((stats.read_calls, stats.read_syscalls), (1, 1))
+                self.assertEqual((stats.write_calls, stats.write_syscalls), (1, 1))
+                self.assertEqual(stats.syscalls, 2)
+        finally:
+            os.close(master)
+            os.close(slave)
+
+    def test_export(self):
+        stats = serial.stats.PortStatistics()
+        stats.read_bytes = 10
+        stats.read_wait.record(5000)
+        d = json.loads(json.dumps(stats.as_dict()))
+        self.assertEqual(d['read_bytes'], 10)
+        self.assertEqual(d['read_wait_ns']['count'], 1)
+        text = stats.prometheus(labels={'port': '/dev/ttyS0'})
+        self.assertTrue('pyserial_read_bytes_total{port="/dev/ttyS0"} 10\n' in text)
+        self.assertTrue('pyserial_read_wait_seconds_bucket{port="/dev/ttyS0",le="1e-05"} 1\n' in text)
+        self.assertTrue('pyserial_read_wait_seconds_count{port="/dev/ttyS0"} 1\n' in text)
+        self.assertTrue('pyserial_write_latency_seconds_bucket{le="+Inf"} 0\n' in stats.prometheus())
+
+
+if __name__ == '__main__':
+    import sys
+    sys.stdout.write(__doc__)
+    sys.argv[1:] = ['-v']
+    # When this module is executed from the command-line, it runs all its tests
+    unittest.main()
@@ -9,6 +9,7 @@ Test serial.threaded related functionality.
 """
 
 import os
+import threading
 import unittest
 import serial
 import serial.threaded
@@ -63,6 +64,246 @@ class Test_threaded(unittest.TestCase):
             time.sleep(1)
             self.assertEqual(protocol.received_packets, [b'1', b'2', b'3'])
 
+    def test_timestamped(self):
+        """protocols can get the arrival time of the data"""
+
+        class Timestamps(serial.threaded.Protocol):
+            timestamped = True
+
+            def __init__(self):
+                self.received = []
+
+            def data_received_timestamped(self, data, timestamp):
+                self.received.append((data, timestamp))
+
+        ser = serial.serial_for_url(PORT, baudrate=115200, timeout=1)
+        before = serial.serialutil._monotonic_ns()
+        with serial.threaded.ReaderThread(ser, Timestamps) as protocol:
+            ser.write(b'hello')
+            time.sleep(1)
+            self.assertEqual(b''.join(data for data, _ in protocol.received), b'hello')
+            self.assertTrue(all(before <= t <= serial.serialutil._monotonic_ns() for _, t in protocol.received))
+
+    def test_writer_thread(self):
+        """writes from several threads are queued and coalesced"""
+        ser = serial.serial_for_url(PORT, baudrate=115200, timeout=1)
+        messages = [['{}:{}|'.format(t, i).encode() for i in range(50)] for t in range(4)]
+        with serial.threaded.WriterThread(ser) as writer:
+            threads = [threading.Thread(target=lambda m=m: [writer.write(x) for x in m]) for m in messages]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertTrue(writer.drain(5))
+            self.assertEqual(writer.queue_size, 0)
+        total = sum(len(x) for m in messages for x in m)
+        self.assertEqual(writer.bytes_written, total)
+        received = ser.read(total).split(b'|')[:-1]
+        # the order per producer is kept
+        for t, m in enumerate(messages):
+            self.assertEqual([x + b'|' for x in received if x.startswith('{}:'.format(t).encode())], m)
+        ser.close()
+
+    def test_writer_thread_coalesce(self):
+        """data queued while the writer is busy is written with one call"""
+        ser = serial.serial_for_url(PORT, baudrate=115200, timeout=1)
+        writer = serial.threaded.WriterThread(ser)
+        for i in range(100):
+            writer.write('{}|'.format(i).encode())
+        writer.start()
+        self.assertTrue(writer.drain(1))
+        writer.stop()
+        self.assertEqual(writer.write_calls, 1)
+        self.assertEqual(ser.read(writer.bytes_written).split(b'|')[:-1],
+                         [str(i).encode() for i in range(100)])
+        ser.close()
+
+    def test_writer_thread_short_write(self):
+        """the data a port did not take is written first on the next call"""
+
+        class ShortWrites(object):
+            def __init__(self):
+                self.data = bytearray()
+
+            def write_vectored(self, buffers):
+                data = b''.join(bytes(b) for b in buffers)[:3]
+                self.data += data
+                return len(data)
+
+        port = ShortWrites()
+        writer = serial.threaded.WriterThread(port)
+        writer.write(b'abcd')
+        writer.write(b'ef')
+        writer.write(b'ghij')
+        writer.start()
+        self.assertTrue(writer.drain(1))
+        writer.write(b'klm')
+        writer.close(1)
+        self.assertEqual(port.data, b'abcdefghijklm')
+        self.assertEqual(writer.bytes_written, 13)
+        self.assertEqual(writer.write_calls, 5)
+
+    @unittest.skipIf(os.name != 'posix', 'requires pseudo terminals')
+    def test_writer_thread_full_port(self):
+        """the writer waits while a non-blocking port takes nothing"""
+        master, slave = os.openpty()
+        try:
+            ser = serial.Serial(os.ttyname(slave), write_timeout=0)
+            data = bytes(bytearray(range(256))) * 1024
+            with serial.threaded.WriterThread(ser, high_water=len(data)) as writer:
+                writer.write(data)
+                time.sleep(0.3)
+                # nobody reads: a few calls, no busy loop
+                self.assertLess(writer.write_calls, 100)
+                received = bytearray()
+                while len(received) < len(data):
+                    received += os.read(master, 65536)
+                self.assertTrue(writer.drain(1))
+            self.assertEqual(received, data)
+            ser.close()
+        finally:
+            os.close(master)
+            os.close(slave)
+
+    def test_writer_thread_backpressure(self):
+        """writers block above the high water mark"""
+        ser = serial.serial_for_url(PORT, baudrate=115200, timeout=1)
+        writer = serial.threaded.WriterThread(ser, high_water=4, low_water=0)
+        writer.write(b'0123456789')     # not started yet, stays queued
+        self.assertEqual(writer.queue_size, 10)
+        self.assertRaises(serial.SerialTimeoutException, writer.write, b'x', timeout=0.1)
+        self.assertFalse(writer.drain(0.1))
+        writer.start()
+        self.assertEqual(writer.write(b'abc', timeout=1), 3)
+        writer.close(1)
+        self.assertEqual(ser.read(13), b'0123456789abc')
+        self.assertRaises(serial.SerialException, writer.write, b'x')
+        ser.close()
+
+
+class Collect(serial.threaded.Protocol):
+    """Protocol used with PortHub tests, collect data per port"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.received = threading.Event()
+        self.lost = threading.Event()
+        self.transport = None
+        self.error = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.data.extend(data)
+        if b'!' in data:
+            raise ValueError('bang')
+        self.received.set()
+
+    def connection_lost(self, exc):
+        self.error = exc
+        self.lost.set()
+
+
+@unittest.skipIf(serial.threaded.selectors is None or os.name != 'posix', 'requires selectors and pseudo terminals')
+class Test_PortHub(unittest.TestCase):
+    """Serve several pseudo terminals from one PortHub thread"""
+
+    def setUp(self):
+        self.ptys = [os.openpty() for _ in range(5)]
+        self.hub = serial.threaded.PortHub()
+        self.hub.start()
+
+    def tearDown(self):
+        self.hub.close()
+        for master, slave in self.ptys:
+            os.close(master)
+            os.close(slave)
+
+    def _add_all(self):
+        handles = []
+        for master, slave in self.ptys:
+            handle = self.hub.add(serial.Serial(os.ttyname(slave)), Collect)
+            handles.append(handle)
+        return [handle.connect()[1] for handle in handles]
+
+    def test_dispatch(self):
+        """data is delivered to the protocol of the right port, in order"""
+        protocols = self._add_all()
+        for i, (master, slave) in enumerate(self.ptys):
+            os.write(master, 'port {} a,'.format(i).encode())
+            os.write(master, 'port {} b'.format(i).encode())
+        for i, protocol in enumerate(protocols):
+            deadline = time.time() + 2
+            expected = 'port {} a,port {} b'.format(i, i).encode()
+            while protocol.data != expected and time.time() < deadline:
+                protocol.received.wait(0.1)
+            self.assertEqual(protocol.data, expected)
+            self.assertIs(protocol.transport.protocol, protocol)
+        self.assertEqual(len(self.hub.handles), len(self.ptys))
+        self.assertTrue(all(h.max_lag >= h.lag >= 0 for h in self.hub.handles))
+
+    def test_write(self):
+        """write through the handle"""
+        protocol = self._add_all()[0]
+        protocol.transport.write(b'hello')
+        self.assertEqual(os.read(self.ptys[0][0], 5), b'hello')
+
+    def test_errors(self):
+        """an exception in one protocol removes only that port"""
+        protocols = self._add_all()
+        os.write(self.ptys[0][0], b'!')
+        self.assertTrue(protocols[0].lost.wait(2))
+        self.assertIsInstance(protocols[0].error, ValueError)
+        self.assertEqual(len(self.hub.handles), len(self.ptys) - 1)
+        os.write(self.ptys[1][0], b'x')
+        self.assertTrue(protocols[1].received.wait(2))
+
+    def test_add_error(self):
+        """closed ports and ports added twice are rejected, the hub keeps running"""
+        protocols = self._add_all()
+        port = serial.Serial()
+        port.port = os.ttyname(self.ptys[0][1])
+        handle = self.hub.add(port, Collect)
+        self.assertRaises(serial.SerialException, handle.connect)
+        self.assertFalse(handle.alive)
+        handle = self.hub.add(protocols[1].transport.serial, Collect)
+        self.assertRaises(serial.SerialException, handle.connect)
+        self.assertTrue(self.hub.is_alive())
+        self.assertEqual(len(self.hub.handles), len(self.ptys))
+        os.write(self.ptys[1][0], b'x')
+        self.assertTrue(protocols[1].received.wait(2))
+
+    def test_read_ahead(self):
+        """data that read_until() read past the line is delivered"""
+        master, slave = self.ptys[0]
+        with serial.Serial(os.ttyname(slave), timeout=1) as port:
+            os.write(master, b'hello\nworld')
+            self.assertEqual(port.read_until(), b'hello\n')
+            protocol = self.hub.add(port, Collect).connect()[1]
+            self.assertTrue(protocol.received.wait(2))
+            self.assertEqual(protocol.data, b'world')
+
+    def test_frame_gap(self):
+        """frame reading protocols are rejected"""
+        with serial.Serial(os.ttyname(self.ptys[0][1])) as port:
+            handle = self.hub.add(port, serial.threaded.FrameReader)
+            self.assertRaises(serial.SerialException, handle.connect)
+            self.assertEqual(self.hub.handles, [])
+
+    def test_close(self):
+        """closing a handle and the hub close the ports"""
+        protocols = self._add_all()
+        handle = protocols[0].transport
+        handle.close()
+        self.assertTrue(protocols[0].lost.wait(2))
+        self.assertIsNone(protocols[0].error)
+        self.assertFalse(handle.serial.is_open)
+        self.hub.close()
+        self.assertFalse(self.hub.is_alive())
+        self.assertTrue(all(p.lost.is_set() for p in protocols))
+        self.assertFalse(any(p.transport.serial.is_open for p in protocols))
+
 
 if __name__ == '__main__':
     import sys
@@ -43,6 +43,33 @@ class Test_URL(unittest.TestCase):
         self.assertRaises(ValueError, serial.serial_for_url, "test://")
 
 
+class Test_OpenMany(unittest.TestCase):
+    """Test open_many and close_many"""
+
+    def test_open_close_many(self):
+        """results are returned in order, errors per port"""
+        specs = ['loop://', {'url': 'loop://', 'baudrate': 19200}, 'imnotknown://',
+                 {'port': 'loop://', 'baudrate': -1}, {'baudrate': 9600}]
+        results = serial.open_many(iter(specs), max_workers=2)
+        self.assertEqual([r.spec for r in results], specs)
+        self.assertTrue(results[0].serial.is_open)
+        self.assertEqual(results[1].serial.baudrate, 19200)
+        for result in results[2:]:
+            self.assertIsNone(result.serial)
+            self.assertIsInstance(result.error, ValueError)
+        self.assertIsNone(results[0].error)
+        errors = serial.close_many(r.serial for r in results)
+        self.assertEqual(errors, [None] * len(specs))
+        self.assertFalse(results[0].serial.is_open)
+        self.assertFalse(results[1].serial.is_open)
+
+    def test_max_workers(self):
+        self.assertRaises(ValueError, serial.open_many, ['loop://'], max_workers=0)
+        self.assertRaises(ValueError, serial.close_many, [None], max_workers=0)
+        results = serial.open_many(['loop://'] * 3, max_workers=1)
+        self.assertEqual(serial.close_many([r.serial for r in results], max_workers=1), [None] * 3)
+
+
 if __name__ == '__main__':
     import sys
     sys.stdout.write(__doc__)